@@ -5,26 +5,136 @@ in provided HTML and CSS content. The API serves as a backend for scanning web c
 to ensure accessibility standards are met.
 """
 import os
-from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
 from dotenv import load_dotenv
-from flask import Flask, request
+from flask import Flask, Response, abort, request, stream_with_context
 from flask_cors import CORS
-from scanners.color_contrast_scanner import score_text_contrast
-from scanners.text_scanner import score_text_accessibility
-from scanners.alt_text import score_image_accessibility
-from scanners.line_spacing import score_line_spacing
-from utils.append_score import append_score  # Import the new module
-from utils.append_selection import log_selection
+import soupsieve
+from soupsieve import SelectorSyntaxError
+from scanners.batch_scan import page_record, scan_records_on_pool
+from scanners.scan_all import stream_all, IMAGE_SCANNER, TEXT_SCANNERS
+from scanners.scan_jobs import ALL_SCANNERS, coverage_field, run_scan, serialize_results
+from scanners.scan_session import end_session, start_session, update_session
+from services.media_queries import COLOR_SCHEMES, DEFAULT_VIEWPORT, ViewportProfile
+from services.result_cache import result_cache
+from services.stylesheet_cache import stylesheet_cache
+from services.worker_pool import SCAN_WORKERS, ScanRejected, ScanTimeout, worker_pool
+from utils.backend_reporter import report_score, report_selection, reporter_counters
+from utils.common_utils import ScanScope
+from utils.debug import configure_logging, get_logger, start_request_logging
+from utils.element_refs import RESPONSE_MODES, serialize_finding
+from utils.json_provider import FastJSONProvider, dumps_bytes, json_line
+from utils.request_limits import MAX_REQUEST_BYTES, InputTooLarge, check_scan_input, \
+    decompress_middleware
+from utils.timing import finish_request_timing, render_metrics, server_timing_header, \
+    start_request_timing
 
 load_dotenv()
+configure_logging()
+logger = get_logger(__name__)
 
 
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
+app.config["MAX_CONTENT_LENGTH"] = MAX_REQUEST_BYTES
+app.wsgi_app = decompress_middleware(app.wsgi_app)
 cors = CORS(
     app, resources={r"/*": {"origins": "*"}}
 )  # CHANGE THIS AFTER DOMAINS HAVE BEEN ASSIGNED
 
 
+@app.errorhandler(ScanRejected)
+def scan_rejected(error):
+    """
+    Asks the client to retry later when the scan workers are busy.
+    """
+    return {"error": str(error)}, 503
+
+
+@app.errorhandler(InputTooLarge)
+def input_too_large(error):
+    """
+    Rejects a DOM or CSS over its size limit before it is parsed.
+    """
+    return {"error": str(error), "limit": error.limit}, 413
+
+
+@app.errorhandler(413)
+def request_too_large(_error):
+    """
+    Rejects a request body larger than MAX_REQUEST_BYTES.
+    """
+    return {"error": "Request body is too large", "limit": MAX_REQUEST_BYTES}, 413
+
+
+@app.errorhandler(ScanTimeout)
+def scan_timed_out(error):
+    """
+    Reports a scan that ran longer than SCAN_TIMEOUT.
+    """
+    return {"error": str(error)}, 504
+
+
+@app.before_request
+def sample_request_logging():
+    """
+    Decides whether element-level detail is logged for this request,
+    and starts timing its stages.
+    """
+    start_request_logging()
+    start_request_timing()
+
+
+@app.after_request
+def add_request_timing(response):
+    """
+    Adds the request's stage times to the metrics. When the request sets
+    "timing", they are also returned in a Server-Timing header and a "timing"
+    field of the response. Streamed responses are only timed until they start.
+    """
+    timings = finish_request_timing(request.endpoint)
+    # The body of a request over MAX_REQUEST_BYTES is never read
+    data = request.get_json(silent=True) \
+        if request.is_json and response.status_code != 413 else None
+    if timings is None or not isinstance(data, dict) or not data.get("timing") \
+            or response.is_streamed:
+        return response
+
+    response.headers["Server-Timing"] = server_timing_header(timings)
+    body = response.get_json(silent=True)
+    if isinstance(body, dict):
+        body["timing"] = {name: round(seconds * 1000, 3)
+                          for name, seconds in timings.stages.items()}
+        response.set_data(dumps_bytes(body))
+    return response
+
+
+@app.route("/api/metrics", methods=["GET"])
+def metrics():
+    """
+    Endpoint exposing the stage time, input size and element count histograms,
+    and the cache, worker pool and backend reporter counters, in the
+    Prometheus text format.
+    """
+    counters = {
+        f"accessiscan_stylesheet_cache_{name}": (f"Stylesheet cache {name}.", value)
+        for name, value in stylesheet_cache.stats().items()
+    }
+    counters.update({
+        f"accessiscan_result_cache_{name}": (f"Result cache {name.replace('_', ' ')}.", value)
+        for name, value in result_cache.stats().items()
+    })
+    counters.update({
+        f"accessiscan_scan_jobs_{name}": (f"Scan jobs {name.replace('_', ' ')}.", value)
+        for name, value in worker_pool.counters.items()
+    })
+    counters.update({
+        f"accessiscan_backend_reports_{name}": (f"Backend reports {name}.", value)
+        for name, value in reporter_counters().items()
+    })
+    return Response(render_metrics(counters), mimetype="text/plain; version=0.0.4")
+
+
 @app.route("/")
 def home():
     """
@@ -45,6 +155,105 @@ def health():
     return "OK"
 
 
+def response_options(data):
+    """
+    Returns the response mode and include_markup flag asked for by the request:
+    "full" markup, or "compact" references with the markup only when include_markup is set.
+    """
+    mode = data.get("response_mode")
+    if mode is not None and mode not in RESPONSE_MODES:
+        abort(400, description=f"response_mode must be one of {', '.join(RESPONSE_MODES)}")
+    return mode, bool(data.get("include_markup", False))
+
+
+def viewport_profile(data):
+    """
+    Returns the ViewportProfile asked for by the request's "viewport" field, which
+    may set the "width" and "height" in px and "prefers_color_scheme", or None
+    for the configured viewport.
+    """
+    viewport = data.get("viewport")
+    if viewport is None:
+        return None
+    if not isinstance(viewport, dict):
+        abort(400, description="viewport must be an object")
+    width = viewport.get("width", DEFAULT_VIEWPORT.width)
+    height = viewport.get("height", DEFAULT_VIEWPORT.height)
+    color_scheme = viewport.get("prefers_color_scheme", DEFAULT_VIEWPORT.color_scheme)
+    for size in (width, height):
+        if not isinstance(size, int) or isinstance(size, bool) or size < 1:
+            abort(400, description="viewport width and height must be positive integers")
+    if color_scheme not in COLOR_SCHEMES:
+        abort(400, description=f"prefers_color_scheme must be one of {', '.join(COLOR_SCHEMES)}")
+    return ViewportProfile(width, height, color_scheme)
+
+
+def scan_input(data):
+    """
+    Returns the DOM, CSS and ScanScope of a scan request, after checking them
+    against the size limits, and the estimated number of elements of the page.
+    The scope limits the scan to the elements matching the "root" selector or
+    under the "subtrees" CSS paths, and to "max_elements" elements, or samples
+    MAX_ELEMENTS elements of a larger page. It is None to scan every element.
+    """
+    dom = data.get("dom", "")
+    css = data.get("css", "")
+    root = data.get("root") or None
+    subtrees = data.get("subtrees") or []
+    budget = data.get("max_elements")
+
+    if root is not None and not is_selector(root):
+        abort(400, description="root must be a CSS selector")
+    if not isinstance(subtrees, list) or not all(isinstance(path, str) for path in subtrees):
+        abort(400, description="subtrees must be a list of CSS paths")
+    if budget is not None and (not isinstance(budget, int) or isinstance(budget, bool)
+                               or budget < 1):
+        abort(400, description="max_elements must be a positive integer")
+
+    # Only a budget over the whole page cuts it before parsing, as `scope_html` does
+    cutting_budget = budget if root is None and not subtrees else None
+    sample_size, num_elements = check_scan_input(dom, css, budget=cutting_budget)
+    if sample_size is not None:
+        scope = ScanScope(root, tuple(subtrees), sample_size, sample=True)
+    elif root is not None or subtrees or budget is not None:
+        scope = ScanScope(root, tuple(subtrees), budget)
+    else:
+        scope = None
+    return dom, css, scope, num_elements
+
+
+def is_page_record(page):
+    """
+    Checks that a page of a batch is an object whose id, href, dom and css are strings.
+    """
+    return isinstance(page, dict) and all(
+        isinstance(page.get(field, ""), str) for field in ("id", "href", "dom", "css")
+    )
+
+
+def report_scan(data, scope, score, selection):
+    """
+    Reports the score and selection of a scan to the backend in the background.
+    The score of a region of the page is not reported, as it does not rate the page.
+    """
+    if scope is None or scope.sample:
+        report_score(data.get("secret", ""), score, data.get("href", ""), selection)
+    report_selection(selection)
+
+
+def is_selector(selector):
+    """
+    Checks if a value is a CSS selector soupsieve can match.
+    """
+    if not isinstance(selector, str):
+        return False
+    try:
+        soupsieve.compile(selector)
+    except (SelectorSyntaxError, NotImplementedError, ValueError):
+        return False
+    return True
+
+
 @app.route("/api/scan-contrasting-colors", methods=["POST"])
 def scan_color_contrast():
     """
@@ -52,26 +261,21 @@ def scan_color_contrast():
     Returns the color contrast score and list of inaccessible elements.
     """
     data = request.get_json()
-    dom = data.get("dom", "")
-    css = data.get("css", "")
+    dom, css, scope, num_elements = scan_input(data)
 
-    [score, inaccessible_elements] = score_text_contrast(dom, css)
-    print("score", score)
-    print("Inaccessible elements:", inaccessible_elements)
+    results, coverage = run_scan("color-contrast", dom, css, *response_options(data), scope,
+                                 viewport_profile(data))
+    [score, inaccessible_elements] = results["color-contrast"]
+    logger.info("score %s, inaccessible elements: %d", score, len(inaccessible_elements))
 
-    # potentially slow function to be run asynchronously
-    with ThreadPoolExecutor() as executor:
-        executor.submit(append_score, data.get("secret", ""), score, \
-            data.get("href", ""), "color-contrast")
-        executor.submit(log_selection, "color-contrast")
+    # reported to the backend in the background
+    report_scan(data, scope, score, "color-contrast")
 
-    # Convert the inaccessible elements into string representations (e.g., HTML)
-    inaccessible_html = [str(element) for element in inaccessible_elements]
-
-    # Return the score and the inaccessible elements
+    # Return the score and the markup or compact references of the inaccessible elements
     return {
-        "score": f"{score}",
-        "inaccessible_elements": inaccessible_html
+        "score": score,
+        "inaccessible_elements": inaccessible_elements,
+        **coverage_field(scope, coverage, num_elements)
     }
 
 
@@ -82,26 +286,21 @@ def scan_large_text():
     Returns the accessibility score for large text and list of inaccesible elements.
     """
     data = request.get_json()
-    dom = data.get("dom", "")
-    css = data.get("css", "")
-
-    [score, inaccessible_elements] = score_text_accessibility(dom, css)
-    print("score", score)
-    print("Inaccessible elements:", inaccessible_elements)
+    dom, css, scope, num_elements = scan_input(data)
 
-    # potentially slow function to be run asynchronously
-    with ThreadPoolExecutor() as executor:
-        executor.submit(append_score, data.get("secret", ""), score, \
-            data.get("href", ""), "large-text")
-        executor.submit(log_selection, "large-text")
+    results, coverage = run_scan("large-text", dom, css, *response_options(data), scope,
+                                 viewport_profile(data))
+    [score, inaccessible_elements] = results["large-text"]
+    logger.info("score %s, inaccessible elements: %d", score, len(inaccessible_elements))
 
-    # Convert the inaccessible elements into string representations (e.g., HTML)
-    text_inaccessible_html = [str(element) for element in inaccessible_elements]
+    # reported to the backend in the background
+    report_scan(data, scope, score, "large-text")
 
-    # Return the score and the inaccessible elements
+    # Return the score and the markup or compact references of the inaccessible elements
     return {
         "score": score,
-        "inaccessible_elements": text_inaccessible_html
+        "inaccessible_elements": inaccessible_elements,
+        **coverage_field(scope, coverage, num_elements)
     }
 
 
@@ -113,37 +312,44 @@ def scan_images():
     and the formatted score.
     """
     data = request.get_json()
-    dom = data.get("dom", "")
-    css = data.get("css", "")
+    dom, css, scope, num_elements = scan_input(data)
 
     # Get image accessibility score and element lists
-    result = score_image_accessibility(dom, css)
+    results, coverage = run_scan(IMAGE_SCANNER, dom, css, scope=scope,
+                                 viewport=viewport_profile(data))
+    result = results[IMAGE_SCANNER]
+
+    # Debugging: Log the structure of image_accessibility_score
+    logger.debug("Image accessibility score: %s", result)
+
+    response = image_scan_response(result)
+
+    # reported to the backend in the background
+    if isinstance(result, dict):
+        report_scan(data, scope, response["score"], "alt-text")
 
-    # Debugging: Print out the structure of image_accessibility_score
-    print("Image accessibility score:", result)
+    response.update(coverage_field(scope, coverage, num_elements))
+    return response
 
+
+def image_scan_response(result):
+    """
+    Builds the image scan response from the image accessibility result.
+    """
     # Initialize default values for total images and images with alt text
     total_images = 0
     images_with_alt = 0
-    score = 0
+    score = 0.0
 
     # Check if the result is a dictionary and contains the necessary keys
     if isinstance(result, dict):
         total_images = result.get('total_images', 0)
         images_with_alt = result.get('images_with_alt', 0)
-        if total_images == 0:
-            score = 100
-        else:
-            score = (images_with_alt/total_images)*100
-        # potentially slow function to be run asynchronously
-        with ThreadPoolExecutor() as executor:
-            print("logging to backend")
-            executor.submit(append_score, data.get("secret", ""), score, \
-                data.get("href", ""), "alt-text")
-            executor.submit(log_selection, "alt-text")
-
-    # Print debug information
-    print(f"Total images: {total_images}, Images with alt text: {images_with_alt}")
+        # Truncated to one decimal like the scores of the other scanners
+        score = result.get('score', 100.0)
+
+    # Log debug information
+    logger.debug("Total images: %s, Images with alt text: %s", total_images, images_with_alt)
 
     # Return the formatted score and image counts, ensuring they are set to 0 if no images are found
     return {
@@ -163,27 +369,216 @@ def scan_line_spacing():
     Returns a score based on the percentage of text elements with sufficient line spacing.
     """
     data = request.get_json()
+    dom, css, scope, num_elements = scan_input(data)
+
+    results, coverage = run_scan("line-spacing", dom, css, *response_options(data), scope,
+                                 viewport_profile(data))
+    [score, inaccessible_elements] = results["line-spacing"]
+    logger.info("score %s, inaccessible elements: %d", score, len(inaccessible_elements))
+
+    # reported to the backend in the background
+    report_scan(data, scope, score, "line-spacing")
+
+    # Return the score and the markup or compact references of the inaccessible elements
+    return {
+        "score": score,
+        "inaccessible_elements": inaccessible_elements,
+        **coverage_field(scope, coverage, num_elements)
+    }
+
+
+@app.route("/api/scan-all", methods=["POST"])
+def scan_all():
+    """
+    Endpoint to run every scanner over a single parse of the DOM and CSS.
+    Returns each scanner's result keyed by its selection name, in the
+    same format as the scanner's individual endpoint.
+    """
+    data = request.get_json()
+    dom, css, scope, num_elements = scan_input(data)
+
+    results, coverage = run_scan(ALL_SCANNERS, dom, css, *response_options(data), scope,
+                                 viewport_profile(data))
+    response, scores = all_results_response(results)
+    logger.info("scores %s", scores)
+
+    # reported to the backend in the background
+    for selection, score in scores.items():
+        report_scan(data, scope, score, selection)
+
+    response.update(coverage_field(scope, coverage, num_elements))
+    return response
+
+
+def all_results_response(results):
+    """
+    Formats the results of every scanner as their individual endpoints do.
+    Returns the response and the score of each scanner that has one.
+    """
+    response = {}
+    scores = {}
+    for selection, result in results.items():
+        if selection == IMAGE_SCANNER:
+            response[selection] = image_scan_response(result)
+            if isinstance(result, dict):
+                scores[selection] = response[selection]["score"]
+            continue
+
+        [score, inaccessible_elements] = result
+        scores[selection] = score
+        response[selection] = {
+            "score": score,
+            "inaccessible_elements": inaccessible_elements
+        }
+    return response, scores
+
+
+@app.route("/api/scan-session", methods=["POST"])
+def scan_session_start():
+    """
+    Endpoint to start an incremental scan session. Scans the DOM and CSS like
+    /api/scan-all and keeps the document on the server, so later mutations of
+    the page can be sent to /api/scan-session/<session> instead of the whole DOM.
+    Returns the session token with the results of every scanner. Sessions keep
+    every element, so pages over MAX_ELEMENTS are rejected rather than sampled.
+    """
+    data = request.get_json()
     dom = data.get("dom", "")
     css = data.get("css", "")
+    check_scan_input(dom, css, "reject")
 
-    [score, inaccessible_elements] = score_line_spacing(dom, css)
-    print("score", score)
-    print("Inaccessible elements:", inaccessible_elements)
+    token, results = start_session(dom, css, viewport_profile(data))
+    response, scores = all_results_response(
+        serialize_results(results, *response_options(data))
+    )
+    logger.info("session scores %s", scores)
 
-    # potentially slow function to be run asynchronously
-    with ThreadPoolExecutor() as executor:
-        executor.submit(append_score, data.get("secret", ""), score, \
-            data.get("href", ""), "line-spacing")
-        executor.submit(log_selection, "line-spacing")
+    # reported to the backend in the background
+    for selection, score in scores.items():
+        report_score(data.get("secret", ""), score, data.get("href", ""), selection)
+        report_selection(selection)
 
-    # Convert the inaccessible elements into string representations (e.g., HTML)
-    inaccessible_html = [str(element) for element in inaccessible_elements]
+    return {"session": token, **response}
+
+
+@app.route("/api/scan-session/<token>", methods=["POST", "DELETE"])
+def scan_session_update(token):
+    """
+    Endpoint to rescan a session after the page changed. Takes the DOM "changes"
+    (added, removed and modified elements located by their CSS paths) and an
+    optional "css" replacing the stylesheet or "css_append" adding rules to it.
+    Only the affected elements are checked again. DELETE ends the session.
+    """
+    if request.method == "DELETE":
+        end_session(token)
+        return {"session": token}
+
+    data = request.get_json()
+    try:
+        results = update_session(token, data.get("changes", []),
+                                 data.get("css"), data.get("css_append"))
+    except ValueError as error:
+        abort(400, description=str(error))
+    if results is None:
+        abort(404, description="Unknown or expired scan session")
+
+    response, scores = all_results_response(
+        serialize_results(results, *response_options(data))
+    )
+    logger.info("session scores %s", scores)
+    return {"session": token, **response}
+
+
+@app.route("/api/scan-stream", methods=["POST"])
+def scan_stream():
+    """
+    Endpoint to run the scanners over the DOM and CSS while streaming the results
+    as newline-delimited JSON. Each inaccessible element is sent as a "finding"
+    record as soon as it is found, and a final "summary" record holds the scores.
+    The optional "scanners" field limits the scan to a list of selection names.
+    """
+    data = request.get_json()
+    dom, css, scope, num_elements = scan_input(data)
+    selections = data.get("scanners") or None
+    known = [*TEXT_SCANNERS, IMAGE_SCANNER]
+    if selections is not None and not set(selections) <= set(known):
+        abort(400, description=f"scanners must be selection names from {', '.join(known)}")
+    mode, include_markup = response_options(data)
+    viewport = viewport_profile(data)
+
+    def generate():
+        num_findings = {}
+        # Sibling positions of the streamed document, numbered once per parent
+        positions = {}
+        for event in stream_all(dom, css, selections, scope, viewport):
+            if event[0] == "finding":
+                _, selection, finding = event
+                num_findings[selection] = num_findings.get(selection, 0) + 1
+                yield json_line({
+                    "type": "finding",
+                    "scanner": selection,
+                    "element": serialize_finding(finding, mode, include_markup, positions),
+                })
+                continue
+
+            summary = {}
+            for selection, result in event[1].items():
+                if selection == IMAGE_SCANNER:
+                    summary[selection] = image_scan_response(result)
+                    if not isinstance(result, dict):
+                        continue
+                else:
+                    summary[selection] = {
+                        "score": result,
+                        "inaccessible_count": num_findings.get(selection, 0),
+                    }
+                # reported to the backend in the background
+                report_scan(data, scope, summary[selection]["score"], selection)
+            logger.info("streamed findings %s", num_findings)
+            yield json_line({"type": "summary", "results": summary,
+                             **coverage_field(scope, event[2], num_elements)})
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+
+@app.route("/api/scan-batch", methods=["POST"])
+def scan_batch():
+    """
+    Endpoint to scan many pages in one request. Takes a list of "pages" with
+    the href, dom and css of each, and streams newline-delimited JSON with one
+    result row per page as its scan finishes: the page's id, href, score of
+    every scanner and findings (compact references unless response_mode is set).
+    The rows are written in the order the scans finish, not the order of the
+    pages, and are matched to them by id. Batch scores are not reported to the
+    backend.
+    """
+    data = request.get_json()
+    pages = data.get("pages", [])
+    if not isinstance(pages, list) or not all(map(is_page_record, pages)):
+        abort(400, description="pages must be a list of {href, dom, css} records")
+    mode, include_markup = response_options(data)
+    viewport = viewport_profile(data)
+    # The batch is admitted as a whole, then its pages wait for the pool in turn
+    if not worker_pool.admits(max((len(page.get("dom", "")) + len(page.get("css", ""))
+                                   for page in pages), default=0)):
+        raise ScanRejected("Too many scans in progress")
+    records = [
+        page_record(page.get("id") or page.get("href") or str(number),
+                    page.get("dom", ""), page.get("css", ""), page.get("href", ""))
+        for number, page in enumerate(pages)
+    ]
+
+    def generate():
+        # Closing the rows when the client disconnects cancels the pages not started
+        with closing(scan_records_on_pool(records, max(SCAN_WORKERS, 1), mode=mode or "compact",
+                                          include_markup=include_markup,
+                                          viewport=viewport)) as rows:
+            for row in rows:
+                yield json_line(row)
+        logger.info("batch scanned %d pages", len(records))
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
 
-    # Return the score and the inaccessible elements
-    return {
-        "score": f"{score}",
-        "inaccessible_elements": inaccessible_html
-    }
 
 if __name__ == "__main__":
     if os.getenv("ENVIRONMENT") == "dev":
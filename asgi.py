@@ -0,0 +1,53 @@
+"""
+This module serves the scanner's API from an ASGI server. The routes of `app`
+are unchanged: request bodies are read and responses written on the event loop,
+the scans run in a pool of executor threads (and from there on the scan worker
+processes when SCAN_WORKERS is set), and scores are reported to the backend
+from the event loop. Thousands of slowly uploading clients then wait on the
+loop without holding a thread each.
+
+Run it with `python asgi.py`, or `SERVER_MODE=asgi ./run.sh`.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+import uvicorn
+from starlette.applications import Starlette
+from starlette.routing import Mount
+from app import app as flask_app
+from services.asgi_bridge import wsgi_bridge
+from utils.async_backend_reporter import AsyncBackendReporter
+from utils.backend_reporter import use_reporter
+from utils.settings import env_int
+
+# Requests handled by the Flask app at once, once their bodies are read
+ASGI_THREADS = env_int("ASGI_THREADS", 32)
+
+executor = ThreadPoolExecutor(ASGI_THREADS, thread_name_prefix="asgi-scan")
+
+
+@asynccontextmanager
+async def lifespan(_app):
+    """
+    Reports to the backend from the event loop while the server runs.
+    """
+    async_reporter = AsyncBackendReporter()
+    await async_reporter.start()
+    previous = use_reporter(async_reporter)
+    try:
+        yield
+    finally:
+        use_reporter(previous)
+        await async_reporter.shutdown()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+app = Starlette(
+    routes=[Mount("/", app=wsgi_bridge(flask_app.wsgi_app, executor))],
+    lifespan=lifespan,
+)
+
+
+if __name__ == "__main__":
+    uvicorn.run(app, host="0.0.0.0", port=4200,
+                log_level="debug" if os.getenv("ENVIRONMENT") == "dev" else "info")
@@ -0,0 +1,96 @@
+"""
+Generates synthetic pages and stylesheets for benchmarking the scanners and parsers.
+"""
+import random
+
+TEXT_TAGS = ["p", "span", "a", "li", "h2", "h3", "strong", "em", "label", "button"]
+CONTAINER_TAGS = ["div", "section", "article", "ul", "nav", "aside"]
+CONTAINER_CLASSES = 50
+TEXT_CLASSES = 100
+COLORS = ["#111", "#333", "#777", "#999", "#eee", "#fff", "rgb(0, 0, 128)",
+          "rgba(255, 0, 0, 0.5)", "hsl(120, 40%, 30%)", "navy", "white", "black"]
+FONT_SIZES = ["10px", "12px", "14px", "16px", "1.2em", "120%", "1.5rem", "12pt", "24px",
+              "smaller", "calc(1rem + 2px)"]
+LINE_HEIGHTS = ["1", "1.2", "1.5", "1.8", "20px", "normal"]
+
+
+def generate_page(num_elements=1000, depth=8, seed=0, class_density=1, with_images=True):
+    """
+    Generates the HTML of a page with roughly `num_elements` elements
+    nested up to `depth` containers deep.
+
+    Args:
+        num_elements (int): The approximate number of elements in the body.
+        depth (int): The maximum nesting depth of the containers.
+        seed (int): The random seed, so the same arguments give the same page.
+        class_density (int): The number of classes on each element.
+        with_images (bool): Whether some of the text elements are images.
+
+    Returns:
+        str: The HTML of the page.
+    """
+    rng = random.Random(seed)
+    parts = ["<!DOCTYPE html><html><head><title>Benchmark</title></head><body>"]
+    open_tags = []
+    for i in range(num_elements):
+        if open_tags and (len(open_tags) >= depth or rng.random() < 0.3):
+            parts.append(f"</{open_tags.pop()}>")
+        if rng.random() < 0.25:
+            tag = rng.choice(CONTAINER_TAGS)
+            parts.append(f'<{tag} class="{_classes("c", i, CONTAINER_CLASSES, class_density)}">')
+            open_tags.append(tag)
+        elif with_images and rng.random() < 0.05:
+            alt = f' alt="Image {i}"' if rng.random() < 0.7 else ""
+            parts.append(f'<img src="img{i}.png"{alt}>')
+        else:
+            tag = rng.choice(TEXT_TAGS)
+            classes = _classes("t", i, TEXT_CLASSES, class_density)
+            parts.append(f'<{tag} class="{classes}">Text {i}</{tag}>')
+    parts.extend(f"</{tag}>" for tag in reversed(open_tags))
+    parts.append("</body></html>")
+    return "".join(parts)
+
+
+def _classes(prefix, index, num_classes, class_density):
+    """
+    Returns the class attribute of the element at index.
+    """
+    return " ".join(f"{prefix}{(index + k * 7) % num_classes}" for k in range(class_density))
+
+
+def generate_stylesheet(num_rules=500, seed=0):
+    """
+    Generates a stylesheet of `num_rules` rules using the tags and classes of
+    `generate_page`, with a mix of tag, class, compound and descendant selectors.
+
+    Args:
+        num_rules (int): The number of rules.
+        seed (int): The random seed, so the same arguments give the same stylesheet.
+
+    Returns:
+        str: The CSS of the stylesheet.
+    """
+    rng = random.Random(seed)
+    selectors = [
+        lambda: rng.choice(TEXT_TAGS),
+        lambda: f".t{rng.randrange(TEXT_CLASSES)}",
+        lambda: f".c{rng.randrange(CONTAINER_CLASSES)}",
+        lambda: f"{rng.choice(TEXT_TAGS)}.t{rng.randrange(TEXT_CLASSES)}",
+        lambda: f".c{rng.randrange(CONTAINER_CLASSES)} {rng.choice(TEXT_TAGS)}",
+        lambda: f"{rng.choice(CONTAINER_TAGS)} > .t{rng.randrange(TEXT_CLASSES)}",
+        lambda: f"{rng.choice(TEXT_TAGS)}:hover",
+    ]
+    rules = ["body { color: #222; background-color: #fff; font-size: 16px; }"]
+    for _ in range(num_rules - 1):
+        selector = ", ".join(rng.choice(selectors)() for _ in range(rng.randint(1, 2)))
+        declarations = [f"color: {rng.choice(COLORS)}"]
+        if rng.random() < 0.4:
+            declarations.append(f"background-color: {rng.choice(COLORS)}")
+        if rng.random() < 0.4:
+            declarations.append(f"font-size: {rng.choice(FONT_SIZES)}")
+        if rng.random() < 0.3:
+            declarations.append(f"line-height: {rng.choice(LINE_HEIGHTS)}")
+        if rng.random() < 0.1:
+            declarations.append("font-weight: bold")
+        rules.append(f"{selector} {{ {'; '.join(declarations)}; }}")
+    return "\n".join(rules)
@@ -0,0 +1,106 @@
+"""
+Benchmarks the HTML parser backends of `services.html_parser.parse_html` and
+checks that the scanners give the same results on malformed markup with each.
+
+Run from the root of the project with `python -m benchmarks.html_parsers`.
+"""
+import contextlib
+import io
+import time
+from benchmarks.corpus import generate_page
+from scanners.scan_all import score_all
+from services import html_parser
+from services.html_parser import HTML_PARSER_BACKENDS, parse_html
+
+PAGE_SIZES = [1000, 10000, 50000]
+REPEATS = 3
+
+MALFORMED_PAGES = {
+    "unclosed tags": "<div><p>First<p>Second<span>unclosed</div><p>Third",
+    "misnested tags": "<p><b>bold <i>both</b> italic</i></p><div><span>text</div></span>",
+    "stray end tags": "</p><div>text</span></em></div></body><p>after body</p>",
+    "stray paragraph end": "<div><p>one</p></p><p>two</div>",
+    "unquoted attributes": "<p class=note style=color:#777>low</p><img src=a.png alt=A>",
+    "missing html and body": "<title>t</title><h1>Title</h1><p>Body text</p>",
+    "table junk": "<table><p>outside cell</p><tr><td>cell<td>cell</table>",
+    "nested paragraphs": "<p>outer<p>inner</p>text</p>",
+    "unterminated comment": "<p>before</p><!-- never closed <p>hidden</p>",
+}
+MALFORMED_CSS = "p { color: #777; line-height: 1.6; } .note { font-size: 12px; }"
+
+
+def available_backends():
+    """
+    Returns the backends whose parser is installed.
+    """
+    backends = []
+    for backend in HTML_PARSER_BACKENDS:
+        with contextlib.redirect_stdout(io.StringIO()) as output:
+            parse_html("<p></p>", backend)
+        if not output.getvalue():
+            backends.append(backend)
+    return backends
+
+
+def time_parse(html, backend):
+    """
+    Returns the best time in seconds of parsing html with a backend.
+    """
+    best = float("inf")
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        parse_html(html, backend)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def scores(html, css, backend):
+    """
+    Returns the score of every scanner for a page parsed with a backend.
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        results = score_all_with_backend(html, css, backend)
+    return {
+        name: result[0] if isinstance(result, list) else result
+        for name, result in results.items()
+    }
+
+
+def score_all_with_backend(html, css, backend):
+    """
+    Runs every scanner with the HTML parser backend temporarily set.
+    """
+    previous = html_parser.HTML_PARSER_BACKEND
+    html_parser.HTML_PARSER_BACKEND = backend
+    try:
+        return score_all(html, css)
+    finally:
+        html_parser.HTML_PARSER_BACKEND = previous
+
+
+def main():
+    """
+    Prints the parse times of every backend and the malformed markup results.
+    """
+    backends = available_backends()
+    print("Parse time (best of", REPEATS, "runs)")
+    print(f"{'elements':>10} {'bytes':>10} " + " ".join(f"{b:>12}" for b in backends))
+    for size in PAGE_SIZES:
+        html = generate_page(size)
+        times = [time_parse(html, backend) for backend in backends]
+        print(f"{size:>10} {len(html):>10} " + " ".join(f"{t:>11.3f}s" for t in times))
+
+    print()
+    print("Malformed markup scores (html5lib follows the HTML specification)")
+    for name, html in MALFORMED_PAGES.items():
+        results = {backend: scores(html, MALFORMED_CSS, backend) for backend in backends}
+        reference = results.get("html5lib", results[backends[0]])
+        status = "same" if all(r == reference for r in results.values()) else "DIFFERENT"
+        print(f"{name:>24}: {status}")
+        if status != "same":
+            for backend, result in results.items():
+                print(f"{'':>26}{backend}: {result}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+"""
+Benchmarks every parser stage and scanner on a synthetic page and reports the
+time, the peak traced allocations and the peak RSS growth of each stage.
+Results can be saved as a baseline, and later runs compared against it to
+catch regressions locally.
+
+Run from the root of the project with `python -m benchmarks.run`, for example
+`python -m benchmarks.run --size medium --save-baseline` before a change and
+`python -m benchmarks.run --size medium` after it. The run exits with status 1
+when a stage is slower or allocates more than the baseline allows.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import time
+import tracemalloc
+from benchmarks.corpus import generate_page, generate_stylesheet
+from scanners.alt_text import score_image_accessibility
+from scanners.color_contrast_scanner import score_text_contrast, score_text_contrast_batch
+from scanners.line_spacing import score_line_spacing
+from scanners.scan_all import score_all
+from scanners.scan_jobs import serialize_results
+from scanners.text_scanner import score_text_accessibility
+from services.css_parser import parse_css
+from services.html_parser import parse_html
+from services.selector_index import SelectorIndex
+from services.style_resolver import StyleResolver
+from services.stylesheet_cache import stylesheet_cache
+from utils import contrast_utils
+from utils.common_utils import ScanScope
+from utils.json_provider import dumps_bytes
+
+# (elements, depth, class density, stylesheet rules) of each page size
+SIZES = {
+    "small": (1000, 8, 1, 200),
+    "medium": (10000, 12, 2, 1000),
+    "large": (50000, 16, 3, 3000),
+}
+REPEATS = 3
+COLOR_PAIRS = 10000
+# Element budget of the budgeted scan, as the extension would ask for
+BUDGET_ELEMENTS = 200
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+# Fraction by which a stage may exceed its baseline before it is reported
+DEFAULT_THRESHOLD = 0.2
+# Times below this many seconds are too noisy to compare
+MIN_COMPARED_TIME = 0.005
+
+
+def reset_caches():
+    """
+    Empties the caches shared between scans, so every run of a stage starts cold.
+    Compiled selectors stay cached, as they do between requests.
+    """
+    stylesheet_cache.clear()
+    contrast_utils.clear_color_caches()
+
+
+def build_stages(html, css):
+    """
+    Returns the stages to benchmark, mapped by name to functions of no arguments.
+    """
+    soup = parse_html(html)
+    styles = parse_css(css)
+    index = SelectorIndex(styles)
+    rng = random.Random(0)
+    colors = [tuple(rng.randrange(256) for _ in range(3)) for _ in range(COLOR_PAIRS * 2)]
+    foregrounds, backgrounds = colors[:COLOR_PAIRS], colors[COLOR_PAIRS:]
+    results = serialize_results(score_all(html, css), "full")
+
+    def resolve_styles():
+        resolver = StyleResolver(index)
+        for element in soup.find_all(True):
+            resolver.computed_style(element)
+
+    def contrast_ratios():
+        for foreground, background in zip(foregrounds, backgrounds):
+            contrast_utils.contrast_ratio(foreground, background)
+
+    return {
+        "parse_html": lambda: parse_html(html),
+        "parse_css[cssutils]": lambda: parse_css(css, "cssutils"),
+        "parse_css[fast]": lambda: parse_css(css, "fast"),
+        "selector_index": lambda: SelectorIndex(styles),
+        "style_resolution": resolve_styles,
+        "contrast_ratio": contrast_ratios,
+        "contrast_ratios[numpy]":
+            lambda: contrast_utils.contrast_ratios(foregrounds, backgrounds),
+        "score_text_contrast": lambda: score_text_contrast(html, css),
+        "score_text_contrast_batch": lambda: score_text_contrast_batch(html, css),
+        "score_text_accessibility": lambda: score_text_accessibility(html, css),
+        "score_line_spacing": lambda: score_line_spacing(html, css),
+        "score_image_accessibility": lambda: score_image_accessibility(html, css),
+        "score_all": lambda: score_all(html, css),
+        "score_all[budget]":
+            lambda: score_all(html, css, scope=ScanScope(max_elements=BUDGET_ELEMENTS)),
+        "encode_json[stdlib]": lambda: dumps_bytes(results, "stdlib"),
+        "encode_json[orjson]": lambda: dumps_bytes(results, "orjson"),
+    }
+
+
+def time_stage(function):
+    """
+    Returns the best time in seconds of running a stage from cold caches.
+    """
+    best = float("inf")
+    for _ in range(REPEATS):
+        reset_caches()
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _measure_memory(connection, function):
+    """
+    Runs a stage in a forked process and sends back its peak traced allocations
+    and the growth of the process's peak RSS, both in bytes.
+    """
+    reset_caches()
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # ru_maxrss is in KiB on Linux
+    rss_growth = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before) * 1024
+    connection.send((peak, rss_growth))
+    connection.close()
+
+
+def measure_memory(function):
+    """
+    Returns the peak traced allocations and peak RSS growth of a stage, measured
+    in its own process so earlier stages do not hide its peak.
+    """
+    context = multiprocessing.get_context("fork")
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=_measure_memory, args=(sender, function))
+    process.start()
+    # Only the child holds the sending end, so a failing stage ends the pipe
+    sender.close()
+    try:
+        return receiver.recv()
+    except EOFError as error:
+        raise RuntimeError("The stage failed in its measuring process") from error
+    finally:
+        process.join()
+
+
+def run(size):
+    """
+    Benchmarks every stage on a page of a size preset.
+
+    Returns:
+        dict: Maps each stage name to its "time" in seconds and its "alloc_peak"
+              and "rss_growth" in bytes.
+    """
+    num_elements, depth, class_density, num_rules = SIZES[size]
+    html = generate_page(num_elements, depth, class_density=class_density)
+    css = generate_stylesheet(num_rules)
+    results = {}
+    for name, function in build_stages(html, css).items():
+        alloc_peak, rss_growth = measure_memory(function)
+        results[name] = {"time": time_stage(function), "alloc_peak": alloc_peak,
+                         "rss_growth": rss_growth}
+        print_row(name, results[name])
+    return results
+
+
+def print_row(name, result, baseline=None):
+    """
+    Prints the results of a stage, with its change from the baseline when known.
+    """
+    change = ""
+    if baseline:
+        change = f" {result['time'] / baseline['time'] - 1:>+8.1%}" if baseline["time"] else ""
+    print(f"{name:>28} {result['time']:>10.4f}s {result['alloc_peak'] / 2**20:>10.1f}MiB "
+          f"{result['rss_growth'] / 2**20:>10.1f}MiB{change}")
+
+
+def compare(results, baseline, threshold):
+    """
+    Returns the regressions of the results against a baseline, as messages.
+    """
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        if result["time"] >= MIN_COMPARED_TIME and \
+                result["time"] > previous["time"] * (1 + threshold):
+            regressions.append(f"{name}: {previous['time']:.4f}s -> {result['time']:.4f}s")
+        if result["alloc_peak"] > previous["alloc_peak"] * (1 + threshold):
+            regressions.append(f"{name}: allocations {previous['alloc_peak']} -> "
+                               f"{result['alloc_peak']} bytes")
+    return regressions
+
+
+def main():
+    """
+    Runs the benchmarks, then saves or compares against the baseline.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", maxsplit=1)[0])
+    parser.add_argument("--size", choices=SIZES, default="small", help="page size preset")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline JSON file")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="store the results as the baseline of this size")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="fraction a stage may exceed the baseline by")
+    args = parser.parse_args()
+
+    print(f"{args.size} page: {SIZES[args.size][0]} elements, {SIZES[args.size][3]} rules "
+          f"(best of {REPEATS} runs)")
+    print(f"{'stage':>28} {'time':>11} {'alloc peak':>13} {'rss growth':>13}")
+    results = run(args.size)
+
+    baselines = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as file:
+            baselines = json.load(file)
+
+    if args.save_baseline:
+        baselines[args.size] = results
+        with open(args.baseline, "w", encoding="utf-8") as file:
+            json.dump(baselines, file, indent=2)
+        print(f"Saved the baseline to {args.baseline}")
+        return
+
+    if args.size not in baselines:
+        print("No baseline for this size, run with --save-baseline to store one")
+        return
+
+    print()
+    print("Change from the baseline")
+    for name, result in results.items():
+        print_row(name, result, baselines[args.size].get(name))
+    regressions = compare(results, baselines[args.size], args.threshold)
+    for regression in regressions:
+        print("REGRESSION", regression)
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
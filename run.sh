@@ -1,5 +1,8 @@
 #!/bin/bash 
+# SERVER_MODE=asgi serves the API with uvicorn on an event loop (asgi.py) instead of waitress
+SERVER=app.py
+if [ "$SERVER_MODE" = "asgi" ]; then SERVER=asgi.py; fi
 source bin/activate && 
 (pip install -r requirements.txt || pip3 install -r requirements.txt) &&
-(python app.py || python3 app.py) && 
+(python $SERVER || python3 $SERVER) && 
 deactivate
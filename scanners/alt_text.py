@@ -12,46 +12,37 @@ if __name__ == "__main__":
     PATH = "/".join(sys.path[0].split("/")[:-1])
     sys.path[0] = PATH  # Fixed sys.PATH to sys.path
 
-def score_image_accessibility(html, css=None):
+def find_css_alt_patterns(css):
     """
-    Parses HTML content and optionally CSS content.
-    Returns the number of images with alt text and the total number of images.
+    Returns the alt values set through `img[alt=...]` attribute selectors in the CSS.
     """
-    total_images = 0
-    images_with_alt = 0
-    images_without_alt = []
-
-    soup = parse_html(html)
-
     # CSS can affect alt attributes if set as pseudo-elements; this is rare but possible.
     # If CSS is provided, we check for attributes related to alt content.
-    css_alt_patterns = []
-    if css:
-        css_alt_patterns = re.findall(r'img\[alt[^\]]*="([^"]*)"\]', css)
+    if not css:
+        return []
+    return re.findall(r'img\[alt[^\]]*="([^"]*)"\]', css)
 
-    # Analyze each image element in the HTML
-    for img_element in soup.find_all("img"):
-        total_images += 1
-        alt_text = img_element.get("alt", "").strip()
-
-        # Fallback to CSS-defined alt attribute if HTML alt is missing
-        if not alt_text and css_alt_patterns:
-            for pattern in css_alt_patterns:
-                if pattern in img_element.get("src", ""):
-                    alt_text = pattern
-                    break
-
-        if alt_text:  # If alt text is present
-            images_with_alt += 1
-        else:  # If alt text is missing
-            images_without_alt.append(img_element)
+def has_alt_text(img_element, css_alt_patterns):
+    """
+    Checks if an image element has alt text, either in the HTML or through the CSS.
+    """
+    alt_text = img_element.get("alt", "").strip()
 
-        debug_print(
-            f"Image: {img_element.get('src', 'No src')}, "
-            f"Alt Text: {'Present' if alt_text else 'Missing'}"
-        )
+    # Fallback to CSS-defined alt attribute if HTML alt is missing
+    if not alt_text and css_alt_patterns:
+        for pattern in css_alt_patterns:
+            if pattern in img_element.get("src", ""):
+                alt_text = pattern
+                break
 
+    debug_print("Image:", img_element.get("src", "No src"),
+                "Alt Text:", "Present" if alt_text else "Missing")
+    return bool(alt_text)
 
+def image_accessibility_result(total_images, images_with_alt):
+    """
+    Builds the image accessibility result from the image counts.
+    """
     if total_images == 0:
         return "No images on the page"
 
@@ -60,3 +51,22 @@ def score_image_accessibility(html, css=None):
         "total_images": total_images,
     "score": math.floor((images_with_alt / total_images) * 1000) / 10,
     }
+
+def score_image_accessibility(html, css=None):
+    """
+    Parses HTML content and optionally CSS content.
+    Returns the number of images with alt text and the total number of images.
+    """
+    total_images = 0
+    images_with_alt = 0
+
+    soup = parse_html(html)
+    css_alt_patterns = find_css_alt_patterns(css)
+
+    # Analyze each image element in the HTML
+    for img_element in soup.find_all("img"):
+        total_images += 1
+        if has_alt_text(img_element, css_alt_patterns):
+            images_with_alt += 1
+
+    return image_accessibility_result(total_images, images_with_alt)
@@ -0,0 +1,292 @@
+"""
+Scans many pages offline with every scanner and writes their scores and
+findings as JSONL or CSV. Pages are read from a JSONL file of {"href", "dom",
+"css"} records, or from a directory or tarball holding one page per .json
+record or .html file (with an optional .css file of the same name).
+
+Run from the root of the project with
+`python -m scanners.batch_scan INPUT OUTPUT [--workers N] [--format jsonl|csv]`.
+A checkpoint file next to the output lists the finished pages, so an
+interrupted run started again with the same arguments resumes where it stopped.
+Rows are written in the order the scans finish, not the input order, and are
+matched to their pages by id.
+"""
+import argparse
+import csv
+import json
+import os
+import tarfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, FIRST_COMPLETED, \
+    as_completed, wait
+from functools import partial
+from pathlib import Path
+from scanners.scan_all import IMAGE_SCANNER, TEXT_SCANNERS
+from scanners.scan_jobs import ALL_SCANNERS, coverage_field, run_scan, scan_job
+from utils.common_utils import ScanScope
+from utils.debug import configure_logging, get_logger
+from utils.json_provider import dumps_bytes
+from utils.request_limits import check_scan_input
+
+SELECTIONS = [*TEXT_SCANNERS, IMAGE_SCANNER]
+CHECKPOINT_SUFFIX = ".checkpoint"
+
+logger = get_logger(__name__)
+
+
+def page_record(page_id, html_content, css_content="", href=""):
+    """
+    Returns a page record as read from any input.
+    """
+    return {"id": page_id, "href": href or page_id, "dom": html_content, "css": css_content}
+
+
+def read_jsonl(path):
+    """
+    Yields the page records of a JSONL file, identified by their "id", "href" or line number.
+    """
+    with open(path, encoding="utf-8") as file:
+        for line_number, line in enumerate(file, 1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            page_id = record.get("id") or record.get("href") or f"{path}:{line_number}"
+            yield page_record(page_id, record.get("dom", ""), record.get("css", ""),
+                              record.get("href", ""))
+
+
+def read_pages(files):
+    """
+    Yields the page records of (name, read function) pairs of the files of a
+    directory or tarball. A page is a .json record, or a .html file with the
+    .css file of the same name.
+    """
+    files = dict(files)
+    for name in sorted(files):
+        stem, extension = os.path.splitext(name)
+        if extension == ".json":
+            record = json.loads(files[name]())
+            yield page_record(record.get("id") or name, record.get("dom", ""),
+                              record.get("css", ""), record.get("href", ""))
+        elif extension in (".html", ".htm"):
+            css_name = stem + ".css"
+            css_content = files[css_name]() if css_name in files else ""
+            yield page_record(name, files[name](), css_content)
+
+
+def read_directory(path):
+    """
+    Yields the page records of the files under a directory.
+    """
+    root = Path(path)
+    files = [
+        (str(file.relative_to(root)),
+         lambda file=file: file.read_text(encoding="utf-8", errors="replace"))
+        for file in root.rglob("*") if file.is_file()
+    ]
+    yield from read_pages(files)
+
+
+def read_tarball(path):
+    """
+    Yields the page records of the files of a tarball.
+    """
+    with tarfile.open(path) as tar:
+        def reader(member):
+            return lambda: tar.extractfile(member).read().decode("utf-8", errors="replace")
+        files = [(os.path.normpath(member.name), reader(member))
+                 for member in tar.getmembers() if member.isfile()]
+        yield from read_pages(files)
+
+
+def read_input(path):
+    """
+    Yields the page records of a JSONL file, directory or tarball.
+    """
+    if os.path.isdir(path):
+        return read_directory(path)
+    if tarfile.is_tarfile(path):
+        return read_tarball(path)
+    return read_jsonl(path)
+
+
+def scan_page(record, mode="compact", include_markup=False, scan=scan_job, viewport=None):
+    """
+    Runs every scanner on a page record and returns its result row: the
+    page's id, href, score per scanner and findings per text scanner, and
+    its coverage when it has more than MAX_ELEMENTS elements and is sampled.
+    The scan runs in the calling process, or through `run_scan` when given as scan,
+    with the styles of a ViewportProfile, by default the configured one.
+    """
+    row = {"id": record["id"], "href": record["href"]}
+    try:
+        sample_size, num_elements = check_scan_input(record["dom"], record["css"])
+        scope = None if sample_size is None else ScanScope(max_elements=sample_size, sample=True)
+        results, coverage = scan(ALL_SCANNERS, record["dom"], record["css"], mode,
+                                 include_markup, scope, viewport)
+    except Exception as error:  # pylint: disable=broad-exception-caught
+        # One broken page should not stop the audit of the others
+        row["error"] = f"{type(error).__name__}: {error}"
+        return row
+
+    image_result = results[IMAGE_SCANNER]
+    row["scores"] = {name: results[name][0] for name in TEXT_SCANNERS}
+    row["scores"][IMAGE_SCANNER] = image_result["score"] if isinstance(image_result, dict) \
+        else None
+    row["findings"] = {name: results[name][1] for name in TEXT_SCANNERS}
+    row.update(coverage_field(scope, coverage, num_elements))
+    return row
+
+
+def scan_records(records, workers=None, skip=(), max_pending=None, **options):
+    """
+    Scans page records in parallel worker processes.
+
+    Args:
+        records (iterable): The page records to scan.
+        workers (int): The number of worker processes, defaulting to the CPU count.
+        skip (collection): The ids of the pages not to scan again.
+        max_pending (int): The number of pages read ahead of the workers,
+                           defaulting to four per worker.
+        **options: The response mode and include_markup passed to `scan_page`.
+
+    Yields:
+        dict: The result row of each page, in the order the scans finish.
+    """
+    workers = workers or os.cpu_count() or 1
+    max_pending = max_pending or workers * 4
+    with ProcessPoolExecutor(workers) as executor:
+        pending = set()
+        for record in records:
+            if record["id"] in skip:
+                continue
+            pending.add(executor.submit(scan_page, record, **options))
+            if len(pending) >= max_pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        for future in pending:
+            yield future.result()
+
+
+def scan_records_on_pool(records, threads, **options):
+    """
+    Scans page records through the shared scan worker pool of the server. The
+    pages wait for the pool to admit them rather than being rejected, and the
+    pages not started yet are cancelled when the generator is closed, as when
+    the client of a streamed response disconnects.
+
+    Args:
+        records (list): The page records to scan.
+        threads (int): The number of pages sent to the pool at once.
+        **options: The response mode, include_markup and viewport passed to `scan_page`.
+
+    Yields:
+        dict: The result row of each page, in the order the scans finish.
+    """
+    executor = ThreadPoolExecutor(threads)
+    try:
+        futures = [executor.submit(scan_page, record, scan=partial(run_scan, wait=True),
+                                   **options)
+                   for record in records]
+        for future in as_completed(futures):
+            yield future.result()
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def read_checkpoint(path):
+    """
+    Returns the ids of the pages listed in a checkpoint file.
+    """
+    if not os.path.exists(path):
+        return set()
+    with open(path, encoding="utf-8") as file:
+        return {line.rstrip("\n") for line in file if line.strip()}
+
+
+def csv_writer(file):
+    """
+    Returns a CSV writer of result rows appending to a file, writing the
+    header first when the file is empty.
+    """
+    columns = ["id", "href", *SELECTIONS,
+               *(f"{name} findings" for name in TEXT_SCANNERS), "error"]
+    writer = csv.DictWriter(file, columns)
+    if file.tell() == 0:
+        writer.writeheader()
+    return writer
+
+
+def write_row(file, row, writer=None):
+    """
+    Writes a result row as a JSON line, or as a CSV row with the number of
+    findings when given a CSV writer, and flushes it to disk.
+    """
+    if writer is None:
+        file.write(dumps_bytes(row).decode("utf-8") + "\n")
+    else:
+        writer.writerow({
+            "id": row["id"],
+            "href": row["href"],
+            **row.get("scores", {}),
+            **{f"{name} findings": len(findings)
+               for name, findings in row.get("findings", {}).items()},
+            "error": row.get("error", ""),
+        })
+    file.flush()
+
+
+def run_batch(input_path, output_path, output_format=None, workers=None, restart=False):
+    """
+    Scans every page of an input and appends the result rows to the output,
+    skipping the pages listed in the output's checkpoint.
+
+    Returns:
+        int: The number of pages scanned by this run.
+    """
+    output_format = output_format or ("csv" if output_path.endswith(".csv") else "jsonl")
+    checkpoint_path = output_path + CHECKPOINT_SUFFIX
+    if restart:
+        for path in (output_path, checkpoint_path):
+            if os.path.exists(path):
+                os.remove(path)
+    done = read_checkpoint(checkpoint_path)
+    if done:
+        logger.info("resuming after %d scanned pages", len(done))
+
+    scanned = 0
+    with open(output_path, "a", encoding="utf-8", newline="") as output, \
+            open(checkpoint_path, "a", encoding="utf-8") as checkpoint:
+        writer = csv_writer(output) if output_format == "csv" else None
+        for row in scan_records(read_input(input_path), workers, skip=done):
+            write_row(output, row, writer)
+            # Written after the row, so a page is never skipped without its result
+            checkpoint.write(row["id"] + "\n")
+            checkpoint.flush()
+            scanned += 1
+            if "error" in row:
+                logger.warning("could not scan %s: %s", row["id"], row["error"])
+    return scanned
+
+
+def main():
+    """
+    Runs a batch scan from the command line.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", maxsplit=1)[0])
+    parser.add_argument("input", help="JSONL file, directory or tarball of pages")
+    parser.add_argument("output", help="JSONL or CSV file the results are appended to")
+    parser.add_argument("--format", choices=["jsonl", "csv"],
+                        help="output format, by default from the output extension")
+    parser.add_argument("--workers", type=int, help="number of worker processes")
+    parser.add_argument("--restart", action="store_true",
+                        help="discard the output and checkpoint of a previous run")
+    args = parser.parse_args()
+
+    configure_logging()
+    scanned = run_batch(args.input, args.output, args.format, args.workers, args.restart)
+    logger.info("scanned %d pages", scanned)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,94 @@
 """
 Calculates color contrast ratio.
 """
-from utils.contrast_utils import contrast_ratio, hex_to_rgb, css_to_hex
-from utils.debug import debug_print
-from utils.common_utils import parse_and_iterate_elements, calculate_score
-from services.html_parser import get_computed_style
+import numpy as np
+from utils.contrast_utils import contrast_ratio, contrast_ratios, composite, parse_color, \
+    rgb_to_hex, BLACK
+from utils.debug import debug_print, element_detail_enabled, get_logger
+from utils.common_utils import parse_and_iterate_elements, calculate_score, is_scannable_text, \
+    Finding, node_indexes
+from utils.settings import env_int
+from services.html_parser import parse_html
+from services.stylesheet_cache import load_stylesheet
+from services.style_resolver import StyleResolver
 
+# Selection name of the scanner, which also labels its timed stage
+SELECTION = "color-contrast"
 NORMAL_TEXT_CONTRAST_RATIO = 4.5
 OTHER_CONTRACT_RATIO = 3
+ENHANCED_TEXT_CONTRAST_RATIO = 7
+ENHANCED_OTHER_CONTRAST_RATIO = 4.5
+# WCAG large text is at least 18pt, or 14pt when bold
+LARGE_TEXT_SIZE_PX = 24
+BOLD_LARGE_TEXT_SIZE_PX = 18.66
+MIN_FONT_WEIGHT_BOLD = 700
+FONT_WEIGHT_KEYWORDS = {"normal": 400, "bold": 700, "lighter": 100, "bolder": 700}
 TAGS_TO_SKIP = ["html", "title", "head", "style", "script", "body"]
+# Scans with at least this many text elements evaluate their contrast in one NumPy pass
+CONTRAST_BATCH_MIN_ELEMENTS = env_int("CONTRAST_BATCH_MIN_ELEMENTS", 1000)
+
+logger = get_logger(__name__)
+
+def text_colors(elem_style, bg_rgb):
+    """
+    Returns the opaque (text, background) rgb colors of a computed style drawn
+    over the element's resolved background.
+    """
+    # Get the text color, defaulting to black
+    color = parse_color(elem_style.get("color", "")) or BLACK
+    # Blend a translucent text color over the background underneath it
+    return composite(color, bg_rgb), bg_rgb
+
+def contrast_sample(element, style_resolver):
+    """
+    Returns the opaque text and background rgb colors, the font size in px and
+    the numeric font weight of an element.
+    """
+    elem_style = style_resolver.computed_style(element)
+    debug_print(element.name, elem_style)
+    color_rgb, bg_rgb = text_colors(elem_style, style_resolver.background(element))
+    return color_rgb, bg_rgb, style_resolver.font_size(element), font_weight_value(elem_style)
+
+def required_contrast_ratio(font_size, font_weight):
+    """
+    Returns the WCAG AA contrast ratio text of a font size and weight needs:
+    a lower one for large text.
+    """
+    is_large = font_size >= LARGE_TEXT_SIZE_PX or (
+        font_size >= BOLD_LARGE_TEXT_SIZE_PX and font_weight >= MIN_FONT_WEIGHT_BOLD
+    )
+    return OTHER_CONTRACT_RATIO if is_large else NORMAL_TEXT_CONTRAST_RATIO
+
+def contrast_metrics(ratio, color_rgb, bg_rgb):
+    """
+    Returns the metrics of a contrast finding.
+    """
+    return {
+        "contrast_ratio": round(float(ratio), 2),
+        "color": rgb_to_hex(color_rgb),
+        "background_color": rgb_to_hex(bg_rgb),
+    }
+
+def has_accessible_contrast(element, style_resolver):
+    """
+    Checks if the text of an element has adequate contrast against its background,
+    with the lower threshold of large text.
+    Returns whether it does, with the colors and contrast ratio that were compared.
+    """
+    color_rgb, bg_rgb, font_size, font_weight = contrast_sample(element, style_resolver)
+    # Calculate the contrast ratio
+    ratio = contrast_ratio(color_rgb, bg_rgb)
+    is_accessible = ratio >= required_contrast_ratio(font_size, font_weight)
+
+    # Debug log for each element's contrast details
+    if element_detail_enabled():
+        logger.debug(
+            "Element: %s, Text Color: %s, Background Color: %s, Contrast Ratio: %.2f, "
+            "Is Accessible: %s", element.name, rgb_to_hex(color_rgb), rgb_to_hex(bg_rgb),
+            ratio, is_accessible
+        )
+
+    return is_accessible, contrast_metrics(ratio, color_rgb, bg_rgb)
 
 def score_text_contrast(html_content, css_content):
     """
@@ -16,30 +96,131 @@ def score_text_contrast(html_content, css_content):
     Returns a score based on the percentage of text elements with
     adequate contrast between text and background colors.
     """
-    def handle_element(element, styles):
-        elem_style = get_computed_style(element, styles)
-        debug_print(element, elem_style)
-        # Get the text color and background color
-        color = css_to_hex(elem_style.get("color", ""))
-        background_color = css_to_hex(elem_style.get("background-color", ""))
-        # Convert colors to RGB values
-        color_rgb = hex_to_rgb(color if color is not None else "#000000")
-        bg_rgb = hex_to_rgb(background_color if background_color is not None else "#FFFFFF")
-        # Calculate the contrast ratio
-        ratio = contrast_ratio(color_rgb, bg_rgb)
-        is_accessible = ratio >= NORMAL_TEXT_CONTRAST_RATIO
-
-        # Debug print for each element's contrast details
-        print(
-            f"Element: {element.name}, Text Color: {color}, "
-            f"Background Color: {background_color}, Contrast Ratio: {ratio:.2f}, "
-            f"Is Accessible: {is_accessible}"
-        )
-
-        return is_accessible
-
     num_elements, num_accessible, inaccessible_elements = parse_and_iterate_elements(
-        html_content, css_content, TAGS_TO_SKIP, handle_element
+        html_content, css_content, TAGS_TO_SKIP, has_accessible_contrast, SELECTION
     )
 
     return calculate_score(num_elements, num_accessible, inaccessible_elements)
+
+def font_weight_value(elem_style):
+    """
+    Returns the numeric font weight of a computed style.
+    """
+    font_weight = elem_style.get("font-weight", "400")
+    if font_weight in FONT_WEIGHT_KEYWORDS:
+        return FONT_WEIGHT_KEYWORDS[font_weight]
+    try:
+        return int(font_weight)
+    except ValueError:
+        return 400
+
+def evaluate_contrast_batch(colors, backgrounds, font_sizes, font_weights):
+    """
+    Evaluates the contrast of many text elements in one vectorized pass.
+
+    Args:
+        colors (array-like): An (N, 3) array of the opaque rgb text colors.
+        backgrounds (array-like): An (N, 3) array of the opaque rgb background colors.
+        font_sizes (array-like): The N font sizes in px.
+        font_weights (array-like): The N numeric font weights.
+
+    Returns:
+        dict: Arrays of the contrast "ratio", whether the text is "large", and
+              whether it passes WCAG level "aa" and "aaa" with the large text
+              thresholds applied.
+    """
+    ratios = contrast_ratios(colors, backgrounds)
+    font_sizes = np.asarray(font_sizes, dtype=float)
+    font_weights = np.asarray(font_weights, dtype=float)
+    large = (font_sizes >= LARGE_TEXT_SIZE_PX) | (
+        (font_sizes >= BOLD_LARGE_TEXT_SIZE_PX) & (font_weights >= MIN_FONT_WEIGHT_BOLD)
+    )
+    return {
+        "ratio": ratios,
+        "large": large,
+        "aa": ratios >= np.where(large, OTHER_CONTRACT_RATIO, NORMAL_TEXT_CONTRAST_RATIO),
+        "aaa": ratios >= np.where(large, ENHANCED_OTHER_CONTRAST_RATIO,
+                                  ENHANCED_TEXT_CONTRAST_RATIO),
+    }
+
+class ContrastBatch:
+    """
+    Collects the contrast samples of the text elements of a scan while the
+    document is walked, then evaluates them together: in one NumPy pass from
+    CONTRAST_BATCH_MIN_ELEMENTS elements, and one element at a time below that.
+    """
+
+    def __init__(self, min_elements=None):
+        """
+        Args:
+            min_elements (int): The number of elements from which the samples are
+                                evaluated in one vectorized pass, by default
+                                CONTRAST_BATCH_MIN_ELEMENTS.
+        """
+        self.min_elements = CONTRAST_BATCH_MIN_ELEMENTS if min_elements is None \
+            else min_elements
+        self.elements = []
+        self.samples = []
+        # The arrays of `evaluate_contrast_batch`, once evaluated in one pass
+        self.evaluation = None
+
+    def add(self, element, style_resolver):
+        """
+        Element handler collecting the sample of an element. Every element
+        counts as accessible until the batch is evaluated.
+        """
+        self.elements.append(element)
+        self.samples.append(contrast_sample(element, style_resolver))
+        return True, None
+
+    def evaluate(self, soup):
+        """
+        Evaluates the contrast of the collected elements.
+
+        Args:
+            soup (BeautifulSoup): The parsed document, which numbers the findings.
+
+        Returns:
+            tuple: (num_elements, num_accessible, findings) as `iterate_checks`
+                   returns them for a check.
+        """
+        if self.samples and len(self.samples) >= self.min_elements:
+            self.evaluation = evaluate_contrast_batch(
+                *(np.array(column) for column in zip(*self.samples))
+            )
+            ratios = self.evaluation["ratio"].tolist()
+            accessible = self.evaluation["aa"].tolist()
+        else:
+            ratios = [contrast_ratio(color, background)
+                      for color, background, _, _ in self.samples]
+            accessible = [ratio >= required_contrast_ratio(font_size, font_weight)
+                          for ratio, (_, _, font_size, font_weight) in zip(ratios, self.samples)]
+
+        failed = [i for i, is_accessible in enumerate(accessible) if not is_accessible]
+        indexes = node_indexes(soup, [self.elements[i] for i in failed])
+        findings = [
+            Finding(self.elements[i], indexes[id(self.elements[i])],
+                    contrast_metrics(ratios[i], *self.samples[i][:2]))
+            for i in failed
+        ]
+        return len(self.samples), len(self.samples) - len(failed), findings
+
+def score_text_contrast_batch(html_content, css_content):
+    """
+    Parses HTML and CSS content and evaluates the contrast of every text element
+    in one vectorized pass. Suited to offline bulk audits of large pages.
+    Returns the same [score, findings] as `score_text_contrast`,
+    followed by the arrays of `evaluate_contrast_batch` (None without text elements).
+    """
+    soup = parse_html(html_content)
+    style_resolver = StyleResolver(load_stylesheet(css_content))
+    batch = ContrastBatch(min_elements=0)
+    for element in soup.find_all(True):
+        if is_scannable_text(element, TAGS_TO_SKIP):
+            batch.add(element, style_resolver)
+
+    num_elements, num_accessible, inaccessible_elements = batch.evaluate(soup)
+    score, inaccessible_elements = calculate_score(
+        num_elements, num_accessible, inaccessible_elements
+    )
+    return [score, inaccessible_elements, batch.evaluation]
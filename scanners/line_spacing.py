@@ -1,47 +1,55 @@
 """
 Module to evaluate line spacing for accessibility.
 """
-from utils.debug import debug_print
-from utils.text_computations import compute_font_size, compute_line_height
+from utils.debug import debug_print, element_detail_enabled, get_logger
 from utils.common_utils import parse_and_iterate_elements, calculate_score
-from services.html_parser import get_computed_style
 
+# Selection name of the scanner, which also labels its timed stage
+SELECTION = "line-spacing"
 BODY_TEXT_RATIO = 1.5
 HEADER_TEXT_RATIO = 1.2
 TAGS_TO_SKIP = ["html", "title", "head", "style", "script", "body"]
 HEADER_TAGS = ["h1", "h2", "h3", "h4", "h5", "h6"]
 
+logger = get_logger(__name__)
+
+def has_accessible_line_spacing(element, style_resolver):
+    """
+    Handle each element by evaluating its line spacing accessibility.
+    Returns whether it is accessible, with the measurements that were compared.
+    """
+    elem_style = style_resolver.computed_style(element)
+    debug_print(element.name, elem_style)
+
+    # Compute font size and line height
+    font_size_val = style_resolver.font_size(element)
+    line_height_val = style_resolver.line_height(element)
+
+    # Determine if line height meets accessibility ratio
+    required_ratio = HEADER_TEXT_RATIO if element.name in HEADER_TAGS else BODY_TEXT_RATIO
+    line_spacing_ratio = line_height_val / font_size_val if font_size_val else 0.0
+    is_accessible = line_spacing_ratio >= required_ratio
+
+    # Debug log for element details
+    if element_detail_enabled():
+        logger.debug("Element: %s, Font Size: %spx, Line Height: %spx, "
+                     "Line Spacing Ratio: %.2f, Is Accessible: %s", element.name,
+                     font_size_val, line_height_val, line_spacing_ratio, is_accessible)
+
+    return is_accessible, {
+        "font_size": font_size_val,
+        "line_height": line_height_val,
+        "line_spacing_ratio": round(line_spacing_ratio, 2),
+    }
+
 def score_line_spacing(html_content, css_content):
     """
     Parses HTML and CSS content.
     Returns a score based on the percentage of text elements with
     adequate line spacing according to WCAG standards.
     """
-    def handle_element(element, styles):
-        """
-        Handle each element by evaluating its line spacing accessibility.
-        """
-        elem_style = get_computed_style(element, styles)
-        debug_print(element, elem_style)
-
-        # Compute font size and line height
-        font_size_val = compute_font_size(elem_style, element.name)
-        line_height_val = compute_line_height(elem_style, font_size_val)
-
-        # Determine if line height meets accessibility ratio
-        required_ratio = HEADER_TEXT_RATIO if element.name in HEADER_TAGS else BODY_TEXT_RATIO
-        line_spacing_ratio = line_height_val / font_size_val
-        is_accessible = line_spacing_ratio >= required_ratio
-
-        # Debug print for element details
-        print(f"Element: {element.name}, Font Size: {font_size_val}px, "
-              f"Line Height: {line_height_val}px, Line Spacing Ratio: {line_spacing_ratio:.2f}, "
-              f"Is Accessible: {is_accessible}")
-
-        return is_accessible
-
     num_elements, num_accessible, inaccessible_elements = parse_and_iterate_elements(
-        html_content, css_content, TAGS_TO_SKIP, handle_element
+        html_content, css_content, TAGS_TO_SKIP, has_accessible_line_spacing, SELECTION
     )
 
     return calculate_score(num_elements, num_accessible, inaccessible_elements)
@@ -0,0 +1,115 @@
+"""
+Runs every registered scanner over a single parse of the HTML and CSS content.
+"""
+from functools import partial
+from scanners import color_contrast_scanner, line_spacing, text_scanner
+from scanners.alt_text import find_css_alt_patterns, has_alt_text, image_accessibility_result
+from services.stylesheet_cache import load_stylesheet
+from services.html_parser import parse_html
+from utils.common_utils import calculate_score, is_scannable_text, iter_findings, \
+    iterate_checks, scope_html, scoped_elements
+from utils.timing import stage_timer
+
+# Maps each text scanner's selection name to its skip list and element check
+TEXT_SCANNERS = {
+    color_contrast_scanner.SELECTION: (color_contrast_scanner.TAGS_TO_SKIP,
+                                       color_contrast_scanner.has_accessible_contrast),
+    text_scanner.SELECTION: (text_scanner.TAGS_TO_SKIP, text_scanner.has_accessible_text_size),
+    line_spacing.SELECTION: (line_spacing.TAGS_TO_SKIP,
+                             line_spacing.has_accessible_line_spacing),
+}
+IMAGE_SCANNER = "alt-text"
+CONTRAST_SCANNER = color_contrast_scanner.SELECTION
+
+def is_image(element):
+    """
+    Checks if an element is an image.
+    """
+    return element.name == "img"
+
+def build_checks(css_content, selections=None):
+    """
+    Returns the (element_filter, element_handler) checks of the selected
+    scanners, or of every registered scanner when no selection is given.
+    """
+    selections = selections or [*TEXT_SCANNERS, IMAGE_SCANNER]
+    checks = {
+        name: (partial(is_scannable_text, tags_to_skip=tags_to_skip), element_handler)
+        for name, (tags_to_skip, element_handler) in TEXT_SCANNERS.items()
+        if name in selections
+    }
+    if IMAGE_SCANNER in selections:
+        css_alt_patterns = find_css_alt_patterns(css_content)
+        checks[IMAGE_SCANNER] = (
+            is_image,
+            lambda element, _style_resolver: (has_alt_text(element, css_alt_patterns), {})
+        )
+    return checks
+
+# The scans take the scan scope, its coverage and the viewport as plain arguments
+# pylint: disable=too-many-arguments,too-many-positional-arguments
+def score_all(html_content, css_content, selections=None, scope=None, coverage=None,
+              viewport=None):
+    """
+    Parses HTML and CSS content once and walks the elements once,
+    sending each element to every selected scanner check, by default
+    every registered scanner.
+    Returns a dictionary mapping each scanner's selection name to the
+    same result its individual scanner function returns.
+    A ScanScope limits the walk to a region of the page or an element budget,
+    and the coverage dictionary is filled as by `scoped_elements`. The styles
+    are evaluated for a ViewportProfile, by default the configured one.
+    """
+    html_content, cut = scope_html(html_content, scope)
+    soup = parse_html(html_content)
+    styles = load_stylesheet(css_content, viewport)
+
+    coverage = {} if coverage is None else coverage
+    checks = build_checks(css_content, selections)
+    # The contrast of the text elements is evaluated together once they are all collected
+    contrast_batch = None
+    if CONTRAST_SCANNER in checks:
+        contrast_batch = color_contrast_scanner.ContrastBatch()
+        checks[CONTRAST_SCANNER] = (checks[CONTRAST_SCANNER][0], contrast_batch.add)
+    counts = iterate_checks(soup, styles, checks, scope, coverage)
+    if contrast_batch is not None:
+        with stage_timer(f"evaluate:{CONTRAST_SCANNER}"):
+            counts[CONTRAST_SCANNER] = contrast_batch.evaluate(soup)
+    coverage["complete"] = coverage["complete"] and not cut
+
+    results = {name: calculate_score(*counts[name]) for name in TEXT_SCANNERS if name in counts}
+    if IMAGE_SCANNER in counts:
+        total_images, images_with_alt, _ = counts[IMAGE_SCANNER]
+        results[IMAGE_SCANNER] = image_accessibility_result(total_images, images_with_alt)
+    return results
+
+def stream_all(html_content, css_content, selections=None, scope=None, viewport=None):
+    """
+    Runs the selected scanners like `score_all`, but yields each inaccessible
+    element while the document is still being walked.
+
+    Yields:
+        tuple: ("finding", selection name, Finding) for each inaccessible element,
+               then ("summary", results, coverage) where results maps each selection
+               name to its score, or to the image accessibility result for alt text,
+               and coverage is filled as by `scoped_elements`.
+    """
+    html_content, cut = scope_html(html_content, scope)
+    soup = parse_html(html_content)
+    styles = load_stylesheet(css_content, viewport)
+
+    counts = {}
+    coverage = {}
+    elements = scoped_elements(soup, scope, coverage)
+    checks = build_checks(css_content, selections)
+    for name, finding in iter_findings(elements, styles, checks, counts):
+        if name != IMAGE_SCANNER:
+            yield "finding", name, finding
+
+    coverage["complete"] = coverage["complete"] and not cut
+    results = {
+        name: image_accessibility_result(*count) if name == IMAGE_SCANNER
+        else calculate_score(*count, [])[0]
+        for name, count in counts.items()
+    }
+    yield "summary", results, coverage
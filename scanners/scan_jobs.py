@@ -0,0 +1,116 @@
+"""
+Scan jobs that can run in a worker process. Each job parses and scans the page
+and returns its results already serialized, since parsed elements are not
+worth sending back between processes. The serialized results are cached, so
+scanning the same page again with the same options skips the scan.
+"""
+from scanners import alt_text, color_contrast_scanner, line_spacing, text_scanner
+from scanners.alt_text import score_image_accessibility
+from scanners.color_contrast_scanner import score_text_contrast
+from scanners.line_spacing import score_line_spacing
+from scanners.scan_all import IMAGE_SCANNER, score_all
+from scanners.text_scanner import score_text_accessibility
+from services import css_parser, css_tokenizer, html_parser, media_queries, selector_index, \
+    style_resolver
+from services.result_cache import result_cache, result_key, ruleset_version
+from services.worker_pool import worker_pool
+from utils import contrast_utils, lengths
+from utils.element_refs import RESPONSE_MODE, serialize_findings
+
+ALL_SCANNERS = "all"
+# Maps each selection name to the function scoring it on its own
+SCANNER_FUNCTIONS = {
+    "color-contrast": score_text_contrast,
+    "large-text": score_text_accessibility,
+    "line-spacing": score_line_spacing,
+    IMAGE_SCANNER: score_image_accessibility,
+}
+# Bumped when the scanners change the results they return for the same page
+RULESET_REVISION = 5
+# The modules whose constants decide the results: the scanners, the cascade and
+# the value parsing they rely on, and the HTML and CSS parser backends
+RULESET_MODULES = (
+    alt_text, color_contrast_scanner, line_spacing, text_scanner, style_resolver, selector_index,
+    lengths, contrast_utils, media_queries, css_parser, css_tokenizer, html_parser,
+)
+# Stamp of the thresholds and rules of those modules, part of each cached result's key
+RULESET_VERSION = ruleset_version(*RULESET_MODULES) + f".{RULESET_REVISION}"
+
+
+def serialize_results(results, mode=None, include_markup=False):
+    """
+    Serializes the findings of scan results mapped by selection name, in the
+    format of `score_all`, with `serialize_findings`.
+    """
+    # The findings of every scanner are in the same document
+    positions = {}
+    return {
+        selection: result if selection == IMAGE_SCANNER
+        else [result[0], serialize_findings(result[1], mode, include_markup, positions)]
+        for selection, result in results.items()
+    }
+
+
+# The scan jobs take the response options, scan scope and viewport positionally,
+# so they can be sent to the worker pool as plain arguments
+# pylint: disable=too-many-arguments,too-many-positional-arguments
+def scan_job(selection, html_content, css_content, mode=None, include_markup=False,
+             scope=None, viewport=None):
+    """
+    Runs one scanner, or every scanner for "all", over the page or the region
+    and element budget of a ScanScope, with the styles of a ViewportProfile.
+
+    Returns:
+        tuple: The serialized results mapped by selection name, and the
+               coverage of the scan as filled by `scoped_elements`.
+    """
+    coverage = {}
+    if selection == ALL_SCANNERS:
+        results = score_all(html_content, css_content, scope=scope, coverage=coverage,
+                            viewport=viewport)
+    elif scope is None and viewport is None:
+        results = {selection: SCANNER_FUNCTIONS[selection](html_content, css_content)}
+    else:
+        results = score_all(html_content, css_content, [selection], scope, coverage, viewport)
+    return serialize_results(results, mode, include_markup), coverage
+
+
+def run_scan(selection, html_content, css_content, mode=None, include_markup=False,
+             scope=None, viewport=None, wait=False):
+    """
+    Runs a scan job on the worker pool, unless the results of the same scan
+    are cached. The job is admitted based on the size of the page and its
+    stylesheet, or waits to be admitted when wait is set.
+
+    Returns:
+        tuple: The results and coverage as returned by `scan_job`. Cached
+               results are shared between requests and must not be modified.
+
+    Raises:
+        ScanRejected: If too many scans are in progress.
+        ScanTimeout: If the scan runs longer than SCAN_TIMEOUT.
+    """
+    key = result_key(RULESET_VERSION, selection, html_content, css_content,
+                     mode or RESPONSE_MODE, include_markup, scope, viewport)
+    cached = result_cache.get(key)
+    if cached is not None:
+        # Results read back from the database come as a list
+        return tuple(cached)
+
+    size = len(html_content) + len(css_content)
+    results, coverage = worker_pool.run(scan_job, selection, html_content, css_content, mode,
+                                        include_markup, scope, viewport, size=size, wait=wait)
+    result_cache.put(key, (results, coverage))
+    return results, coverage
+
+
+def coverage_field(scope, coverage, estimated_elements):
+    """
+    Returns the "coverage" field of the response of a scan limited by a
+    ScanScope, with the estimated number of elements of the whole page, or
+    no field for a scan of every element.
+    """
+    if scope is None:
+        return {}
+    return {"coverage": {**coverage, "sampled": scope.sample,
+                         "estimated_elements": estimated_elements}}
@@ -0,0 +1,342 @@
+"""
+Keeps the parsed document and per-element results of a scan on the server, so
+later scans of the same page only re-evaluate the elements that changed.
+"""
+import secrets
+from threading import Lock
+from scanners.scan_all import IMAGE_SCANNER, build_checks
+from scanners.alt_text import image_accessibility_result
+from services.html_parser import parse_html
+from services.stylesheet_cache import load_stylesheet
+from services.style_resolver import StyleResolver
+from utils.common_utils import Finding, calculate_score, node_indexes
+from utils.element_refs import resolve_css_path
+from utils.lru_cache import LRUCache
+from utils.request_limits import InputTooLarge
+from utils.settings import env_int
+
+SCAN_SESSION_LIMIT = env_int("SCAN_SESSION_LIMIT", 256)
+# Total size of the stored documents and stylesheets of the sessions kept
+SCAN_SESSION_MAX_BYTES = env_int("SCAN_SESSION_MAX_BYTES", 64 * 1024 * 1024)
+# Seconds a session is kept after its last scan (0 keeps it until evicted)
+SCAN_SESSION_TTL = env_int("SCAN_SESSION_TTL", 900)
+
+# The fields of each change operation, with the types they accept
+CHANGE_FIELDS = {
+    "add": {"parent": str, "html": str, "index": int},
+    "remove": {"target": str},
+    "modify": {"target": str, "html": str, "attributes": dict},
+}
+
+sessions = LRUCache(max_entries=SCAN_SESSION_LIMIT, max_bytes=SCAN_SESSION_MAX_BYTES,
+                    ttl=SCAN_SESSION_TTL or None)
+
+
+class ScanSession:
+    """
+    A scanned document and the results of every check on each of its elements.
+    Changes are applied to the stored document, and only the elements whose
+    results they can affect are checked again.
+    """
+
+    def __init__(self, html_content, css_content, viewport=None):
+        """
+        Args:
+            html_content (str): The raw HTML content of the first scan.
+            css_content (str): The raw CSS content of the first scan.
+            viewport (ViewportProfile): The viewport the styles are evaluated for,
+                                        by default the configured one.
+        """
+        self.soup = parse_html(html_content)
+        self.lock = Lock()
+        self.css = None
+        self.checks = {}
+        self.style_resolver = None
+        # Per check, the (checked elements, inaccessible elements and their metrics)
+        self._results = {}
+        # The size of the stored document and stylesheet, kept up to date by the
+        # changes, which the sessions kept are bounded by
+        self.size = len(str(self.soup))
+        self.set_css(css_content, viewport)
+
+    def set_css(self, css_content, viewport=None):
+        """
+        Replaces the stylesheet and checks every element again, since any of
+        their styles can change with it. The styles are evaluated for the
+        viewport, by default the one of the session's current stylesheet.
+        """
+        if viewport is None and self.style_resolver is not None:
+            viewport = self.style_resolver.index.viewport
+        self.size += len(css_content) - len(self.css or "")
+        self.css = css_content
+        self.checks = build_checks(css_content)
+        self.style_resolver = StyleResolver(load_stylesheet(css_content, viewport))
+        self._results = {name: ({}, {}) for name in self.checks}
+        self._evaluate(self.soup.find_all(True))
+
+    def apply(self, changes):
+        """
+        Applies DOM changes to the stored document and checks the affected
+        elements again. Each change is a dictionary with an "op" of:
+
+        - "add": parses "html" and inserts it into the element at the "parent"
+          CSS path, before its element child at "index" or at the end.
+        - "remove": removes the element at the "target" CSS path.
+        - "modify": replaces the element at "target" with "html", or updates its
+          "attributes" (a None value removes the attribute).
+
+        CSS paths are those of the compact element references, and refer to the
+        document as left by the previous changes.
+
+        Raises:
+            ValueError: If a change is malformed or its element is not found.
+                        Malformed changes are found before any is applied; the
+                        changes before one whose element is missing stay applied.
+        """
+        check_changes(changes)
+        for change in changes:
+            operation = change["op"]
+            if operation == "add":
+                self._add(change)
+            elif operation == "remove":
+                self._replace(self._locate(change["target"]), "")
+            elif "html" in change:
+                self._replace(self._locate(change["target"]), change["html"])
+            else:
+                self._set_attributes(self._locate(change["target"]), change["attributes"])
+
+    def results(self):
+        """
+        Returns the current results in the same format as `score_all`. The
+        counts are kept up to date by the checks, and only the document up to
+        the last inaccessible element is walked to number the findings.
+        """
+        indexes = node_indexes(self.soup, [element for _, failed in self._results.values()
+                                           for element, _ in failed.values()])
+        results = {}
+        for name, (checked, failed) in self._results.items():
+            num_elements = len(checked)
+            num_accessible = num_elements - len(failed)
+            if name == IMAGE_SCANNER:
+                results[name] = image_accessibility_result(num_elements, num_accessible)
+                continue
+            findings = sorted((Finding(element, indexes[id(element)], metrics)
+                               for element, metrics in failed.values()),
+                              key=lambda finding: finding.node_index)
+            results[name] = calculate_score(num_elements, num_accessible, findings)
+        return results
+
+    def _locate(self, path):
+        """
+        Returns the element at a CSS path of the stored document.
+        """
+        element = resolve_css_path(self.soup, path) if path else None
+        if element is None:
+            raise ValueError(f"No element at {path}")
+        return element
+
+    def _add(self, change):
+        """
+        Inserts the parsed markup of an "add" change and checks the new elements.
+        """
+        parent = self._locate(change.get("parent"))
+        nodes = list(parse_html(change.get("html", ""), "html.parser").contents)
+        siblings = parent.find_all(True, recursive=False)
+        index = change.get("index")
+        if index is not None and 0 <= index < len(siblings):
+            for node in nodes:
+                siblings[index].insert_before(node)
+        else:
+            for node in nodes:
+                parent.append(node)
+        self.size += sum(len(str(node)) for node in nodes)
+        self._evaluate_inserted(parent, nodes)
+
+    def _replace(self, element, html_content):
+        """
+        Replaces an element with parsed markup, or removes it when the markup is
+        empty, and checks the new elements.
+        """
+        parent = element.parent
+        self._forget(element)
+        self.size -= len(str(element))
+        nodes = list(parse_html(html_content, "html.parser").contents)
+        self.size += sum(len(str(node)) for node in nodes)
+        if nodes:
+            element.replace_with(*nodes)
+        else:
+            element.extract()
+        self._evaluate_inserted(parent, nodes)
+
+    def _set_attributes(self, element, attributes):
+        """
+        Updates the attributes of an element and checks it and its descendants,
+        which inherit its style.
+        """
+        self.size -= _attributes_size(element)
+        for name, value in attributes.items():
+            if value is None:
+                element.attrs.pop(name, None)
+            else:
+                element[name] = value.split() if name == "class" else value
+        self.size += _attributes_size(element)
+        if self.style_resolver.index.has_sibling_selectors and element.parent is not None:
+            # Rules such as `.active + li` may now match its siblings too
+            self._evaluate_inserted(element.parent, [])
+            return
+        self.style_resolver.invalidate(element)
+        self._evaluate([element, *element.find_all(True)])
+
+    def _evaluate_inserted(self, parent, nodes):
+        """
+        Checks newly inserted nodes and their parent, whose direct text may have
+        changed. When the stylesheet has sibling selectors (+, ~, :nth-child(),
+        :last-child, ...), the positions of every child of the parent may have
+        changed the rules they match, so their styles are resolved again and
+        they are checked again along with their descendants.
+        """
+        elements = [parent]
+        if self.style_resolver.index.has_sibling_selectors:
+            nodes = parent.find_all(True, recursive=False)
+            for node in nodes:
+                self.style_resolver.invalidate(node)
+        for node in nodes:
+            if node.name is not None:
+                elements += [node, *node.find_all(True)]
+        self._evaluate(elements)
+
+    def _forget(self, element):
+        """
+        Drops the results and resolved styles of an element and its descendants.
+        """
+        for node in (element, *element.find_all(True)):
+            for checked, failed in self._results.values():
+                checked.pop(id(node), None)
+                failed.pop(id(node), None)
+        self.style_resolver.invalidate(element)
+
+    def _evaluate(self, elements):
+        """
+        Runs every check on the elements and stores their results.
+        """
+        for element in elements:
+            if element.name is None or element.name == "[document]":
+                continue
+            for name, (element_filter, element_handler) in self.checks.items():
+                checked, failed = self._results[name]
+                checked.pop(id(element), None)
+                failed.pop(id(element), None)
+                if not element_filter(element):
+                    continue
+
+                # Elements are kept alongside their results so their ids stay unique
+                checked[id(element)] = element
+                is_accessible, metrics = element_handler(element, self.style_resolver)
+                if not is_accessible:
+                    failed[id(element)] = (element, metrics)
+
+
+def _attributes_size(element):
+    """
+    Returns the size of the attributes of an element, as they are serialized.
+    """
+    return sum(len(name) + len(" ".join(value) if isinstance(value, list) else value) + 4
+               for name, value in element.attrs.items())
+
+
+def check_changes(changes):
+    """
+    Checks that DOM changes are a list of changes as described for
+    `ScanSession.apply`, with fields of the right types.
+
+    Raises:
+        ValueError: If a change is malformed.
+    """
+    if not isinstance(changes, list):
+        raise ValueError("changes must be a list of changes")
+    for change in changes:
+        operation = change.get("op") if isinstance(change, dict) else None
+        fields = CHANGE_FIELDS.get(operation) if isinstance(operation, str) else None
+        if fields is None:
+            raise ValueError(f"Unsupported change: {change}")
+        for field, field_type in fields.items():
+            value = change.get(field)
+            if value is not None and (not isinstance(value, field_type)
+                                      or isinstance(value, bool)):
+                raise ValueError(f"{field} must be a {field_type.__name__}: {change}")
+        required = "parent" if operation == "add" else "target"
+        if change.get(required) is None:
+            raise ValueError(f"{required} is missing: {change}")
+        attributes = change.get("attributes")
+        if operation == "modify" and change.get("html") is None and (
+                attributes is None or not all(
+                    isinstance(name, str) and isinstance(value, (str, type(None)))
+                    for name, value in attributes.items())):
+            raise ValueError(f"modify needs html or string attributes: {change}")
+
+
+def start_session(html_content, css_content, viewport=None):
+    """
+    Scans a document for a ViewportProfile and keeps its session.
+
+    Returns:
+        tuple: The session token and the results in the same format as `score_all`.
+
+    Raises:
+        InputTooLarge: If the session is over SCAN_SESSION_MAX_BYTES on its own.
+    """
+    session = ScanSession(html_content, css_content, viewport)
+    if session.size > SCAN_SESSION_MAX_BYTES:
+        raise InputTooLarge("Scan session is too large", SCAN_SESSION_MAX_BYTES)
+    token = secrets.token_urlsafe(16)
+    sessions.put(token, session, size=session.size)
+    return token, session.results()
+
+
+def update_session(token, changes, css_content=None, css_append=None):
+    """
+    Applies DOM changes and an optional stylesheet change to a session and
+    returns its updated results, or None if the session is unknown or expired.
+
+    Args:
+        token (str): The session token returned by `start_session`.
+        changes (list): The DOM changes, as described for `ScanSession.apply`.
+        css_content (str, optional): A stylesheet replacing the session's CSS.
+        css_append (str, optional): CSS rules added after the session's CSS.
+
+    Raises:
+        ValueError: If a change is malformed or its element is not found.
+        InputTooLarge: If the changes could bring the session over
+                       SCAN_SESSION_MAX_BYTES, in which case none is applied.
+    """
+    check_changes(changes)
+    for name, value in (("css", css_content), ("css_append", css_append)):
+        if value is not None and not isinstance(value, str):
+            raise ValueError(f"{name} must be a string")
+    session = sessions.get(token)
+    if session is None:
+        return None
+
+    with session.lock:
+        css = session.css
+        if css_content is not None or css_append:
+            css = (session.css if css_content is None else css_content) + (css_append or "")
+        # Removed content is not subtracted, so the bound holds whatever the changes remove
+        growth = len(css) - len(session.css) + sum(len(change.get("html") or "")
+                                                   for change in changes)
+        if session.size + growth > SCAN_SESSION_MAX_BYTES:
+            raise InputTooLarge("Scan session is too large", SCAN_SESSION_MAX_BYTES)
+        if css != session.css:
+            session.set_css(css)
+        session.apply(changes)
+        results = session.results()
+    # Keeps the session alive for another SCAN_SESSION_TTL seconds
+    sessions.put(token, session, size=session.size)
+    return results
+
+
+def end_session(token):
+    """
+    Forgets a session.
+    """
+    sessions.discard(token)
@@ -0,0 +1,178 @@
+"""
+This module serves a WSGI application from an ASGI server. Request bodies are
+read on the event loop, so slow uploads hold no thread while they arrive, and
+the application only runs in an executor thread once the whole body is in.
+Response chunks are sent back on the event loop as the application yields them.
+"""
+import asyncio
+import io
+import sys
+from utils.json_provider import dumps_bytes
+from utils.request_limits import MAX_REQUEST_BYTES
+
+# Response chunks buffered between the application's thread and the event loop
+RESPONSE_QUEUE_SIZE = 16
+_END = object()
+
+
+class ClientDisconnected(Exception):
+    """
+    Raised in the application's thread when the client has gone away.
+    """
+
+
+def wsgi_bridge(wsgi_app, executor, max_bytes=MAX_REQUEST_BYTES):
+    """
+    Wraps a WSGI application as an ASGI application.
+
+    Args:
+        wsgi_app (callable): The WSGI application.
+        executor (Executor): The executor the application runs in.
+        max_bytes (int): The largest request body read. Larger bodies get a
+                         JSON 413 response without reaching the application.
+
+    Returns:
+        callable: The ASGI application.
+    """
+    async def bridge(scope, receive, send):
+        if scope["type"] != "http":
+            return
+        body = await _read_body(scope, receive, max_bytes)
+        if body is None:
+            payload = dumps_bytes({"error": "Request body is too large", "limit": max_bytes})
+            await send({"type": "http.response.start", "status": 413,
+                        "headers": [(b"content-type", b"application/json"),
+                                    (b"content-length", str(len(payload)).encode())]})
+            await send({"type": "http.response.body", "body": payload})
+            return
+
+        loop = asyncio.get_running_loop()
+        chunks = asyncio.Queue(maxsize=RESPONSE_QUEUE_SIZE)
+        disconnected = []
+        watcher = asyncio.ensure_future(_watch_disconnect(receive, disconnected))
+        response = loop.run_in_executor(executor, _run_wsgi, wsgi_app,
+                                        _environ(scope, body), loop, chunks, disconnected)
+        try:
+            while (message := await chunks.get()) is not _END:
+                await send(message)
+        except OSError:
+            disconnected.append(True)
+            # Unblock the application's thread so it can close its response
+            while await chunks.get() is not _END:
+                pass
+        finally:
+            watcher.cancel()
+        await response
+
+    return bridge
+
+
+async def _read_body(scope, receive, max_bytes):
+    """
+    Reads the request body on the event loop, or returns None once it is
+    larger than max_bytes.
+    """
+    for name, value in scope["headers"]:
+        if name == b"content-length" and value.isdigit() and int(value) > max_bytes:
+            return None
+
+    body = bytearray()
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            break
+        body += message.get("body", b"")
+        if len(body) > max_bytes:
+            return None
+        if not message.get("more_body", False):
+            break
+    return bytes(body)
+
+
+async def _watch_disconnect(receive, disconnected):
+    """
+    Flags the request once the client disconnects, so a streamed response
+    stops being generated.
+    """
+    while (await receive())["type"] != "http.disconnect":
+        pass
+    disconnected.append(True)
+
+
+def _environ(scope, body):
+    """
+    Builds the WSGI environ of an ASGI request scope with its buffered body.
+    """
+    server_name, server_port = scope.get("server") or ("localhost", 80)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope["query_string"].decode("latin-1"),
+        "SERVER_NAME": server_name,
+        "SERVER_PORT": str(server_port),
+        "SERVER_PROTOCOL": f"HTTP/{scope['http_version']}",
+        "REMOTE_ADDR": (scope.get("client") or ("", 0))[0],
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope["headers"]:
+        name = name.decode("latin-1").upper().replace("-", "_")
+        value = value.decode("latin-1")
+        if name == "CONTENT_LENGTH":
+            continue
+        if name != "CONTENT_TYPE":
+            name = f"HTTP_{name}"
+        # Repeated headers are joined, as a WSGI server does
+        environ[name] = f"{environ[name]},{value}" if name in environ else value
+    return environ
+
+
+def _run_wsgi(wsgi_app, environ, loop, chunks, disconnected):
+    """
+    Runs the WSGI application in an executor thread and hands its response
+    start and body chunks to the event loop, waiting while the queue is full.
+    """
+    def put(message):
+        if disconnected:
+            raise ClientDisconnected()
+        asyncio.run_coroutine_threadsafe(chunks.put(message), loop).result()
+
+    started = []
+
+    def start_response(status, headers, exc_info=None):
+        if exc_info and started:
+            raise exc_info[1].with_traceback(exc_info[2])
+        started[:] = [{
+            "type": "http.response.start",
+            "status": int(status.split(" ", 1)[0]),
+            "headers": [(name.lower().encode("latin-1"), value.encode("latin-1"))
+                        for name, value in headers],
+        }]
+
+    result = ()
+    try:
+        result = wsgi_app(environ, start_response)
+        sent_start = False
+        for chunk in result:
+            if not chunk:
+                continue
+            if not sent_start:
+                put(started[0])
+                sent_start = True
+            put({"type": "http.response.body", "body": chunk, "more_body": True})
+        if not sent_start:
+            put(started[0])
+        put({"type": "http.response.body", "body": b"", "more_body": False})
+    except ClientDisconnected:
+        pass
+    finally:
+        if hasattr(result, "close"):
+            result.close()
+        asyncio.run_coroutine_threadsafe(chunks.put(_END), loop).result()
@@ -1,31 +1,105 @@
 """
-This module provides a utility function for parsing CSS content into a dictionary of styles.
+This module provides a utility function for parsing CSS content into a list of styles.
+
+Two backends are available, selected with the CSS_PARSER_BACKEND environment variable:
+"cssutils" (the default) builds a full cssutils object model, and "fast" uses the
+streaming tokenizer of `services.css_tokenizer`.
 """
+import logging
+import re
 import cssutils
+from services.css_tokenizer import applies, iter_rules, parse_css_fast
+from services.media_queries import matches_media
+from utils.settings import env_str
+from utils.timing import stage_timer
+
+CSS_PARSER_BACKEND = env_str("CSS_PARSER_BACKEND", "cssutils")
+
+# cssutils logs every property it fails to validate, which is most of modern CSS
+cssutils.log.setLevel(logging.CRITICAL)
 
-def parse_css(css_content):
+# cssutils lowercases every property name, custom properties included
+VAR_REFERENCE = re.compile(r"var\(\s*--[\w-]+")
+
+def parse_css(css_content, backend=None, viewport=None):
     """
-    Parses CSS content and returns a dictionary where the keys are CSS selectors
-    and the values are dictionaries of style properties and their corresponding values.
+    Parses CSS content and returns its style rules in source order, as pairs of
+    a CSS selector and a dictionary of style properties and their values.
 
     Args:
         css_content (str): The raw CSS content as a string.
+        backend (str): The parsing backend, "cssutils" or "fast".
+                       Defaults to the CSS_PARSER_BACKEND setting.
+        viewport (ViewportProfile): The viewport the @media blocks are evaluated
+                                    for, by default the configured one.
 
     Returns:
-        A dictionary where each key is a CSS selector and the corresponding value
-              is another dictionary of style properties (e.g., 'font-size') 
-              and their values (e.g., '16px').
+        A list of (selector, declarations) pairs, one per rule, where the
+              declarations map style properties (e.g., 'font-size') to their
+              values (e.g., '16px'). A selector repeated by later rules appears
+              once per rule, so the cascade keeps the order of the stylesheet.
+    """
+    backend = backend or CSS_PARSER_BACKEND
+    if backend not in ("cssutils", "fast"):
+        raise ValueError(f"Unknown CSS parser backend: {backend}")
+    with stage_timer("parse_css"):
+        if backend == "fast":
+            return parse_css_fast(css_content, viewport)
+        return parse_css_cssutils(css_content, viewport)
+
+def parse_css_cssutils(css_content, viewport=None):
+    """
+    Parses CSS content into a list of styles using cssutils.
+    See `parse_css` for the format of the result.
     """
     css_parser = cssutils.CSSParser()
     parsed_stylesheet = css_parser.parseString(css_content)
-    styles = {}
+    styles = []
+    _collect_rules(parsed_stylesheet, styles, viewport)
+    return styles
 
+def _collect_rules(rules, styles, viewport):
+    """
+    Adds the style rules of a cssutils stylesheet or of a matching @media or
+    @supports block to the styles list, descending into nested conditional blocks.
+    """
     # Iterate through all the rules in the stylesheet
-    for rule in parsed_stylesheet:
-        if rule.type == rule.STYLE_RULE:
-            selector = rule.selectorText
-            styles[selector] = {}
-            # Add each property and its value to the styles dictionary
-            for prop in rule.style:
-                styles[selector][prop.name] = prop.value
-    return styles
+    for rule in rules:
+        if rule.type == rule.MEDIA_RULE and matches_media(rule.media.mediaText, viewport):
+            _collect_rules(rule.cssRules, styles, viewport)
+        elif rule.type == rule.UNKNOWN_RULE and rule.atkeyword.lower() == "@supports":
+            for prelude, block in iter_rules(_unknown_rule_text(rule)):
+                if applies(prelude, viewport):
+                    _collect_rules(cssutils.CSSParser().parseString(block), styles, viewport)
+        elif rule.type == rule.STYLE_RULE:
+            # Add each property and its value to the rule's declarations, with the
+            # var() references lowercased like the custom property names
+            declarations = {prop.name: _lowercase_references(prop.value)
+                            for prop in rule.style}
+            if declarations:
+                styles.append((rule.selectorText, declarations))
+
+def _unknown_rule_text(rule):
+    """
+    Returns the source text of an at-rule cssutils does not parse, such as
+    @supports, from its tokens. Its cssText is re-serialized with spaces
+    between the tokens, which splits selectors such as ".a".
+    """
+    tokens = []
+    for item in rule.seq:
+        if item.type == "STRING":
+            tokens.append(cssutils.helper.string(item.value))
+        elif item.type == "URI":
+            tokens.append(cssutils.helper.uri(item.value))
+        else:
+            # Comments are kept as objects
+            tokens.append(item.value if isinstance(item.value, str) else " ")
+    return rule.atkeyword + " " + "".join(tokens)
+
+def _lowercase_references(value):
+    """
+    Lowercases the custom property names of the var() references of a value.
+    """
+    if "var(" not in value:
+        return value
+    return VAR_REFERENCE.sub(lambda match: match.group(0).lower(), value)
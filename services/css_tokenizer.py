@@ -0,0 +1,239 @@
+"""
+This module provides a lightweight streaming CSS parser. It produces the same
+dictionary of styles as the cssutils backend of `services.css_parser`, without
+building a CSS object model or validating property values.
+"""
+import re
+from services.media_queries import matches_media, matches_supports
+
+# Comments, strings and the characters that structure a stylesheet
+TOKEN = re.compile(r"""/\*.*?(?:\*/|$)|"(?:\\.|[^"\\])*"?|'(?:\\.|[^'\\])*'?|[{}();]""", re.S)
+WHITESPACE = re.compile(r"\s+")
+IMPORTANT = re.compile(r"\s*!\s*important\s*$", re.I)
+# The @media and @supports keywords, which their condition may follow without whitespace
+MEDIA_RULE = re.compile(r"@media(?![\w-])", re.I)
+SUPPORTS_RULE = re.compile(r"@supports(?![\w-])", re.I)
+
+
+def _normalize(text):
+    """
+    Collapses the whitespace of a selector or value into single spaces.
+    """
+    return WHITESPACE.sub(" ", text).strip()
+
+
+def parse_declarations(block):
+    """
+    Parses the declarations of a style block.
+
+    Args:
+        block (str): The content of a style block, without its braces.
+
+    Returns:
+        list: The (property, value) pairs in source order. A declaration after
+              an !important one of the same property is dropped, as cssutils does.
+    """
+    if "/*" in block:
+        block = TOKEN.sub(_without_comment, block)
+
+    declarations = []
+    important = set()
+    for declaration in split_top_level(block, ";"):
+        name, colon, value = declaration.partition(":")
+        name = name.strip()
+        if not colon or not name:
+            continue
+        value, is_important = IMPORTANT.subn("", value)
+        value = _normalize(value)
+        # Custom property names are case-sensitive
+        name = name if name.startswith("--") else name.lower()
+        if not value or name in important and not is_important:
+            continue
+        if is_important:
+            important.add(name)
+        declarations.append((name, value))
+    return declarations
+
+
+def _without_comment(match):
+    """
+    Replaces a comment token with a space, keeping every other token.
+    """
+    token = match.group(0)
+    return " " if token.startswith("/*") else token
+
+
+def split_top_level(text, separator):
+    """
+    Splits text on a separator that is not inside parentheses or strings.
+    """
+    parts = []
+    depth = 0
+    start = 0
+    for match in TOKEN.finditer(text):
+        token = match.group(0)
+        if token == "(":
+            depth += 1
+        elif token == ")":
+            depth = max(depth - 1, 0)
+        elif token == separator and depth == 0:
+            parts.append(text[start:match.start()])
+            start = match.end()
+    parts.append(text[start:])
+    return parts
+
+
+def iter_rules(css_content):
+    """
+    Streams the top-level rules of a stylesheet.
+
+    Args:
+        css_content (str): The raw CSS content as a string.
+
+    Yields:
+        tuple: (prelude, block) for every rule with a block, where the prelude is
+               the normalized selector or at-rule prelude (e.g., "@media screen")
+               and the block is the raw content between its braces. A rule whose
+               prelude has a stray "}" is invalid and gets an empty prelude, so
+               it is skipped as cssutils does.
+    """
+    prelude = []
+    invalid = False
+    block_start = None
+    depth = 0
+    paren_depth = 0
+    position = 0
+
+    for match in TOKEN.finditer(css_content):
+        token = match.group(0)
+        if depth == 0:
+            prelude.append(css_content[position:match.start()])
+        position = match.end()
+
+        if token == "(":
+            paren_depth += 1
+        elif token == ")":
+            paren_depth = max(paren_depth - 1, 0)
+        elif paren_depth or token[0] in "/\"'":
+            # Braces and semicolons inside parentheses (e.g., in url()) are plain text
+            pass
+        elif token == "{":
+            depth += 1
+            if depth == 1:
+                block_start = match.end()
+            continue
+        elif token == "}":
+            invalid = invalid or depth == 0
+            depth = max(depth - 1, 0)
+            if depth == 0 and block_start is not None:
+                yield _rule_prelude(prelude, invalid), css_content[block_start:match.start()]
+                prelude = []
+                invalid = False
+                block_start = None
+            continue
+        elif depth == 0:
+            # End of a statement at-rule such as @import or @charset
+            prelude = []
+            invalid = False
+            continue
+
+        if depth == 0:
+            prelude.append(" " if token.startswith("/*") else token)
+
+    if block_start is not None:
+        # Unclosed blocks end with the stylesheet
+        yield _rule_prelude(prelude, invalid), css_content[block_start:]
+
+
+def _rule_prelude(parts, invalid):
+    """
+    Joins the parts of a rule's prelude, or returns "" for an invalid rule.
+    """
+    return "" if invalid else _normalize("".join(parts))
+
+
+def parse_css_fast(css_content, viewport=None):
+    """
+    Parses CSS content and returns its style rules in source order, as pairs of
+    a CSS selector and a dictionary of style properties and their values.
+    The rules of @media blocks whose query matches the viewport, and of @supports
+    blocks whose condition holds, are kept in their place in the cascade. Other
+    at-rule blocks are skipped, like the cssutils backend.
+
+    Args:
+        css_content (str): The raw CSS content as a string.
+        viewport (ViewportProfile): The viewport media queries are evaluated
+                                    for, by default the configured one.
+
+    Returns:
+        A list of (selector, declarations) pairs, one per rule, as `parse_css` returns.
+    """
+    styles = []
+    _collect_rules(css_content, styles, viewport)
+    return styles
+
+
+def _collect_rules(css_content, styles, viewport):
+    """
+    Adds the style rules of a stylesheet or of a matching @media or @supports
+    block to the styles list, descending into nested conditional blocks.
+    """
+    for prelude, block in iter_rules(css_content):
+        if applies(prelude, viewport):
+            _collect_rules(block, styles, viewport)
+        if not prelude or prelude.startswith("@"):
+            continue
+        declarations = dict(parse_declarations(_strip_nested_blocks(block)))
+        if declarations:
+            styles.append((prelude, declarations))
+
+
+def applies(prelude, viewport):
+    """
+    Checks if the prelude of a rule is that of an @media rule matching the
+    viewport or of an @supports rule whose condition holds.
+    """
+    media = MEDIA_RULE.match(prelude)
+    if media is not None:
+        return matches_media(prelude[media.end():], viewport)
+    supports = SUPPORTS_RULE.match(prelude)
+    return supports is not None and matches_supports(prelude[supports.end():])
+
+
+def _strip_nested_blocks(block):
+    """
+    Removes nested rules from a style block, keeping its own declarations.
+    """
+    if "{" not in block:
+        return block
+    return "".join(_own_text(block))
+
+
+def _own_text(block):
+    """
+    Yields the parts of a style block that are outside its nested blocks.
+    """
+    depth = 0
+    paren_depth = 0
+    start = 0
+    for match in TOKEN.finditer(block):
+        token = match.group(0)
+        if token == "(":
+            paren_depth += 1
+        elif token == ")":
+            paren_depth = max(paren_depth - 1, 0)
+        elif paren_depth:
+            # Braces inside parentheses (e.g., in url()) are plain text
+            continue
+        elif token == "{":
+            if depth == 0:
+                # Drop the nested rule's selector along with its block
+                own = block[start:match.start()]
+                yield own[:own.rfind(";") + 1] if ";" in own else ""
+            depth += 1
+        elif token == "}" and depth:
+            depth -= 1
+            if depth == 0:
+                start = match.end()
+    if depth == 0:
+        yield block[start:]
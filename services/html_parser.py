@@ -3,64 +3,56 @@ This module provelement_ides utilities for parsing and extracting information
 from HTML content, including computing styles and retrieving background colors.
 It also includes functions to check for direct content and parse HTML elements.
 """
-from bs4 import BeautifulSoup
-from utils.contrast_utils import css_to_hex
-from utils.debug import debug_print
+from bs4 import BeautifulSoup, FeatureNotFound
+from utils.contrast_utils import WHITE, composite, rgb_to_hex
+from utils.debug import get_logger
+from utils.settings import env_str
+from utils.timing import record_value, stage_timer
+from services.style_resolver import StyleResolver, background_layer, parse_inline_style
 
-def parse_html(html_content):
+# Tree builder used by BeautifulSoup: "html.parser", "lxml" or "html5lib"
+HTML_PARSER_BACKEND = env_str("HTML_PARSER_BACKEND", "html.parser")
+HTML_PARSER_BACKENDS = ("html.parser", "lxml", "html5lib")
+
+logger = get_logger(__name__)
+
+def parse_html(html_content, backend=None):
     """
     Parses the provelement_ided HTML content and returns a BeautifulSoup object.
     
     Args:
         html_content (str): The raw HTML content to parse.
+        backend (str): The tree builder, "html.parser", "lxml" or "html5lib".
+                       Defaults to the HTML_PARSER_BACKEND setting.
     
     Returns:
         BeautifulSoup: The parsed HTML content.
     """
-    return BeautifulSoup(html_content, "html.parser")
+    backend = backend or HTML_PARSER_BACKEND
+    if backend not in HTML_PARSER_BACKENDS:
+        raise ValueError(f"Unknown HTML parser backend: {backend}")
+    record_value("dom_bytes", len(html_content))
+    with stage_timer("parse_html"):
+        try:
+            return BeautifulSoup(html_content, backend)
+        except FeatureNotFound:
+            # The optional lxml and html5lib packages may not be installed
+            logger.warning("HTML parser backend %s is not installed, using html.parser", backend)
+            return BeautifulSoup(html_content, "html.parser")
 
 def get_computed_style(element, styles):
     """
-    Computes the final style of an HTML element based on its classes, id, and tag name.
+    Computes the final style of an HTML element based on its inline style, the
+    stylesheet rules matching it, and the styles it inherits from its ancestors.
+    Scanners resolving many elements of the same document should share a
+    StyleResolver instead, which memoizes the resolved ancestors.
     Args:
         element (Tag): The HTML element whose style is being computed.
         styles (dict): The parsed CSS styles dictionary.
     Returns:
         dict: The computed style dictionary for the element.
     """
-    elem_style = {}
-
-    # First check inline styles (highest priority)
-    if 'style' in element.attrs:
-        inline_styles = element.attrs['style'].split(';')
-        for prop_value in inline_styles:
-            if ':' in prop_value:
-                prop, value = prop_value.split(':', 1)
-                elem_style[prop.strip()] = value.strip()  # Inline styles should override all others
-
-    # Apply external styles by priority (classes, ids, tags)
-    classes = ["." + x for x in element.attrs.get("class", [])]
-    element_id = ["#" + x for x in element.attrs.get("id", [])]
-    references = ["*", element.name] + classes + element_id
-    references.reverse()  # Prioritize IDs and classes over tags
-
-    debug_print(references)
-    for ref in references:
-        if ref in styles:
-            for prop, value in styles[ref].items():
-                # Apply external styles only if they haven't been set by inline styles
-                if prop not in elem_style:
-                    elem_style[prop] = value
-
-    # Handle parent inheritance AFTER inline and external styles
-    parent = element.parent
-    while parent:
-        if parent.name in styles:
-            for prop, value in styles[parent.name].items():
-                if prop not in elem_style:  # Only apply if not already set
-                    elem_style[prop] = value
-        parent = parent.parent
-    return elem_style
+    return StyleResolver(styles).computed_style(element)
 
 def has_direct_contents(element):
     """
@@ -83,8 +75,10 @@ def has_direct_contents(element):
 
 def get_background_color(element):
     """
-    Retrieves the background color of an HTML element, recursing through
-    its parent elements if no background color is set.
+    Retrieves the background color an HTML element is drawn over from the
+    inline styles of the element and its ancestors, blending translucent
+    backgrounds over the ones underneath. Stylesheet rules are only taken
+    into account by `StyleResolver.background`.
 
     Args:
         element (Tag): The HTML element whose background color is needed.
@@ -92,17 +86,18 @@ def get_background_color(element):
     Returns:
         str: The background color in hexadecimal format (e.g., #FFFFFF).
     """
-    style = element.get("style", {})
-    bg = style.get("background-color", None)
-    if bg is None:
-        # Default to white if no color found
-        bg = "#FFFFFF"
-        # Check parent until a color is found or no more parents exist
-        parent = element.parent
-        while parent and bg == "#FFFFFF":
-            parent_style = parent.get("style", {})
-            parent_bg = parent_style.get("background-color", None)
-            if parent_bg is not None:
-                bg = parent_bg
-            parent = parent.parent
-    return css_to_hex(bg)
+    layers = []
+    node = element
+    # Stop at the first opaque background, whatever its color
+    while node is not None and not isinstance(node, BeautifulSoup):
+        layer = background_layer(parse_inline_style(node.get("style", "")))
+        if layer is not None:
+            layers.append(layer)
+            if layer[3] >= 1:
+                break
+        node = node.parent
+
+    background = WHITE
+    for layer in reversed(layers):
+        background = composite(layer, background)
+    return rgb_to_hex(background)
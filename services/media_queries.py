@@ -0,0 +1,273 @@
+"""
+This module evaluates CSS media queries against a viewport profile, so the
+rules of the @media blocks that apply to the scanned viewport join the cascade.
+It also evaluates the conditions of @supports blocks for a current browser.
+
+The default profile is configured through the VIEWPORT_WIDTH and VIEWPORT_HEIGHT
+(px) and PREFERS_COLOR_SCHEME ("light" or "dark") environment variables.
+"""
+import re
+from typing import NamedTuple
+from services.selector_index import is_supported_selector, split_selector_list
+from utils.lengths import DEFAULT_FONT_SIZE, VIEWPORT_HEIGHT, VIEWPORT_WIDTH, LengthContext, \
+    evaluate_value, parse_length
+from utils.settings import env_str
+
+PREFERS_COLOR_SCHEME = env_str("PREFERS_COLOR_SCHEME", "light")
+COLOR_SCHEMES = ("light", "dark")
+# Media types a screen matches
+SCREEN_MEDIA_TYPES = frozenset(["all", "screen"])
+# Parenthesized conditions and the words between them
+MEDIA_PART = re.compile(r"\(((?:[^()]|\((?:[^()]|\([^()]*\))*\))*)\)|([\w-]+)")
+RANGE_OPERATOR = re.compile(r"(<=|>=|<|>|=)")
+RANGE_OPERATORS = {
+    "<": lambda a, b: a < b, "<=": lambda a, b: a <= b, ">": lambda a, b: a > b,
+    ">=": lambda a, b: a >= b, "=": lambda a, b: a == b,
+}
+# The comparison of the min- and max- prefixes of a feature, or of the plain feature
+PREFIX_OPERATORS = {"min": ">=", "max": "<=", "": "="}
+# Flips an operator for a range written with the value first (e.g., "600px < width")
+FLIPPED_OPERATORS = {"<": ">", "<=": ">=", ">": "<", ">=": "<=", "=": "="}
+# dppx per resolution unit
+RESOLUTION_UNITS = {"dppx": 1, "x": 1, "dpi": 1 / 96, "dpcm": 2.54 / 96}
+NUMERIC_FEATURES = frozenset([
+    "width", "height", "aspect-ratio", "resolution", "color", "color-index", "monochrome",
+])
+# Values of the features that do not depend on the viewport size, for a desktop screen
+SCREEN_FEATURES = {
+    "prefers-reduced-motion": "no-preference", "prefers-contrast": "no-preference",
+    "prefers-reduced-transparency": "no-preference", "forced-colors": "none",
+    "inverted-colors": "none", "hover": "hover", "any-hover": "hover", "pointer": "fine",
+    "any-pointer": "fine", "scripting": "enabled", "update": "fast", "grid": 0,
+    "display-mode": "browser", "color": 8, "color-index": 0, "monochrome": 0,
+    "resolution": 1, "color-gamut": "srgb", "dynamic-range": "standard",
+}
+
+
+# Features of the viewport itself
+VIEWPORT_FEATURES = {
+    "width": lambda viewport: viewport.width,
+    "height": lambda viewport: viewport.height,
+    "aspect-ratio": lambda viewport: viewport.width / viewport.height if viewport.height else None,
+    "orientation":
+        lambda viewport: "portrait" if viewport.height >= viewport.width else "landscape",
+    "prefers-color-scheme": lambda viewport: viewport.color_scheme,
+}
+
+
+class ViewportProfile(NamedTuple):
+    """
+    The screen media queries are evaluated for, and vw and vh units resolved against.
+    """
+    width: int = VIEWPORT_WIDTH
+    height: int = VIEWPORT_HEIGHT
+    color_scheme: str = PREFERS_COLOR_SCHEME
+
+
+DEFAULT_VIEWPORT = ViewportProfile()
+
+
+def matches_media(media_query_list, viewport=None):
+    """
+    Checks if a media query list applies to a viewport.
+
+    Args:
+        media_query_list (str): The prelude of an @media rule without the
+                                at-keyword (e.g., "screen and (min-width: 600px)").
+        viewport (ViewportProfile): The viewport, by default DEFAULT_VIEWPORT.
+
+    Returns:
+        bool: True if any query of the list matches. Queries with unknown
+              media features never match.
+    """
+    viewport = viewport or DEFAULT_VIEWPORT
+    queries = split_selector_list(media_query_list.lower())
+    return not queries or any(_matches_query(query, viewport) for query in queries)
+
+
+def _matches_query(query, viewport):
+    """
+    Checks if a single media query applies to a viewport.
+    """
+    parts = MEDIA_PART.findall(query)
+    negated = False
+    if parts and parts[0][1] in ("not", "only") and len(parts) > 1 and parts[1][1]:
+        # "not" before a media type negates the whole query
+        negated = parts[0][1] == "not"
+        parts = parts[1:]
+    if parts and parts[0][1] not in ("", "not", "and", "or"):
+        media_type = parts[0][1]
+        parts = parts[1:]
+        if parts and parts[0][1] == "and":
+            parts = parts[1:]
+        matched = media_type in SCREEN_MEDIA_TYPES and _matches_condition(parts, viewport)
+    else:
+        matched = _matches_condition(parts, viewport)
+    return matched != negated
+
+
+def _matches_condition(parts, viewport):
+    """
+    Evaluates the conditions of a query joined by "and" or "or", each of them
+    a parenthesized media feature or nested condition, optionally after "not".
+    """
+    results = []
+    combinator = "and"
+    negate = False
+    for condition, word in parts:
+        if word in ("and", "or"):
+            combinator = word
+        elif word == "not":
+            negate = True
+        elif word:
+            # A media type in the middle of a condition is invalid
+            return False
+        else:
+            results.append(_matches_feature(condition.strip(), viewport) != negate)
+            negate = False
+    if not results:
+        return True
+    return all(results) if combinator == "and" else any(results)
+
+
+def _matches_feature(condition, viewport):
+    """
+    Evaluates a media feature (e.g., "min-width: 600px", "width >= 40em",
+    "hover") or a nested condition.
+    """
+    if condition.startswith("(") or condition.startswith("not "):
+        return _matches_condition(MEDIA_PART.findall(condition), viewport)
+
+    if ":" in condition:
+        name, value = (part.strip() for part in condition.split(":", 1))
+        prefix, _, base = name.partition("-") if name[:4] in ("min-", "max-") else ("", "", name)
+        actual = _feature_value(base, viewport)
+        expected = _parse_feature_value(base, value)
+        if actual is None or expected is None or prefix and isinstance(expected, str):
+            return False
+        return RANGE_OPERATORS[PREFIX_OPERATORS[prefix]](actual, expected)
+
+    pieces = [piece.strip() for piece in RANGE_OPERATOR.split(condition)]
+    if len(pieces) == 1:
+        # A feature on its own matches when its value is not zero or "none"
+        actual = _feature_value(condition, viewport)
+        return actual not in (None, 0, "none", "no-preference")
+    return _matches_range(pieces, viewport)
+
+
+def _matches_range(pieces, viewport):
+    """
+    Evaluates a range media feature split on its operators, such as
+    ["width", ">=", "600px"] or ["400px", "<", "width", "<=", "700px"].
+    """
+    names = [piece for piece in pieces[::2] if _feature_value(piece, viewport) is not None]
+    if len(names) != 1 or len(pieces) not in (3, 5):
+        return False
+    name = names[0]
+    actual = _feature_value(name, viewport)
+    if not isinstance(actual, (int, float)):
+        return False
+
+    for position in range(1, len(pieces), 2):
+        left, operator, right = pieces[position - 1:position + 2]
+        if left == name:
+            expected = _parse_feature_value(name, right)
+        elif right == name:
+            expected = _parse_feature_value(name, left)
+            operator = FLIPPED_OPERATORS[operator]
+        else:
+            return False
+        if expected is None or not RANGE_OPERATORS[operator](actual, expected):
+            return False
+    return True
+
+
+def _feature_value(name, viewport):
+    """
+    Returns the value of a media feature for a viewport, or None if the
+    feature is unknown.
+    """
+    if name in VIEWPORT_FEATURES:
+        return VIEWPORT_FEATURES[name](viewport)
+    return SCREEN_FEATURES.get(name)
+
+
+def _parse_feature_value(name, value):
+    """
+    Parses the value a media feature is compared with: px for widths and
+    heights, a number for ratios, dppx for resolutions, or a keyword.
+    """
+    if name not in NUMERIC_FEATURES:
+        return value
+    if name == "aspect-ratio" and "/" in value:
+        numerator, denominator = (parse_length(part) for part in value.split("/", 1))
+        if numerator is None or denominator is None or not denominator[0]:
+            return None
+        return numerator[0] / denominator[0]
+    if name == "resolution":
+        parsed = parse_length(value)
+        factor = RESOLUTION_UNITS.get(parsed[1]) if parsed else None
+        return None if factor is None else parsed[0] * factor
+    # em and rem in media queries are relative to the initial font size
+    result = evaluate_value(value, LengthContext(DEFAULT_FONT_SIZE, DEFAULT_FONT_SIZE))
+    if result is None or name in ("width", "height") and not result[1] and result[0] != 0:
+        return None
+    return result[0]
+
+
+def matches_supports(condition):
+    """
+    Checks if the condition of an @supports rule holds in the current browser
+    the scans model. Every declaration is taken as supported, so only blocks
+    negating one, such as fallbacks under "not (display: grid)", are left out.
+
+    Args:
+        condition (str): The prelude of an @supports rule without the
+                         at-keyword (e.g., "(display: grid) and selector(:has(a))").
+
+    Returns:
+        bool: True if the condition holds. selector() holds for the selectors the
+              cascade can match, and other functions never hold.
+    """
+    return _supports_condition(MEDIA_PART.findall(condition))
+
+
+def _supports_condition(parts):
+    """
+    Evaluates the conditions of an @supports prelude joined by "and" or "or",
+    each of them a declaration, a function or a nested condition, optionally after "not".
+    """
+    results = []
+    combinator = "and"
+    negate = False
+    function = None
+    for condition, word in parts:
+        word = word.lower()
+        if word in ("and", "or"):
+            combinator = word
+        elif word == "not":
+            negate = True
+        elif word:
+            # The name of the function whose arguments follow
+            function = word
+        else:
+            results.append(_supports_feature(function, condition.strip()) != negate)
+            negate = False
+            function = None
+    if not results or function is not None:
+        return False
+    return all(results) if combinator == "and" else any(results)
+
+
+def _supports_feature(function, condition):
+    """
+    Evaluates a parenthesized @supports condition, or the arguments of a function.
+    """
+    if function == "selector":
+        return is_supported_selector(condition)
+    if function is not None:
+        return False
+    if condition.startswith("(") or condition.lower().startswith("not"):
+        return _supports_condition(MEDIA_PART.findall(condition))
+    name, colon, value = condition.partition(":")
+    return bool(colon and name.strip() and value.strip())
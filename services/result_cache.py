@@ -0,0 +1,222 @@
+"""
+This module caches the serialized results of scans by the hash of everything
+they depend on: the DOM, the CSS, the scanner, the response options, the scan
+scope and viewport, and the version of the rules the scanners apply. Identical
+scans then return without parsing the page or reaching the worker pool.
+
+Results are kept in memory, and optionally in an SQLite database shared by the
+serving processes and kept across restarts. The cache is configured through the
+RESULT_CACHE_SIZE (entries), RESULT_CACHE_MAX_BYTES (total size of the encoded
+results), RESULT_CACHE_TTL (seconds), RESULT_CACHE_PATH (the database file, or
+empty for no database) and RESULT_CACHE_DISK_ENTRIES environment variables.
+"""
+import hashlib
+import re
+import sqlite3
+import time
+from threading import Lock
+from utils.debug import get_logger
+from utils.json_provider import dumps_bytes, loads_bytes
+from utils.lru_cache import LRUCache
+from utils.settings import env_float, env_int, env_str
+
+RESULT_CACHE_SIZE = env_int("RESULT_CACHE_SIZE", 256)
+RESULT_CACHE_MAX_BYTES = env_int("RESULT_CACHE_MAX_BYTES", 64 * 1024 * 1024)
+RESULT_CACHE_TTL = env_float("RESULT_CACHE_TTL", 3600) or None
+RESULT_CACHE_PATH = env_str("RESULT_CACHE_PATH", "")
+RESULT_CACHE_DISK_ENTRIES = env_int("RESULT_CACHE_DISK_ENTRIES", 10000)
+# Seconds to wait for another process writing to the database
+DISK_TIMEOUT = 5
+# Types of the values a ruleset version is computed from
+RULE_TYPES = (bool, int, float, str, type(None))
+
+logger = get_logger(__name__)
+
+
+def ruleset_version(*modules):
+    """
+    Returns a stamp of the rules the scanners in some modules apply, computed
+    from their upper case constants (thresholds, skipped tags, ...), so cached
+    results stop matching as soon as one of them changes.
+    """
+    digest = hashlib.sha256()
+    for module in modules:
+        for name, value in sorted(vars(module).items()):
+            value = _rule_value(value) if name.isupper() else None
+            if value is not None:
+                digest.update(f"{module.__name__}.{name}={value}\n".encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def _rule_value(value):
+    """
+    Returns the repr of a constant made of numbers, strings, regexes and
+    containers of them, the same in every process, or None for any other
+    constant (functions, arrays, ...).
+    """
+    if isinstance(value, RULE_TYPES):
+        return repr(value)
+    if isinstance(value, re.Pattern):
+        return f"re({value.pattern!r}, {value.flags})"
+    if isinstance(value, dict):
+        items = [(_rule_value(key), _rule_value(item)) for key, item in value.items()]
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        items = [(_rule_value(item),) for item in value]
+    else:
+        return None
+    if any(None in item for item in items):
+        return None
+    # The order of a set changes between processes
+    if isinstance(value, (set, frozenset)):
+        items.sort()
+    return f"{type(value).__name__}({items})"
+
+
+def result_key(*parts):
+    """
+    Returns the cache key of a scan from its inputs and options. Each part is
+    prefixed with its length, so different inputs never share a key.
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        data = part if isinstance(part, str) else repr(part)
+        data = data.encode("utf-8", "surrogatepass")
+        digest.update(f"{len(data)}:".encode("ascii"))
+        digest.update(data)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    Cache of JSON-serializable scan results in an in-memory LRU tier, backed
+    by an optional SQLite tier.
+    """
+
+    def __init__(self, max_entries=RESULT_CACHE_SIZE, max_bytes=RESULT_CACHE_MAX_BYTES,
+                 ttl=RESULT_CACHE_TTL, path=RESULT_CACHE_PATH,
+                 max_disk_entries=RESULT_CACHE_DISK_ENTRIES):
+        """
+        Args:
+            max_entries (int): The maximum number of results kept in memory.
+            max_bytes (int): The maximum total size of the encoded results kept in memory.
+            ttl (float): The number of seconds a result stays valid, or None to keep
+                         results until they are evicted.
+            path (str): The SQLite database file, or None for memory only.
+            max_disk_entries (int): The maximum number of results kept in the database.
+        """
+        self.memory = LRUCache(max_entries=max_entries, max_bytes=max_bytes, ttl=ttl)
+        self.ttl = ttl
+        self.max_disk_entries = max_disk_entries
+        self.counters = {"disk_hits": 0, "disk_misses": 0, "disk_errors": 0}
+        self._disk = None
+        self._lock = Lock()
+        if path:
+            try:
+                self._disk = _open_database(path)
+            except sqlite3.Error as e:
+                logger.warning("Result cache database %s is unavailable: %s", path, e)
+
+    def get(self, key):
+        """
+        Returns the result cached for a key, or None if it is missing or expired.
+        Results found in the database are kept in memory from then on.
+        """
+        result = self.memory.get(key)
+        if result is not None or self._disk is None:
+            return result
+
+        data = self._disk_call(self._disk_get, key)
+        if data is None:
+            self.counters["disk_misses"] += 1
+            return None
+        self.counters["disk_hits"] += 1
+        result = loads_bytes(data)
+        self.memory.put(key, result, size=len(data))
+        return result
+
+    def put(self, key, result):
+        """
+        Caches a JSON-serializable result in memory and in the database.
+        """
+        data = dumps_bytes(result)
+        self.memory.put(key, result, size=len(data))
+        if self._disk is not None:
+            self._disk_call(self._disk_put, key, data)
+
+    def clear(self):
+        """
+        Removes every result from memory and from the database.
+        """
+        self.memory.clear()
+        if self._disk is not None:
+            self._disk_call(self._disk_clear)
+
+    def stats(self):
+        """
+        Returns the counters and current size of the memory tier, with the
+        counters of the database.
+        """
+        return {**self.memory.stats(), **self.counters}
+
+    def _disk_call(self, function, *args):
+        """
+        Calls a database function under the lock. Database errors are logged
+        and treated as a miss, so a broken database never fails a scan.
+        """
+        try:
+            with self._lock:
+                return function(*args)
+        except sqlite3.Error as e:
+            self.counters["disk_errors"] += 1
+            logger.warning("Result cache database error: %s", e)
+            return None
+
+    def _disk_get(self, key):
+        """
+        Reads the encoded result of a key from the database, if still valid.
+        """
+        row = self._disk.execute(
+            "SELECT value, stored FROM results WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or self.ttl is not None and time.time() - row[1] > self.ttl:
+            return None
+        return row[0]
+
+    def _disk_clear(self):
+        """
+        Removes every result from the database.
+        """
+        with self._disk:
+            self._disk.execute("DELETE FROM results")
+
+    def _disk_put(self, key, data):
+        """
+        Writes an encoded result to the database and removes the expired
+        results and the oldest ones beyond max_disk_entries.
+        """
+        now = time.time()
+        with self._disk:
+            self._disk.execute("INSERT OR REPLACE INTO results (key, value, stored) "
+                               "VALUES (?, ?, ?)", (key, data, now))
+            if self.ttl is not None:
+                self._disk.execute("DELETE FROM results WHERE stored < ?", (now - self.ttl,))
+            self._disk.execute("DELETE FROM results WHERE key IN (SELECT key FROM results "
+                               "ORDER BY stored DESC LIMIT -1 OFFSET ?)",
+                               (self.max_disk_entries,))
+
+
+def _open_database(path):
+    """
+    Opens the SQLite database of the result cache, creating its table. The
+    write-ahead log lets several serving processes share the file.
+    """
+    connection = sqlite3.connect(path, timeout=DISK_TIMEOUT, check_same_thread=False)
+    connection.execute("PRAGMA journal_mode=WAL")
+    with connection:
+        connection.execute("CREATE TABLE IF NOT EXISTS results "
+                           "(key TEXT PRIMARY KEY, value BLOB NOT NULL, stored REAL NOT NULL)")
+        connection.execute("CREATE INDEX IF NOT EXISTS results_stored ON results (stored)")
+    return connection
+
+
+result_cache = ResultCache()
@@ -0,0 +1,431 @@
+"""
+This module compiles the selectors of parsed CSS styles into an index, so the
+rules that apply to an element can be found without testing every selector.
+Rules are bucketed by the id, class or tag of their rightmost compound selector,
+their specificity is precomputed and their source order is kept. The custom
+properties declared for the root element are resolved once into a token table.
+"""
+import re
+import zlib
+from functools import lru_cache
+from typing import NamedTuple
+import soupsieve
+from soupsieve import SelectorSyntaxError
+from utils.lengths import resolve_custom_properties
+
+# Pseudo-elements style generated content rather than the element itself
+PSEUDO_ELEMENTS = frozenset([
+    "before", "after", "first-line", "first-letter", "marker", "placeholder",
+    "selection", "backdrop", "file-selector-button", "cue",
+])
+SIMPLE_SELECTOR = re.compile(
+    r"""
+    (?P<id>\#(?:[\w-]|\\.)+)
+    |(?P<cls>\.(?:[\w-]|\\.)+)
+    |(?P<attr>\[[^\]]*\])
+    |(?P<pseudo>::?(?P<pseudo_name>[\w-]+)(?P<args>\()?)
+    |(?P<tag>(?:[\w-]+|\*)(?:\|(?:[\w-]+|\*))?)
+    """,
+    re.VERBOSE,
+)
+CSS_ESCAPE = re.compile(r"\\(?:([0-9a-fA-F]{1,6}) ?|(.))")
+COMBINATORS = " >+~"
+# Ids are the most selective bucket keys, then classes, then tags
+BUCKET_PRIORITY = {"#": 0, ".": 1}
+# Size of the bit filter of the ids, classes and tags found on an element's ancestors
+ANCESTOR_FILTER_BITS = 256
+# Selectors whose custom properties go to the root token table
+ROOT_SELECTORS = frozenset([":root", "html"])
+# Combinators and pseudo-classes that make a match depend on the element's siblings
+SIBLING_SELECTOR = re.compile(r"[+~]|:(?:nth-|first-|last-|only-)", re.IGNORECASE)
+
+
+def split_selector_list(selector_text):
+    """
+    Splits a selector list on its top-level commas.
+
+    Args:
+        selector_text (str): The selector list (e.g., "a:hover, a:focus").
+
+    Returns:
+        list: The individual selectors.
+    """
+    selectors = []
+    depth = 0
+    quote = None
+    start = 0
+    for i, char in enumerate(selector_text):
+        if quote:
+            if char == quote:
+                quote = None
+        elif char in "\"'":
+            quote = char
+        elif char in "([":
+            depth += 1
+        elif char in ")]":
+            depth -= 1
+        elif char == "," and depth == 0:
+            selectors.append(selector_text[start:i].strip())
+            start = i + 1
+    selectors.append(selector_text[start:].strip())
+    return [selector for selector in selectors if selector]
+
+
+def _closing_paren(text, start):
+    """
+    Returns the index of the parenthesis closing the one opened before `start`.
+    """
+    depth = 1
+    for i in range(start, len(text)):
+        if text[i] == "(":
+            depth += 1
+        elif text[i] == ")":
+            depth -= 1
+            if depth == 0:
+                return i
+    return len(text)
+
+
+def _simple_specificity(match, selector):
+    """
+    Returns the specificity of a matched simple selector, the index the scan
+    continues from and whether it is a pseudo-element.
+
+    Returns:
+        tuple: ((ids, classes, tags), next index, is_pseudo_element)
+    """
+    if match.group("id"):
+        return (1, 0, 0), match.end(), False
+    if match.group("tag"):
+        return (0, 0, int(match.group("tag") != "*")), match.end(), False
+
+    name = (match.group("pseudo_name") or "").lower()
+    if name and (match.group("pseudo").startswith("::") or name in PSEUDO_ELEMENTS):
+        return (0, 0, 1), match.end(), True
+    if not match.group("args"):
+        # Classes, attributes and pseudo-classes
+        return (0, 1, 0), match.end(), False
+
+    end = _closing_paren(selector, match.end())
+    if name in ("not", "is", "matches", "has"):
+        # These take the specificity of their most specific argument
+        arguments = [_scan_selector(arg)[0]
+                     for arg in split_selector_list(selector[match.end():end])]
+        return max(arguments, default=(0, 0, 0)), end + 1, False
+    return (0, int(name != "where"), 0), end + 1, False
+
+
+def _scan_selector(selector):
+    """
+    Scans a selector into its specificity, the simple selectors of its rightmost
+    compound, the simple selectors its subject's ancestors must have and whether
+    it targets a pseudo-element.
+
+    Returns:
+        tuple: ((ids, classes, tags), rightmost compound parts, ancestor parts,
+                is_pseudo_element)
+    """
+    specificity = (0, 0, 0)
+    compounds = [[]]
+    combinators = []
+    in_compound = False
+    pseudo_element = False
+    i = 0
+    while i < len(selector):
+        char = selector[i]
+        if char in COMBINATORS:
+            if in_compound:
+                compounds.append([])
+                combinators.append(char)
+                in_compound = False
+            elif combinators and char != " ":
+                combinators[-1] = char
+            i += 1
+            continue
+
+        match = SIMPLE_SELECTOR.match(selector, i)
+        if not match:
+            i += 1
+            continue
+
+        in_compound = True
+        added, i, is_pseudo_element = _simple_specificity(match, selector)
+        specificity = tuple(map(sum, zip(specificity, added)))
+        pseudo_element = pseudo_element or is_pseudo_element
+        if i == match.end():
+            # Functional pseudo-classes are not used as index keys
+            compounds[-1].append(match.group(0))
+
+    return specificity, compounds[-1], _ancestor_parts(compounds, combinators), pseudo_element
+
+
+def _ancestor_parts(compounds, combinators):
+    """
+    Returns the simple selectors of the compounds that must match an ancestor
+    of the subject, which are those followed by a descendant or child
+    combinator anywhere to their right.
+    """
+    parts = []
+    for position, compound in enumerate(compounds[:-1]):
+        if any(combinator in " >" for combinator in combinators[position:]):
+            parts += compound
+    return parts
+
+
+def _unescape(identifier):
+    """
+    Replaces the escape sequences of a CSS identifier (e.g., "md\\:flex") with
+    the characters they stand for.
+    """
+    if "\\" not in identifier:
+        return identifier
+    return CSS_ESCAPE.sub(_unescape_match, identifier)
+
+
+def _unescape_match(match):
+    """
+    Returns the character a single CSS escape sequence stands for.
+    """
+    if match.group(1):
+        return chr(min(int(match.group(1), 16), 0x10FFFF))
+    return match.group(2)
+
+
+def _part_key(part):
+    """
+    Returns the index key of an id, class or tag simple selector, or None
+    for the simple selectors that are not indexed.
+    """
+    if part[0] in "#.":
+        return part[0] + _unescape(part[1:])
+    if part[0] in "[:" or part == "*" or "|" in part:
+        return None
+    return part.lower()
+
+
+@lru_cache(maxsize=65536)
+def _key_bit(key):
+    """
+    Returns the bit representing an id, class or tag key in an ancestor filter.
+    """
+    return 1 << (zlib.crc32(key.encode()) % ANCESTOR_FILTER_BITS)
+
+
+def element_key_mask(element):
+    """
+    Returns the ancestor filter bits of an element's tag, id and classes.
+
+    Args:
+        element (Tag): The HTML element.
+
+    Returns:
+        int: The filter bits.
+    """
+    mask = _key_bit(element.name)
+    element_id = element.attrs.get("id")
+    if element_id:
+        mask |= _key_bit("#" + element_id)
+    for class_name in element.attrs.get("class", []):
+        mask |= _key_bit("." + class_name)
+    return mask
+
+
+@lru_cache(maxsize=16384)
+def _compile_selector(selector):
+    """
+    Compiles a selector for full matching, or returns None for the selectors
+    soupsieve can't evaluate, which never match.
+    """
+    try:
+        return soupsieve.compile(selector)
+    except (SelectorSyntaxError, NotImplementedError, ValueError):
+        return None
+
+
+def is_supported_selector(selector):
+    """
+    Checks if a selector can be matched, as the selector() conditions of
+    @supports rules ask.
+    """
+    return _compile_selector(selector.strip()) is not None
+
+
+class CompiledRule(NamedTuple):
+    """
+    A single selector of a CSS rule with its precomputed specificity and source order.
+    """
+    selector: str
+    specificity: tuple
+    order: int
+    declarations: dict
+    # Simple rules match every element in their bucket and skip the full match
+    is_simple: bool
+    # Filter bits of the ids, classes and tags the subject's ancestors must have
+    ancestor_mask: int
+    # The later rules with the same selector, which match the same elements
+    repeats: tuple = ()
+
+    def matches(self, element):
+        """
+        Checks if the rule's selector matches an element.
+        """
+        if self.is_simple:
+            return True
+        pattern = _compile_selector(self.selector)
+        return pattern is not None and pattern.match(element)
+
+
+def compile_rule(selector, order, declarations):
+    """
+    Compiles a single selector of a CSS rule.
+
+    Args:
+        selector (str): The selector.
+        order (int): The position of the selector in the stylesheet.
+        declarations (dict): The style properties of the rule.
+
+    Returns:
+        tuple: The bucket key of the rule ("*" for the universal bucket) and the
+               CompiledRule, or None for selectors of pseudo-elements.
+    """
+    specificity, compound, ancestor_parts, is_pseudo_element = _scan_selector(selector)
+    if is_pseudo_element:
+        return None
+
+    # Bucket the rule by the most selective key of its rightmost compound
+    keys = [key for key in map(_part_key, compound) if key]
+    keys.sort(key=lambda key: BUCKET_PRIORITY.get(key[0], 2))
+
+    ancestor_mask = 0
+    for key in filter(None, map(_part_key, ancestor_parts)):
+        ancestor_mask |= _key_bit(key)
+
+    # Only a lone tag, class or id matches every element of its bucket. Attribute
+    # and pseudo-class selectors (":root", "[type=text]") need the full match
+    is_simple = len(compound) == 1 and selector == compound[0] and "\\" not in selector \
+        and (selector == "*" or _part_key(selector) is not None)
+    rule = CompiledRule(selector, specificity, order, declarations, is_simple, ancestor_mask)
+    return (keys[0] if keys else "*"), rule
+
+
+class SelectorIndex:
+    """
+    Compiled index of parsed CSS styles bucketed by the id, class or tag
+    of each selector's rightmost compound selector.
+    """
+
+    def __init__(self, styles, viewport=None):
+        """
+        Args:
+            styles (list | dict): The parsed CSS styles, as (selector text,
+                                  declarations) pairs in source order, or a
+                                  dictionary mapping selector text to declarations.
+            viewport (ViewportProfile): The viewport the styles were parsed for,
+                                        by default the configured one.
+        """
+        self.styles = styles
+        self.viewport = viewport
+        self.buckets = {}
+        self.universal = []
+        # Whether inserting or removing an element can change the rules its siblings match
+        self.has_sibling_selectors = False
+        root_rules = []
+        # The bucket and position of the first rule of each selector
+        first_rules = {}
+
+        order = 0
+        for selector_text, declarations in styles.items() if isinstance(styles, dict) \
+                else styles:
+            if not declarations:
+                continue
+            for selector in split_selector_list(selector_text):
+                rule_declarations = declarations
+                if selector in ROOT_SELECTORS:
+                    root_rules.append((_scan_selector(selector)[0], order, declarations))
+                    rule_declarations = {prop: value for prop, value in declarations.items()
+                                         if not prop.startswith("--")}
+                compiled = compile_rule(selector, order, rule_declarations) \
+                    if rule_declarations else None
+                order += 1
+                if compiled is None:
+                    continue
+                self.has_sibling_selectors = self.has_sibling_selectors \
+                    or SIBLING_SELECTOR.search(selector) is not None
+                self._add_rule(*compiled, first_rules)
+
+        # The custom properties of the root rules are inherited by every element
+        root_variables = {}
+        for _, _, declarations in sorted(root_rules, key=lambda rule: rule[:2]):
+            root_variables.update((prop, value) for prop, value in declarations.items()
+                                  if prop.startswith("--"))
+        self.root_variables = resolve_custom_properties(root_variables)
+        # Values with var() references already substituted from the root token table
+        self.root_substitutions = {}
+
+    def _add_rule(self, bucket, rule, first_rules):
+        """
+        Adds a compiled rule to its bucket. A rule repeating the selector of an
+        earlier one is attached to it, so the selector is matched once but each
+        rule keeps its place in the cascade.
+
+        Args:
+            bucket (str): The bucket key of the rule, "*" for the universal bucket.
+            rule (CompiledRule): The rule.
+            first_rules (dict): Maps each selector to the bucket list and position
+                                of its first rule, updated as rules are added.
+        """
+        rules = self.universal if bucket == "*" else self.buckets.setdefault(bucket, [])
+        if rule.selector in first_rules:
+            rules, position = first_rules[rule.selector]
+            rules[position] = rules[position]._replace(repeats=rules[position].repeats + (rule,))
+        else:
+            first_rules[rule.selector] = (rules, len(rules))
+            rules.append(rule)
+
+    def matching_rules(self, element, ancestor_mask=None):
+        """
+        Returns the rules matching an element, ordered from the lowest to
+        the highest priority in the cascade.
+
+        Args:
+            element (Tag): The HTML element.
+            ancestor_mask (int): The union of element_key_mask over the element's
+                                 ancestors. Rules whose ancestors can't be present
+                                 are rejected without a full match when given.
+
+        Returns:
+            list: The matching CompiledRule objects.
+        """
+        buckets = [self.universal, self.buckets.get(element.name, ())]
+        for class_name in set(element.attrs.get("class", [])):
+            buckets.append(self.buckets.get("." + class_name, ()))
+        element_id = element.attrs.get("id")
+        if element_id:
+            buckets.append(self.buckets.get("#" + element_id, ()))
+
+        if ancestor_mask is None:
+            matched = [rule for bucket in buckets for rule in bucket if rule.matches(element)]
+        else:
+            # Reject rules whose ancestors can't be present before any full match
+            missing = ~ancestor_mask
+            matched = [rule for bucket in buckets for rule in bucket
+                       if not rule.ancestor_mask & missing and rule.matches(element)]
+        matched += [repeat for rule in matched for repeat in rule.repeats]
+        matched.sort(key=lambda rule: (rule.specificity, rule.order))
+        return matched
+
+    def matched_style(self, element, ancestor_mask=None):
+        """
+        Returns the style properties the stylesheet rules give an element.
+
+        Args:
+            element (Tag): The HTML element.
+            ancestor_mask (int): The ancestor filter bits of the element, if known.
+
+        Returns:
+            dict: A new dictionary of the style properties after the cascade.
+        """
+        elem_style = {}
+        for rule in self.matching_rules(element, ancestor_mask):
+            elem_style.update(rule.declarations)
+        return elem_style
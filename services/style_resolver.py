@@ -0,0 +1,305 @@
+"""
+This module provides a style resolver that computes the styles of every element
+in a parsed document in a single top-down pass. Each element inherits the already
+resolved style of its parent instead of walking its ancestors again, and results
+are memoized so every scanner in a request can share them. Font sizes and line
+heights are resolved to px along the way, each relative to the parent's, and
+var() references are substituted from the custom properties each element inherits.
+"""
+from bs4 import BeautifulSoup
+from services.selector_index import SelectorIndex, element_key_mask
+from utils.contrast_utils import WHITE, composite, parse_color
+from utils.lengths import DEFAULT_FONT_SIZE, NORMAL_LINE_HEIGHT, resolve_custom_properties, \
+    resolve_font_size, resolve_line_height, substitute_vars
+from utils.timing import stage_timer
+
+# Properties passed down from an element's resolved style to its children.
+# Backgrounds are not inherited, the resolver blends them down separately.
+INHERITED_PROPERTIES = frozenset([
+    "color", "font", "font-family", "font-size", "font-style",
+    "font-variant", "font-weight", "letter-spacing", "line-height", "text-align",
+    "text-indent", "text-transform", "visibility", "white-space", "word-spacing",
+])
+
+
+def parse_inline_style(style_attribute):
+    """
+    Parses the value of an element's style attribute into a dictionary.
+
+    Args:
+        style_attribute (str): The raw style attribute (e.g., "color: red; font-size: 2em").
+
+    Returns:
+        dict: The style properties and their values.
+    """
+    inline_style = {}
+    for prop_value in style_attribute.split(";"):
+        if ":" in prop_value:
+            prop, value = prop_value.split(":", 1)
+            prop = prop.strip()
+            # Custom property names are case-sensitive
+            inline_style[prop if prop.startswith("--") else prop.lower()] = value.strip()
+    return inline_style
+
+
+def background_layer(style):
+    """
+    Returns the background color declared by a style, from its background-color
+    or the color of its background shorthand.
+
+    Args:
+        style (dict): The declared or computed style of an element.
+
+    Returns:
+        tuple: The (r, g, b, alpha) background color, or None if the style
+               declares none (or only an image or gradient).
+    """
+    color = parse_color(style.get("background-color", ""))
+    if color is not None or "background" not in style:
+        return color
+    # The color of the shorthand is a token of its last layer, outside of any function
+    depth = 0
+    token = ""
+    tokens = []
+    for char in style["background"] + " ":
+        depth += (char == "(") - (char == ")")
+        if depth > 0 or not (char.isspace() or char == ","):
+            token += char
+            continue
+        if token:
+            tokens.append(token)
+            token = ""
+        if char == ",":
+            tokens = []
+    for token in tokens:
+        color = parse_color(token)
+        if color is not None:
+            return color
+    return None
+
+
+class StyleResolver:
+    """
+    Resolves and memoizes the computed style of the elements of one document.
+    """
+
+    def __init__(self, styles):
+        """
+        Args:
+            styles (list | dict | SelectorIndex): The parsed CSS styles, or a
+                                                  selector index already compiled from them.
+        """
+        self.index = styles if isinstance(styles, SelectorIndex) else SelectorIndex(styles)
+        self._computed = {}
+        # Ancestor filter bits of each resolved element, including the element itself
+        self._masks = {}
+        # The opaque rgb background each resolved element is drawn over
+        self._backgrounds = {}
+        # The font size in px and the (value, is_factor) line height of each resolved element
+        self._lengths = {}
+        # The font size of the html element, which rem units are relative to
+        self._root_font_size = DEFAULT_FONT_SIZE
+        # The resolved custom properties of each element, shared with its parent
+        # when it declares none of its own
+        self._variables = {}
+
+    def computed_style(self, element):
+        """
+        Returns the computed style of an element, resolving any of its
+        ancestors that have not been resolved yet from the top down.
+
+        Args:
+            element (Tag): The HTML element whose style is being computed.
+
+        Returns:
+            dict: The computed style dictionary for the element. It is shared
+                  between callers and must not be modified.
+        """
+        style = self._computed.get(id(element))
+        if style is not None:
+            return style
+
+        with stage_timer("style_resolution"):
+            # Collect the unresolved ancestors, then resolve them parent first
+            unresolved = []
+            node = element
+            while id(node) not in self._computed:
+                if isinstance(node, BeautifulSoup) or node.parent is None:
+                    # The document itself has no style to pass down
+                    self._computed[id(node)] = {}
+                    self._masks[id(node)] = 0
+                    self._backgrounds[id(node)] = WHITE
+                    self._lengths[id(node)] = (DEFAULT_FONT_SIZE, (NORMAL_LINE_HEIGHT, True))
+                    self._variables[id(node)] = self.index.root_variables
+                    break
+                unresolved.append(node)
+                node = node.parent
+
+            parent_style = self._computed[id(node)]
+            for node in reversed(unresolved):
+                parent_style = self._resolve(node, parent_style)
+            return parent_style
+
+    def background(self, element):
+        """
+        Returns the opaque rgb color an element is drawn over: its own background
+        blended over the backgrounds of its ancestors, or theirs when it has none.
+        It is resolved along with the element's style, top-down from its parent's,
+        so no ancestors are walked to read it.
+
+        Args:
+            element (Tag): The HTML element.
+
+        Returns:
+            tuple: The (r, g, b) background color.
+        """
+        background = self._backgrounds.get(id(element))
+        if background is None:
+            self.computed_style(element)
+            background = self._backgrounds[id(element)]
+        return background
+
+    def font_size(self, element):
+        """
+        Returns the font size of an element in px, resolved along with its style
+        from its own font-size and its parent's font size.
+
+        Args:
+            element (Tag): The HTML element.
+
+        Returns:
+            float: The font size in px.
+        """
+        lengths = self._lengths.get(id(element))
+        if lengths is None:
+            self.computed_style(element)
+            lengths = self._lengths[id(element)]
+        return lengths[0]
+
+    def line_height(self, element):
+        """
+        Returns the line height of an element in px. A line-height declared as a
+        plain number is inherited as a factor of each descendant's own font size,
+        and one declared as a length is inherited as its px value.
+
+        Args:
+            element (Tag): The HTML element.
+
+        Returns:
+            float: The line height in px.
+        """
+        lengths = self._lengths.get(id(element))
+        if lengths is None:
+            self.computed_style(element)
+            lengths = self._lengths[id(element)]
+        font_size, (value, is_factor) = lengths
+        return value * font_size if is_factor else value
+
+    def invalidate(self, element):
+        """
+        Forgets the resolved styles of an element and its descendants, so they are
+        resolved again after the element, its attributes or its subtree changed.
+        """
+        for node in (element, *element.find_all(True)):
+            self._computed.pop(id(node), None)
+            self._masks.pop(id(node), None)
+            self._backgrounds.pop(id(node), None)
+            self._lengths.pop(id(node), None)
+            self._variables.pop(id(node), None)
+
+    def _resolve(self, element, parent_style):
+        """
+        Computes the style of an element from its own rules and its parent's
+        resolved style, and memoizes it.
+        """
+        ancestor_mask = self._masks[id(element.parent)]
+        elem_style = self.matched_style(element, ancestor_mask)
+        self._resolve_variables(element, elem_style)
+        self._resolve_lengths(element, elem_style)
+        for prop, value in parent_style.items():
+            if prop in INHERITED_PROPERTIES and prop not in elem_style:
+                elem_style[prop] = value
+
+        layer = background_layer(elem_style)
+        parent_background = self._backgrounds[id(element.parent)]
+        self._backgrounds[id(element)] = parent_background if layer is None \
+            else composite(layer, parent_background)
+
+        self._computed[id(element)] = elem_style
+        self._masks[id(element)] = ancestor_mask | element_key_mask(element)
+        return elem_style
+
+    def _resolve_variables(self, element, declared_style):
+        """
+        Moves the custom properties out of an element's declared style into its
+        resolved custom properties, and substitutes the var() references of its
+        other declared values. A value whose references can't be resolved is
+        dropped, so the property is inherited or takes its initial value.
+        """
+        variables = self._variables[id(element.parent)]
+        declared_variables = {prop: declared_style.pop(prop)
+                              for prop in [prop for prop in declared_style
+                                           if prop.startswith("--")]}
+        if declared_variables:
+            variables = resolve_custom_properties(declared_variables, variables)
+        self._variables[id(element)] = variables
+
+        # Values under the root token table are substituted once per stylesheet
+        is_root_table = variables is self.index.root_variables
+        substitutions = self.index.root_substitutions
+        for prop, value in list(declared_style.items()):
+            if "var(" not in value:
+                continue
+            if is_root_table and value in substitutions:
+                substituted = substitutions[value]
+            else:
+                substituted = substitute_vars(value, variables)
+                if is_root_table:
+                    substitutions[value] = substituted
+            if substituted is None:
+                del declared_style[prop]
+            else:
+                declared_style[prop] = substituted
+
+    def _resolve_lengths(self, element, declared_style):
+        """
+        Resolves the font size and line height of an element from the values it
+        declares itself and the resolved values of its parent.
+        """
+        parent = element.parent
+        parent_font_size, parent_line_height = self._lengths[id(parent)]
+        # rem units of the root element itself are relative to the initial font size
+        is_root = element.name == "html" and isinstance(parent, BeautifulSoup)
+        root_font_size = DEFAULT_FONT_SIZE if is_root else self._root_font_size
+
+        font_size = parent_font_size
+        if "font-size" in declared_style:
+            font_size = resolve_font_size(declared_style["font-size"], parent_font_size,
+                                          root_font_size, viewport=self.index.viewport)
+        if is_root:
+            self._root_font_size = font_size
+
+        line_height = None
+        if "line-height" in declared_style:
+            line_height = resolve_line_height(declared_style["line-height"], font_size,
+                                              root_font_size, viewport=self.index.viewport)
+        self._lengths[id(element)] = (font_size, line_height or parent_line_height)
+
+    def matched_style(self, element, ancestor_mask=None):
+        """
+        Returns the style declared for an element itself through its
+        inline style and the stylesheet rules matching it.
+
+        Args:
+            element (Tag): The HTML element.
+            ancestor_mask (int): The ancestor filter bits of the element, if known.
+
+        Returns:
+            dict: A new dictionary of the declared style properties.
+        """
+        elem_style = self.index.matched_style(element, ancestor_mask)
+
+        # Inline styles have the highest priority
+        if element.attrs.get("style"):
+            elem_style.update(parse_inline_style(element.attrs["style"]))
+        return elem_style
@@ -0,0 +1,60 @@
+"""
+This module caches parsed and indexed stylesheets by the hash of their content
+and the viewport their media queries were evaluated for, so repeat scans of
+pages sharing a stylesheet skip CSS parsing and custom property resolution entirely.
+
+The cache is configured through the STYLESHEET_CACHE_SIZE (entries),
+STYLESHEET_CACHE_MAX_BYTES (total CSS bytes) and STYLESHEET_CACHE_TTL
+(seconds) environment variables.
+"""
+import hashlib
+from services.css_parser import parse_css
+from services.media_queries import DEFAULT_VIEWPORT
+from services.selector_index import SelectorIndex
+from utils.lru_cache import LRUCache
+from utils.settings import env_float, env_int
+from utils.timing import record_value, stage_timer
+
+STYLESHEET_CACHE_SIZE = env_int("STYLESHEET_CACHE_SIZE", 64)
+STYLESHEET_CACHE_MAX_BYTES = env_int("STYLESHEET_CACHE_MAX_BYTES", 64 * 1024 * 1024)
+STYLESHEET_CACHE_TTL = env_float("STYLESHEET_CACHE_TTL", 3600) or None
+
+stylesheet_cache = LRUCache(
+    max_entries=STYLESHEET_CACHE_SIZE,
+    max_bytes=STYLESHEET_CACHE_MAX_BYTES,
+    ttl=STYLESHEET_CACHE_TTL,
+)
+
+
+def stylesheet_hash(css_content):
+    """
+    Returns the hash of a stylesheet's content.
+    """
+    return hashlib.sha256(css_content.encode("utf-8", "surrogatepass")).hexdigest()
+
+
+def load_stylesheet(css_content, viewport=None):
+    """
+    Parses and indexes CSS content, reusing the cached result for content
+    that has been loaded before for the same viewport.
+
+    Args:
+        css_content (str): The raw CSS content as a string.
+        viewport (ViewportProfile): The viewport @media rules and vw units are
+                                    evaluated for, by default the configured one.
+
+    Returns:
+        SelectorIndex: The indexed styles. It is shared between requests and
+                       must not be modified.
+    """
+    css_content = css_content or ""
+    record_value("css_bytes", len(css_content))
+    viewport = viewport or DEFAULT_VIEWPORT
+    key = (stylesheet_hash(css_content), viewport)
+    index = stylesheet_cache.get(key)
+    if index is None:
+        with stage_timer("selector_index"):
+            index = SelectorIndex(parse_css(css_content, viewport=viewport), viewport)
+        # The parsed structure grows with the stylesheet, so its length stands in for its size
+        stylesheet_cache.put(key, index, size=len(css_content))
+    return index
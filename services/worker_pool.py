@@ -0,0 +1,198 @@
+"""
+This module runs CPU-bound scan jobs in a pool of worker processes, so large
+pages do not hold the GIL of the threads serving other requests. Jobs get a
+timeout, are admitted based on the size of the input already being scanned,
+and workers are replaced after a number of jobs or when they grow too large.
+"""
+import atexit
+import multiprocessing
+import resource
+import signal
+import threading
+from utils.debug import get_logger
+from utils.settings import env_float, env_int
+from utils.timing import current_request_timing, start_request_timing
+
+# Number of worker processes, or 0 to scan in the serving thread
+SCAN_WORKERS = env_int("SCAN_WORKERS", 0)
+SCAN_WORKER_MAX_TASKS = env_int("SCAN_WORKER_MAX_TASKS", 200)
+SCAN_WORKER_MAX_RSS_MB = env_int("SCAN_WORKER_MAX_RSS_MB", 1024)
+SCAN_TIMEOUT = env_float("SCAN_TIMEOUT", 30)
+SCAN_MAX_PENDING_BYTES = env_int("SCAN_MAX_PENDING_BYTES", 64 * 1024 * 1024)
+# Extra seconds to wait for a worker that did not stop itself at the timeout
+TIMEOUT_GRACE = 5
+
+logger = get_logger(__name__)
+
+
+class ScanRejected(Exception):
+    """
+    Raised when a scan is not admitted because too much input is already being scanned.
+    """
+
+
+class ScanTimeout(Exception):
+    """
+    Raised when a scan job runs longer than its timeout.
+    """
+
+
+def _raise_timeout(_signum, _frame):
+    raise ScanTimeout("Scan timed out")
+
+
+def run_job(function, args, timeout):
+    """
+    Runs a job inside a worker process, interrupting it after timeout seconds.
+
+    Returns:
+        tuple: The job's result, the peak resident size of the worker in MiB and
+               the exported stage timings of the job.
+    """
+    timings = start_request_timing()
+    if timeout and hasattr(signal, "SIGALRM"):
+        signal.signal(signal.SIGALRM, _raise_timeout)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        result = function(*args)
+    finally:
+        if timeout and hasattr(signal, "SIGALRM"):
+            signal.setitimer(signal.ITIMER_REAL, 0)
+    # ru_maxrss is in KiB on Linux
+    return result, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, timings.export()
+
+
+class WorkerPool:
+    """
+    Pool of scan worker processes with per-job timeouts and admission control.
+    """
+
+    def __init__(self, workers=SCAN_WORKERS, timeout=SCAN_TIMEOUT,
+                 max_pending_bytes=SCAN_MAX_PENDING_BYTES):
+        """
+        Args:
+            workers (int): The number of worker processes, or 0 to run jobs in
+                           the calling thread (without a timeout).
+            timeout (float): The seconds a job may run, or 0 for no limit.
+            max_pending_bytes (int): The total input size of the jobs running at
+                                     once. A job is always admitted when none are running.
+        """
+        self.workers = workers
+        self.timeout = timeout
+        self.max_pending_bytes = max_pending_bytes
+        self.counters = {"completed": 0, "rejected": 0, "timed_out": 0, "recycled": 0}
+        self._pending_bytes = 0
+        self._pool = None
+        # Also notified when a job finishes, for the jobs waiting to be admitted
+        self._lock = threading.Condition()
+
+    def admits(self, size):
+        """
+        Checks if a job with an input of some size would be admitted now.
+        """
+        return not self._pending_bytes or self._pending_bytes + size <= self.max_pending_bytes
+
+    def run(self, function, *args, size=0, wait=False):
+        """
+        Runs function(*args) in a worker process and returns its result. The
+        function, its arguments and its result must be picklable.
+
+        Args:
+            function (callable): A module-level function.
+            size (int): The size of the job's input in bytes, used for admission.
+            wait (bool): Whether a job that is not admitted waits, up to the
+                         timeout, for running jobs to finish instead of failing.
+
+        Raises:
+            ScanRejected: If the job is not admitted.
+            ScanTimeout: If the job runs longer than the timeout.
+        """
+        with self._lock:
+            admitted = self.admits(size) or wait and self._lock.wait_for(
+                lambda: self.admits(size), self.timeout or None
+            )
+            if not admitted:
+                self.counters["rejected"] += 1
+                raise ScanRejected("Too many scans in progress")
+            self._pending_bytes += size
+        try:
+            if not self.workers:
+                return function(*args)
+            return self._run_in_worker(function, args)
+        finally:
+            with self._lock:
+                self._pending_bytes -= size
+                self._lock.notify_all()
+
+    def _run_in_worker(self, function, args):
+        """
+        Sends a job to a worker and recycles the pool if the worker hung or grew too large.
+        """
+        pool = self._get_pool()
+        job = pool.apply_async(run_job, (function, args, self.timeout))
+        try:
+            result, rss_mb, timings = job.get(
+                self.timeout + TIMEOUT_GRACE if self.timeout else None
+            )
+        except ScanTimeout:
+            self.counters["timed_out"] += 1
+            raise
+        except multiprocessing.TimeoutError as error:
+            # The worker is stuck outside of Python code, so it is killed
+            self.counters["timed_out"] += 1
+            self._recycle(pool, terminate=True)
+            raise ScanTimeout("Scan timed out") from error
+
+        self.counters["completed"] += 1
+        # The stages timed in the worker belong to the request waiting for it
+        if current_request_timing() is not None:
+            current_request_timing().merge(timings)
+        if rss_mb > SCAN_WORKER_MAX_RSS_MB:
+            logger.info("scan worker reached %d MiB, recycling the pool", rss_mb)
+            self._recycle(pool)
+        return result
+
+    def _get_pool(self):
+        """
+        Returns the worker pool, starting it on first use.
+        """
+        with self._lock:
+            if self._pool is None:
+                # forkserver starts workers from a clean process instead of forking
+                # the server's threads
+                methods = multiprocessing.get_all_start_methods()
+                context = multiprocessing.get_context(
+                    "forkserver" if "forkserver" in methods else "spawn"
+                )
+                self._pool = context.Pool(self.workers, maxtasksperchild=SCAN_WORKER_MAX_TASKS)
+            return self._pool
+
+    def _recycle(self, pool, terminate=False):
+        """
+        Replaces a pool with fresh workers on the next job. Jobs still running on
+        the old pool finish first, unless it is terminated.
+        """
+        with self._lock:
+            if self._pool is not pool:
+                return
+            self._pool = None
+            self.counters["recycled"] += 1
+        if terminate:
+            pool.terminate()
+        else:
+            pool.close()
+        threading.Thread(target=pool.join, daemon=True).start()
+
+    def shutdown(self):
+        """
+        Stops the worker processes.
+        """
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+
+
+worker_pool = WorkerPool()
+atexit.register(worker_pool.shutdown)
@@ -0,0 +1,137 @@
+"""
+Tests of the ASGI serving mode: the bridge running the WSGI app from an event
+loop, and the reporter sending backend reports from it.
+"""
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import httpx
+import pytest
+from app import app
+from services.asgi_bridge import wsgi_bridge
+from utils.async_backend_reporter import AsyncBackendReporter
+
+
+@pytest.fixture(name="executor")
+def fixture_executor():
+    """ the executor threads the WSGI app runs in """
+    executor = ThreadPoolExecutor(2)
+    yield executor
+    executor.shutdown(wait=True, cancel_futures=True)
+
+
+def request(bridge, body=b"", path="/", chunk_size=None, disconnect_after=None):
+    """
+    Sends a POST request through an ASGI app, its body in chunks of chunk_size,
+    and returns the messages it sends back. The client disconnects after
+    disconnect_after body messages, if set.
+    """
+    chunk_size = chunk_size or len(body) or 1
+    incoming = [{"type": "http.request", "body": body[start:start + chunk_size],
+                 "more_body": start + chunk_size < len(body)}
+                for start in range(0, max(len(body), 1), chunk_size)]
+    sent = []
+
+    async def run():
+        disconnected = asyncio.Event()
+
+        async def receive():
+            if incoming:
+                return incoming.pop(0)
+            await disconnected.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            sent.append(message)
+            if disconnect_after is not None \
+                    and sum(item["type"] == "http.response.body" for item in sent) \
+                    >= disconnect_after:
+                disconnected.set()
+
+        scope = {"type": "http", "method": "POST", "path": path, "query_string": b"",
+                 "http_version": "1.1", "headers": [(b"content-type", b"application/json")]}
+        await asyncio.wait_for(bridge(scope, receive, send), 10)
+
+    asyncio.run(run())
+    return sent
+
+
+def response_body(messages):
+    """ the body sent in the response messages """
+    return b"".join(message.get("body", b"") for message in messages
+                    if message["type"] == "http.response.body")
+
+
+def test_bridge_serves_the_flask_app(executor, monkeypatch):
+    """ a scan sent in several chunks gets the response the WSGI app gives """
+    monkeypatch.setattr("app.report_scan", lambda *args: None)
+    page = {"dom": '<html><body><p style="color: #ccc">Faint</p></body></html>', "css": ""}
+    body = json.dumps(page).encode("utf-8")
+    messages = request(wsgi_bridge(app.wsgi_app, executor), body, "/api/scan-all",
+                       chunk_size=10)
+    assert messages[0]["status"] == 200
+    expected = app.test_client().post("/api/scan-all", json=page).get_json()
+    assert json.loads(response_body(messages)) == expected
+
+
+def test_oversized_body_is_rejected_on_the_loop(executor):
+    """ a body over the limit gets a 413 without reaching the application """
+    calls = []
+
+    def wsgi_app(environ, start_response):
+        calls.append(environ)
+        start_response("200 OK", [])
+        return [b""]
+
+    messages = request(wsgi_bridge(wsgi_app, executor, max_bytes=16), b"x" * 17, chunk_size=4)
+    assert messages[0]["status"] == 413
+    assert json.loads(response_body(messages))["limit"] == 16
+    assert not calls
+
+
+def test_disconnect_stops_a_streamed_response(executor):
+    """ the application's response is closed once the client goes away """
+    closed = threading.Event()
+
+    def wsgi_app(_environ, start_response):
+        start_response("200 OK", [("Content-Type", "application/x-ndjson")])
+        try:
+            while True:
+                time.sleep(0.01)
+                yield b"{}\n"
+        finally:
+            closed.set()
+
+    messages = request(wsgi_bridge(wsgi_app, executor), disconnect_after=3)
+    assert messages[0]["status"] == 200
+    assert closed.wait(5)
+
+
+def test_async_reporter_drains_events_from_other_threads(monkeypatch):
+    """ events submitted from scan threads are posted from the loop and drained on shutdown """
+    posted = []
+
+    def handler(backend_request):
+        posted.append(backend_request.url.path)
+        return httpx.Response(200)
+
+    monkeypatch.setattr(httpx, "AsyncClient",
+                        partial(httpx.AsyncClient, transport=httpx.MockTransport(handler)))
+
+    async def run():
+        reporter = AsyncBackendReporter(batch_size=2)
+        await reporter.start()
+        submitters = [threading.Thread(target=reporter.submit, args=(f"/api/event/{event}",))
+                      for event in range(5)]
+        for submitter in submitters:
+            submitter.start()
+        for submitter in submitters:
+            submitter.join()
+        await reporter.shutdown(timeout=5)
+        return reporter.counters
+
+    assert asyncio.run(run()) == {"sent": 5, "failed": 0, "dropped": 0}
+    assert sorted(posted) == [f"/api/event/{event}" for event in range(5)]
@@ -0,0 +1,73 @@
+"""
+Tests of the background reporting of scores and selections to the backend.
+"""
+import threading
+import time
+from types import SimpleNamespace
+import pytest
+from utils import backend_reporter
+from utils.backend_reporter import BackendReporter
+
+
+@pytest.fixture(name="backend")
+def fixture_backend(monkeypatch):
+    """ a backend recording the (endpoint, thread) of posts, answering its statuses, then 200 """
+    backend = SimpleNamespace(posts=[], statuses=[], delay=0)
+
+    def post_backend(endpoint, session=None):
+        assert session is not None
+        time.sleep(backend.delay)
+        backend.posts.append((endpoint, threading.current_thread()))
+        return SimpleNamespace(status_code=backend.statuses.pop(0) if backend.statuses else 200)
+
+    monkeypatch.setattr(backend_reporter, "post_backend", post_backend)
+    monkeypatch.setattr(backend_reporter, "RETRY_BACKOFF", 0)
+    return backend
+
+
+def test_events_are_sent_in_batches_by_one_thread(backend):
+    """ every queued event is posted by the same long-lived thread, and drained on shutdown """
+    reporter = BackendReporter(batch_size=3)
+    threads = threading.active_count()
+    for event in range(10):
+        reporter.submit(f"/api/event/{event}")
+    assert threading.active_count() <= threads + 1
+    reporter.shutdown(timeout=5)
+    assert [endpoint for endpoint, _ in backend.posts] \
+        == [f"/api/event/{event}" for event in range(10)]
+    assert len({thread for _, thread in backend.posts}) == 1
+    assert reporter.counters == {"sent": 10, "failed": 0, "dropped": 0}
+
+
+def test_server_errors_are_retried(backend):
+    """ an event answered with server errors is posted again """
+    backend.statuses[:] = [500, 503]
+    reporter = BackendReporter()
+    reporter.submit("/api/event")
+    reporter.shutdown(timeout=5)
+    assert len(backend.posts) == 3
+    assert reporter.counters["sent"] == 1
+
+
+def test_full_queue_drops_events(backend):
+    """ events over the queue size are dropped instead of blocking the caller """
+    backend.delay = 0.2
+    reporter = BackendReporter(queue_size=1, batch_size=1)
+    results = [reporter.submit(f"/api/event/{event}") for event in range(5)]
+    assert not all(results)
+    assert reporter.counters["dropped"] == results.count(False)
+    reporter.shutdown(timeout=0)
+
+
+def test_shutdown_is_bounded_by_the_drain_timeout(backend, monkeypatch):
+    """ a slow or failing backend does not hold the shutdown past its timeout in total """
+    monkeypatch.setattr(backend_reporter, "RETRY_BACKOFF", 10)
+    backend.statuses[:] = [500]
+    backend.delay = 0.1
+    reporter = BackendReporter()
+    for event in range(20):
+        reporter.submit(f"/api/event/{event}")
+    start = time.monotonic()
+    reporter.shutdown(timeout=0.5)
+    assert time.monotonic() - start < 1
+    assert len(backend.posts) < 20
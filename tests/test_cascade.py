@@ -0,0 +1,36 @@
+"""
+Tests of the cascade of stylesheet rules against the values a browser computes.
+"""
+import pytest
+from services.css_parser import parse_css
+from services.html_parser import parse_html
+from services.style_resolver import StyleResolver
+
+PAGE = '<html><body><p class="a b" id="main">Text</p></body></html>'
+# Each stylesheet and the color the paragraph ends up with
+CASCADES = {
+    "repeated selector wins by source order": (
+        ".a { color: red } .b { color: blue } .a { color: green }", "green"),
+    "earlier declarations of a repeated selector stay in place": (
+        ".a { color: red; background-color: #fff } .b { color: blue } .a { font-size: 2em }",
+        "blue"),
+    "specificity beats source order": ("#main { color: red } .a { color: green }", "red"),
+    "repeated selector in a media block": (
+        ".a { color: red } .b { color: blue } @media screen { .a { color: green } }", "green"),
+    "repeated selector in a supports block": (
+        ".a { color: red } .b { color: blue } @supports (display: grid) { .a { color: green } }",
+        "green"),
+    "fallback of a supports block": (
+        "@supports (display: grid) { .a { color: green } } "
+        "@supports not (display: grid) { .a { color: red } }", "green"),
+    "repeated selector in a selector list": (
+        "p, .a { color: red } .b { color: blue } .a, div { color: green }", "green"),
+}
+
+
+@pytest.mark.parametrize("backend", ["cssutils", "fast"])
+@pytest.mark.parametrize("css, color", CASCADES.values(), ids=CASCADES.keys())
+def test_cascade(backend, css, color):
+    """ the computed color is the one the cascade gives """
+    element = parse_html(PAGE).find("p")
+    assert StyleResolver(parse_css(css, backend)).computed_style(element)["color"] == color
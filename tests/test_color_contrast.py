@@ -0,0 +1,51 @@
+"""
+Tests of the color contrast scanner: the large text threshold, and the
+parity of the per-element and vectorized evaluations.
+"""
+import pytest
+from benchmarks.corpus import generate_page, generate_stylesheet
+from scanners import color_contrast_scanner
+from scanners.color_contrast_scanner import score_text_contrast, score_text_contrast_batch
+from scanners.scan_all import score_all
+from services.stylesheet_cache import stylesheet_cache
+
+# #777 on white has a contrast ratio of 4.47, between the large and normal text thresholds
+PAGE = """
+<html><body>
+  <p class="grey">Normal grey text</p>
+  <p class="grey large">Large grey text</p>
+  <p class="grey bold">Bold grey text</p>
+  <p class="grey bold small">Small bold grey text</p>
+  <h1 class="grey">Grey heading</h1>
+  <p class="faint large">Faint large text</p>
+  <p>Black text</p>
+</body></html>
+"""
+CSS = """
+.grey { color: #777 } .faint { color: #ccc } .large { font-size: 24px } h1 { font-size: 2em }
+.bold { font-weight: bold; font-size: 19px } .small { font-size: 18px }
+"""
+CASES = {
+    "thresholds": (PAGE, CSS),
+    "benchmark corpus": (generate_page(400), generate_stylesheet(200)),
+}
+
+
+def test_large_text_needs_a_lower_contrast():
+    """ large and bold large text pass at 3:1, other text needs 4.5:1 """
+    score, findings = score_text_contrast(PAGE, CSS)
+    assert [finding.element.get_text() for finding in findings] == [
+        "Normal grey text", "Small bold grey text", "Faint large text",
+    ]
+    assert score == 57.1
+
+
+@pytest.mark.parametrize("min_elements", [0, 10 ** 9], ids=["vectorized", "per element"])
+@pytest.mark.parametrize("page, css", CASES.values(), ids=CASES.keys())
+def test_batch_and_scalar_findings_match(page, css, min_elements, monkeypatch):
+    """ scan-all's batch evaluation finds what the per-element check finds """
+    monkeypatch.setattr(color_contrast_scanner, "CONTRAST_BATCH_MIN_ELEMENTS", min_elements)
+    stylesheet_cache.clear()
+    scalar = score_text_contrast(page, css)
+    assert score_all(page, css, ["color-contrast"])["color-contrast"] == scalar
+    assert score_text_contrast_batch(page, css)[:2] == scalar
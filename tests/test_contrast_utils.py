@@ -0,0 +1,12 @@
+"""
+Tests of the color parsing and contrast ratio utilities.
+"""
+from utils.contrast_utils import calculate_luminance, contrast_ratio
+
+
+def test_contrast_ratio_accepts_lists_and_tuples():
+    """ the memoization does not require hashable arguments """
+    assert contrast_ratio([0, 0, 0], [255, 255, 255]) == 21.0
+    assert contrast_ratio((119, 119, 119), (255, 255, 255)) \
+        == contrast_ratio([119, 119, 119], [255, 255, 255]) == 4.47
+    assert calculate_luminance([255, 255, 255]) == calculate_luminance((255, 255, 255)) == 1.0
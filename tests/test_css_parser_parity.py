@@ -0,0 +1,103 @@
+"""
+Parity tests of the CSS parser backends: the fast tokenizer must give every
+element the same computed style, and every scanner the same score, as cssutils.
+"""
+import pytest
+from benchmarks.corpus import generate_page, generate_stylesheet
+from services import css_parser
+from services.css_parser import parse_css
+from services.html_parser import parse_html
+from services.stylesheet_cache import stylesheet_cache
+from services.style_resolver import StyleResolver
+from scanners.scan_all import score_all
+
+PAGE = """
+<html><body>
+  <h1 class="title">Heading</h1>
+  <p class="note">A note with <span class="small">small text</span></p>
+  <p id="main" class="md:flex">Main paragraph</p>
+  <div class="card"><p>Card text</p><a href="#">Link</a></div>
+  <img src="a.png" alt="An image"><img src="b.png">
+</body></html>
+"""
+
+STYLESHEETS = {
+    "plain": "p { color: #777; font-size: 14px } .title { font-size: 2em; line-height: 1 }",
+    "repeated selectors": "p { color: red } .note { color: #333 } p { font-size: 12px }",
+    "selector lists": "h1, .note , #main { color: #999; background-color: #fff }",
+    "important": "p { color: #eee !important; color: #000 } .note { color: #111 ! IMPORTANT }",
+    "escapes": ".md\\:flex { color: #aaa } .card p { font-size: 11px }",
+    "comments": "/* header */ p { /* inner */ color: /* mid */ #888 } /* trailing",
+    "strings and urls": "p { font-family: \"A;B{}\"; background: url(\"a;b{}.png\") #fff } "
+                        ".note { background: url(n.png) #eee }",
+    "at-rules": """
+        @charset "utf-8";
+        @import url("other.css");
+        @font-face { font-family: X; src: url(x.woff) }
+        @keyframes spin { from { color: red } to { color: blue } }
+        @supports (display: grid) { p { color: #ccc } }
+        @page { margin: 1cm }
+        .small { font-size: 10px }
+    """,
+    "media": """
+        @media screen and (min-width: 600px) { p { color: #666 } }
+        @media print { p { color: #000 } }
+        @media (max-width: 400px) { .note { font-size: 30px } }
+    """,
+    "media without whitespace": """
+        @media(min-width:600px){p{color:#666}}
+        @MEDIA\nscreen{.note{font-size:30px}}
+        @media-like (min-width: 600px) { h1 { color: #999 } }
+    """,
+    "supports": """
+        @supports (display: grid) and (not (display: inline-grid)) { p { color: #666 } }
+        @supports not (display: grid) { p { color: #000 } }
+        @supports(display:flex){.note{font-size:30px;font-family:"A;B{}"}}
+        @supports selector(:has(a)) or font-tech(color-colrv1) { .card p { color: #999 } }
+        @supports font-format(woff2) { h1 { color: #eee } }
+    """,
+    "custom properties": ":root { --fg: #777; --size: 12px } p { color: var(--fg); "
+                         "font-size: var(--size) }",
+    "malformed blocks": "p { color: #777; ; font-size: } .note { color } "
+                        "h1 { color: #bbb; line-height: 1",
+    "unclosed rule": ".card p { color: #555 } a { color: #ddd",
+    "stray braces": "} p { color: #444 } { .note { color: #999 }",
+    "stray brace before a statement": "} ; p { color: #444 } .note { color: #999 } }",
+}
+
+
+def computed_styles(css, backend):
+    """ the computed style of every element of the page """
+    resolver = StyleResolver(parse_css(css, backend=backend))
+    return [dict(resolver.computed_style(element))
+            for element in parse_html(PAGE).find_all(True)]
+
+
+@pytest.mark.parametrize("css", STYLESHEETS.values(), ids=STYLESHEETS.keys())
+def test_computed_styles_match(css):
+    """ both backends give every element the same computed style """
+    assert computed_styles(css, "fast") == computed_styles(css, "cssutils")
+
+
+@pytest.mark.parametrize("css", STYLESHEETS.values(), ids=STYLESHEETS.keys())
+def test_scores_match(css, monkeypatch):
+    """ both backends give every scanner the same score and findings """
+    results = {}
+    for backend in ("fast", "cssutils"):
+        monkeypatch.setattr(css_parser, "CSS_PARSER_BACKEND", backend)
+        stylesheet_cache.clear()
+        results[backend] = score_all(PAGE, css)
+    stylesheet_cache.clear()
+    assert results["fast"] == results["cssutils"]
+
+
+def test_benchmark_corpus_matches(monkeypatch):
+    """ both backends score the synthetic benchmark page the same """
+    page, css = generate_page(300), generate_stylesheet(200)
+    results = {}
+    for backend in ("fast", "cssutils"):
+        monkeypatch.setattr(css_parser, "CSS_PARSER_BACKEND", backend)
+        stylesheet_cache.clear()
+        results[backend] = score_all(page, css)
+    stylesheet_cache.clear()
+    assert results["fast"] == results["cssutils"]
@@ -0,0 +1,27 @@
+"""
+Tests of the compact element references.
+"""
+from services.html_parser import parse_html
+from utils.common_utils import Finding
+from utils.element_refs import element_steps, resolve_css_path, serialize_findings
+
+PAGE = "<html><body><div>text<p>a</p><span>b</span><p>c</p></div><div><p>d</p></div></body></html>"
+
+
+def test_steps_number_same_named_siblings():
+    """ each step is the element's position among the siblings of its tag """
+    soup = parse_html(PAGE)
+    last_p = soup.find_all("p")[1]
+    assert element_steps(last_p) == [("html", 1), ("body", 1), ("div", 1), ("p", 2)]
+    assert element_steps(soup.find_all("p")[2]) == [("html", 1), ("body", 1), ("div", 2), ("p", 1)]
+
+
+def test_compact_references_resolve_to_their_elements():
+    """ the css paths of findings serialized together lead back to each element """
+    soup = parse_html(PAGE)
+    elements = soup.find_all(True)
+    findings = [Finding(element, index, {}) for index, element in enumerate(elements)]
+    references = serialize_findings(findings, "compact")
+    assert [resolve_css_path(soup, reference["css_path"]) for reference in references] \
+        == elements
+    assert references[-1]["xpath"] == "/html[1]/body[1]/div[2]/p[1]"
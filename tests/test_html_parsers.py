@@ -0,0 +1,37 @@
+"""
+Conformance of the lxml and html5lib backends with html.parser: the scanners
+must score malformed markup the same whichever backend parsed it.
+"""
+import pytest
+from benchmarks.html_parsers import MALFORMED_CSS, MALFORMED_PAGES, score_all_with_backend
+from services.html_parser import parse_html
+
+# Pages the backends legitimately parse differently, with the backend's own scores.
+# lxml drops the text of a document starting with a stray end tag, as documented
+# in the README, so the low contrast paragraph is never seen.
+KNOWN_DIFFERENCES = {
+    ("stray end tags", "lxml"): {"color-contrast": 100.0},
+}
+
+
+def scores(html, backend):
+    """ the score of every scanner for a page parsed with a backend """
+    return {name: result[0] if isinstance(result, list) else result
+            for name, result in score_all_with_backend(html, MALFORMED_CSS, backend).items()}
+
+
+@pytest.mark.parametrize("backend", ["lxml", "html5lib"])
+@pytest.mark.parametrize("name", MALFORMED_PAGES)
+def test_malformed_markup_scores(name, backend):
+    """ the backend scores malformed markup like html.parser, or as documented """
+    pytest.importorskip(backend)
+    expected = {**scores(MALFORMED_PAGES[name], "html.parser"),
+                **KNOWN_DIFFERENCES.get((name, backend), {})}
+    assert scores(MALFORMED_PAGES[name], backend) == expected
+
+
+@pytest.mark.parametrize("backend", ["lxml", "html5lib"])
+def test_backend_is_used(backend):
+    """ the backend builds the tree, rather than falling back to html.parser """
+    pytest.importorskip(backend)
+    assert parse_html("<p>text", backend).builder.NAME == backend
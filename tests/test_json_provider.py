@@ -0,0 +1,59 @@
+"""
+Tests that the orjson and standard library JSON backends encode the same JSON.
+"""
+import datetime
+import uuid
+from dataclasses import dataclass
+from decimal import Decimal
+import numpy as np
+import pytest
+from app import app
+from utils import json_provider
+from utils.json_provider import dumps_bytes, loads_bytes
+
+pytest.importorskip("orjson")
+
+
+@dataclass
+class Point:
+    """ a dataclass, encoded as its fields """
+    x: int
+    y: float
+
+
+VALUES = {
+    "scores": {"color-contrast": 90.9, "large-text": 0.1 + 0.2, "alt-text": 100.0},
+    "unicode": {"element": "<p>Café ☕ \U0001f600 \"quoted\"</p>", "empty": []},
+    "numbers": [0, -1, 2 ** 53, 0.5, 1234.5678, True, None],
+    "numpy float": {"score": np.float64(4.5)},
+    "int keys": {1: "a", 2: {"nested": [1, 2]}},
+    "flask types": [datetime.datetime(2024, 1, 2, 3, 4, 5, tzinfo=datetime.timezone.utc),
+                    datetime.date(2024, 1, 2), Decimal("1.25"), uuid.UUID(int=1), Point(1, 2.5)],
+}
+
+
+@pytest.mark.parametrize("value", VALUES.values(), ids=VALUES.keys())
+def test_backends_encode_the_same_bytes(value):
+    """ orjson and the standard library give the same encoding and decode it the same """
+    encoded = dumps_bytes(value, "orjson")
+    assert encoded == dumps_bytes(value, "stdlib")
+    assert loads_bytes(encoded, "orjson") == loads_bytes(encoded, "stdlib")
+
+
+def test_exponents_decode_the_same():
+    """ numbers with exponents are written differently by each backend, but read back the same """
+    value = [1e-7, 1.5e300, -2.5e-12]
+    for backend in ("orjson", "stdlib"):
+        assert loads_bytes(dumps_bytes(value, backend), "orjson") \
+            == loads_bytes(dumps_bytes(value, backend), "stdlib") == value
+
+
+@pytest.mark.parametrize("backend", ["orjson", "stdlib"])
+def test_responses_are_the_same_with_either_backend(monkeypatch, backend):
+    """ a scan response has the same body whichever backend encodes it """
+    monkeypatch.setattr("app.report_scan", lambda *args: None)
+    page = {"dom": "<html><body><p style=\"color: #ccc\">Café</p></body></html>", "css": ""}
+    expected = app.test_client().post("/api/scan-all", json=page).get_data()
+    monkeypatch.setattr(json_provider, "JSON_BACKEND", backend)
+    assert json_provider.use_orjson() == (backend == "orjson")
+    assert app.test_client().post("/api/scan-all", json=page).get_data() == expected
@@ -0,0 +1,33 @@
+"""
+Tests of the evaluation of lengths and of var() references to custom properties.
+"""
+import pytest
+from services.css_parser import parse_css
+from services.html_parser import parse_html
+from services.style_resolver import StyleResolver
+from utils.lengths import LengthContext, evaluate_value
+
+CONTEXT = LengthContext(16.0, 16.0)
+VARIABLES = {"--Gap": "2EM", "--gap": "10px"}
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("var(--Gap)", (32.0, True)),
+    ("var(--gap)", (10.0, True)),
+    ("CALC(var(--Gap) + var(--gap))", (42.0, True)),
+    ("var(--GAP, 3Px)", (3.0, True)),
+])
+def test_custom_property_names_are_case_sensitive(value, expected):
+    """ var() finds the custom property of the same case, and the units are then lowercased """
+    assert evaluate_value(value, CONTEXT, VARIABLES) == expected
+
+
+@pytest.mark.parametrize("backend, font_size", [("fast", 20.0), ("cssutils", 10.0)])
+def test_mixed_case_custom_property_font_size(backend, font_size):
+    """
+    a mixed-case custom property is not mixed up with its lowercase namesake,
+    except by cssutils, which lowercases the names and then the references to them
+    """
+    css = ":root { --Size: 20px; --size: 10px } p { font-size: var(--Size) }"
+    element = parse_html("<html><body><p>Text</p></body></html>").find("p")
+    assert StyleResolver(parse_css(css, backend)).font_size(element) == font_size
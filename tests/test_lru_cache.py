@@ -0,0 +1,59 @@
+"""
+Tests of the LRU cache bounded by entry count, total size and time to live.
+"""
+import pytest
+from utils import lru_cache
+from utils.lru_cache import LRUCache
+
+
+@pytest.fixture(name="clock")
+def fixture_clock(monkeypatch):
+    """ a clock the test moves forward, read by the cache as its monotonic time """
+    clock = [100.0]
+    monkeypatch.setattr(lru_cache.time, "monotonic", lambda: clock[0])
+    return clock
+
+
+def test_least_recently_used_entry_is_evicted():
+    """ reading an entry keeps it over the entries read or written before it """
+    cache = LRUCache(max_entries=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == (1, None, 3)
+    assert cache.stats() == {"hits": 3, "misses": 1, "evictions": 1, "entries": 2, "bytes": 0}
+
+
+def test_entries_are_evicted_by_total_size():
+    """ the oldest entries go until the total size is within the byte limit """
+    cache = LRUCache(max_entries=10, max_bytes=100)
+    cache.put("a", 1, size=40)
+    cache.put("b", 2, size=40)
+    cache.put("c", 3, size=40)
+    assert cache.get("a") is None
+    assert cache.stats()["bytes"] == 80
+    # Replacing an entry counts its new size only
+    cache.put("b", 2, size=60)
+    assert cache.stats()["bytes"] == 100
+    assert cache.get("c") == 3
+
+
+def test_oversized_value_is_not_cached():
+    """ a value over the byte limit on its own neither is cached nor evicts others """
+    cache = LRUCache(max_entries=10, max_bytes=100)
+    cache.put("a", 1, size=40)
+    cache.put("b", 2, size=101)
+    assert (cache.get("a"), cache.get("b")) == (1, None)
+    assert cache.stats()["bytes"] == 40
+
+
+def test_entries_expire_after_their_ttl(clock):
+    """ an entry older than the time to live is a miss and frees its size """
+    cache = LRUCache(max_entries=10, ttl=60)
+    cache.put("a", 1, size=10)
+    clock[0] += 60
+    assert cache.get("a") == 1
+    clock[0] += 1
+    assert cache.get("a") is None
+    assert cache.stats()["bytes"] == 0
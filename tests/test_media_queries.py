@@ -0,0 +1,26 @@
+"""
+Tests of the evaluation of @supports conditions.
+"""
+import pytest
+from services.media_queries import matches_supports
+
+CONDITIONS = {
+    "(display: grid)": True,
+    "not (display: grid)": False,
+    "NOT (display: grid)": False,
+    "(display: grid) and (not (gap: 1rem))": False,
+    "(display: grid) or (not (gap: 1rem))": True,
+    "((display: grid) or (display: flex)) and (color: red)": True,
+    "selector(:has(> img))": True,
+    "selector(:unknown-pseudo)": False,
+    "font-tech(color-colrv1)": False,
+    "not font-format(woff2)": True,
+    "(display)": False,
+    "": False,
+}
+
+
+@pytest.mark.parametrize("condition, holds", CONDITIONS.items(), ids=CONDITIONS.keys())
+def test_supports_conditions(condition, holds):
+    """ declarations and matchable selectors are supported, other functions are not """
+    assert matches_supports(condition) == holds
@@ -0,0 +1,98 @@
+"""
+Tests of the limits of scan requests: the element and byte limits of the
+scan input, and the decompression of request bodies.
+"""
+import gzip
+import zlib
+import pytest
+from werkzeug.test import Client
+from app import app
+from utils import request_limits
+from utils.request_limits import InputTooLarge, check_scan_input, decompress_middleware
+
+PAGE = "<html><body>" + "<p>Text</p>" * 5000 + "</body></html>"
+CSS = "p { color: #000 }"
+
+
+@pytest.fixture(name="element_limit")
+def fixture_element_limit(monkeypatch):
+    """ a limit of 50 elements, far below the page, and no reports to the backend """
+    monkeypatch.setattr(request_limits, "MAX_ELEMENTS", 50)
+    monkeypatch.setattr(request_limits, "OVER_LIMIT_MODE", "reject")
+    monkeypatch.setattr("app.report_scan", lambda *args: None)
+
+
+def scan(**options):
+    """ the response to a scan of the page """
+    return app.test_client().post("/api/scan-all", json={"dom": PAGE, "css": CSS, **options})
+
+
+@pytest.mark.usefixtures("element_limit")
+def test_budget_over_the_page_is_within_the_limit():
+    """ a budget over the whole page only parses the elements it reaches """
+    response = scan(max_elements=50)
+    assert response.status_code == 200
+    assert response.get_json()["coverage"]["scanned_elements"] == 50
+
+
+@pytest.mark.parametrize("region", [{"root": "body"}, {"subtrees": ["html > body"]}],
+                         ids=["root", "subtrees"])
+@pytest.mark.usefixtures("element_limit")
+def test_budget_of_a_region_is_over_the_limit(region):
+    """ a region scan parses the whole page, so its budget does not exempt it """
+    response = scan(max_elements=50, **region)
+    assert response.status_code == 413
+    assert response.get_json()["limit"] == 50
+
+
+@pytest.mark.parametrize("limit", ["MAX_DOM_BYTES", "MAX_CSS_BYTES"])
+def test_byte_limits_count_utf8_bytes(monkeypatch, limit):
+    """ text within the limit in characters but over it in UTF-8 bytes is rejected """
+    monkeypatch.setattr(request_limits, limit, 100)
+    text = "<p>" + "é" * 60 + "</p>"
+    html, css = (text, "") if limit == "MAX_DOM_BYTES" else ("", text)
+    with pytest.raises(InputTooLarge):
+        check_scan_input(html, css)
+    check_scan_input(html[:50], css[:50])
+
+
+def echo(environ, start_response):
+    """ a WSGI application answering with the request body it read """
+    body = environ["wsgi.input"].read(int(environ.get("CONTENT_LENGTH") or 0))
+    start_response("200 OK", [("Content-Type", "text/plain")])
+    return [body]
+
+
+BODY = b'{"dom": "<p>text</p>"}' * 100
+ENCODINGS = {
+    "gzip": gzip.compress(BODY),
+    "deflate": zlib.compress(BODY),
+    "raw deflate": zlib.compress(BODY, wbits=-zlib.MAX_WBITS),
+}
+
+
+@pytest.mark.parametrize("encoding, data", ENCODINGS.items(), ids=ENCODINGS.keys())
+def test_compressed_bodies_are_decoded(encoding, data):
+    """ gzip and zlib-wrapped or raw deflate bodies reach the application decoded """
+    client = Client(decompress_middleware(echo))
+    response = client.post("/", data=data,
+                           headers={"Content-Encoding": encoding.replace("raw ", "")})
+    assert response.status_code == 200
+    assert response.data == BODY
+
+
+def test_decompressed_size_is_capped():
+    """ a body over the decompressed size limit gets a 413 with the limit """
+    client = Client(decompress_middleware(echo, max_bytes=len(BODY) - 1))
+    response = client.post("/", data=ENCODINGS["gzip"], headers={"Content-Encoding": "gzip"})
+    assert response.status_code == 413
+    assert response.json["limit"] == len(BODY) - 1
+
+
+@pytest.mark.parametrize("encoding, data", [("compress", BODY), ("gzip", b"not gzip")],
+                         ids=["unsupported", "corrupt"])
+def test_undecodable_bodies_are_rejected(encoding, data):
+    """ unsupported encodings and corrupt bodies get a 415 """
+    client = Client(decompress_middleware(echo))
+    response = client.post("/", data=data, headers={"Content-Encoding": encoding})
+    assert response.status_code == 415
@@ -0,0 +1,35 @@
+"""
+Tests of the ruleset version in the keys of cached results.
+"""
+import re
+import pytest
+from scanners import scan_jobs
+from services import css_parser, html_parser, selector_index, style_resolver
+from services.result_cache import ruleset_version
+from utils import contrast_utils, lengths
+
+
+@pytest.mark.parametrize("module, setting, other", [
+    (css_parser, "CSS_PARSER_BACKEND", "fast"),
+    (html_parser, "HTML_PARSER_BACKEND", "lxml"),
+], ids=["css", "html"])
+def test_parser_backend_changes_the_version(monkeypatch, module, setting, other):
+    """ results parsed by another backend are not reused """
+    version = ruleset_version(module)
+    monkeypatch.setattr(module, setting, other)
+    assert ruleset_version(module) != version
+
+
+@pytest.mark.parametrize("module, constant, other", [
+    (style_resolver, "INHERITED_PROPERTIES", frozenset(["color"])),
+    (selector_index, "ROOT_SELECTORS", frozenset([":root"])),
+    (lengths, "NORMAL_LINE_HEIGHT", 1.2),
+    (contrast_utils, "WHITE", (250, 250, 250)),
+    (contrast_utils, "HEX_COLOR", re.compile(r"^#([0-9a-fA-F]{6})$")),
+], ids=["style resolver", "selector index", "lengths", "contrast", "regex"])
+def test_cascade_constant_changes_the_version(monkeypatch, module, constant, other):
+    """ the constants of the cascade and of the value parsing are part of the stamp """
+    assert module in scan_jobs.RULESET_MODULES
+    version = ruleset_version(*scan_jobs.RULESET_MODULES)
+    monkeypatch.setattr(module, constant, other)
+    assert ruleset_version(*scan_jobs.RULESET_MODULES) != version
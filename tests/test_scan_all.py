@@ -0,0 +1,62 @@
+"""
+Tests of the endpoint running every scanner over a single parse of the page.
+"""
+import pytest
+from app import app
+from scanners import scan_all
+
+PAGE = """
+<html><body><main>
+  <h1>Title</h1>
+  <p class="faint">Faint text</p>
+  <p class="small tight">Small text with tight lines</p>
+  <img src="a.png" alt="An image"><img src="b.png">
+</main></body></html>
+"""
+CSS = """
+body { color: #222; background-color: #fff; font-size: 16px }
+.faint { color: #bbb }
+.small { font-size: 10px }
+.tight { line-height: 1 }
+"""
+ENDPOINTS = {
+    "color-contrast": "/api/scan-contrasting-colors",
+    "large-text": "/api/scan-large-text",
+    "line-spacing": "/api/scan-line-spacing",
+    "alt-text": "/api/scan-images",
+}
+
+
+@pytest.fixture(name="reports")
+def fixture_reports(monkeypatch):
+    """ the (score, selection) pairs the scans report to the backend """
+    reports = []
+    monkeypatch.setattr("app.report_scan",
+                        lambda data, scope, score, selection: reports.append((score, selection)))
+    return reports
+
+
+def test_scan_all_matches_the_individual_endpoints(reports):
+    """ each scanner's result is the response of its own endpoint """
+    client = app.test_client()
+    response = client.post("/api/scan-all", json={"dom": PAGE, "css": CSS}).get_json()
+    assert set(response) == set(ENDPOINTS)
+    for selection, endpoint in ENDPOINTS.items():
+        assert response[selection] == client.post(endpoint, json={"dom": PAGE, "css": CSS}
+                                                  ).get_json()
+    assert sorted(reports[:len(ENDPOINTS)]) \
+        == sorted((result["score"], selection) for selection, result in response.items())
+    assert all(result["score"] < 100 for result in response.values())
+
+
+def test_scan_all_parses_the_page_once(reports, monkeypatch):
+    """ the scanners share a single parse of the HTML """
+    calls = []
+    parse_html = scan_all.parse_html
+    monkeypatch.setattr(scan_all, "parse_html", lambda html: calls.append(html) or parse_html(html))
+    # A page not scanned before, so that the result cache does not answer
+    page = PAGE.replace("Title", "Another title")
+    response = app.test_client().post("/api/scan-all", json={"dom": page, "css": CSS})
+    assert response.status_code == 200
+    assert len(calls) == 1
+    assert len(reports) == len(ENDPOINTS)
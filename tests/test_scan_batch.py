@@ -0,0 +1,70 @@
+"""
+Tests of the batch scan endpoint.
+"""
+import json
+import time
+import pytest
+from app import app
+from scanners import batch_scan, scan_jobs
+from scanners.batch_scan import page_record, scan_records_on_pool
+from services.worker_pool import worker_pool
+
+PAGE = {"id": "home", "dom": "<html><body><p>Text</p></body></html>", "css": "p { color: #000 }"}
+
+
+@pytest.mark.parametrize("pages", [{"id": "home"}, ["x"], [PAGE, None], [{"dom": 1}]],
+                         ids=["object", "string", "null", "dom number"])
+def test_malformed_pages_are_rejected(pages):
+    """ pages that are not a list of page records get a 400, not a 500 """
+    response = app.test_client().post("/api/scan-batch", json={"pages": pages})
+    assert response.status_code == 400
+
+
+def test_rows_are_matched_by_id():
+    """ every page gets a row with its id """
+    pages = [PAGE, {**PAGE, "id": "about"}]
+    response = app.test_client().post("/api/scan-batch", json={"pages": pages})
+    rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert response.status_code == 200
+    assert sorted(row["id"] for row in rows) == ["about", "home"]
+    assert all(row["scores"]["color-contrast"] == 100.0 for row in rows)
+
+
+def test_busy_pool_rejects_the_batch(monkeypatch):
+    """ a batch the pool cannot take gets a 503 instead of error rows """
+    monkeypatch.setattr(worker_pool, "max_pending_bytes", 10)
+    monkeypatch.setattr(worker_pool, "_pending_bytes", 5)
+    response = app.test_client().post("/api/scan-batch", json={"pages": [PAGE]})
+    assert response.status_code == 503
+
+
+def test_pages_wait_for_the_pool(monkeypatch):
+    """ pages over the pool's pending limit wait for each other instead of failing """
+    monkeypatch.setattr(worker_pool, "max_pending_bytes", 1)
+    # Slow scans, so the pages overlap
+    scan_job = scan_jobs.scan_job
+    monkeypatch.setattr(scan_jobs, "scan_job",
+                        lambda *args: time.sleep(0.05) or scan_job(*args))
+    # Distinct pages, so none is answered from the result cache
+    records = [page_record(str(number), PAGE["dom"] + f"<!-- {number} -->", PAGE["css"])
+               for number in range(6)]
+    rows = list(scan_records_on_pool(records, 3))
+    assert sorted(row["id"] for row in rows) == [str(number) for number in range(6)]
+    assert not any("error" in row for row in rows)
+
+
+def test_closing_cancels_pending_pages(monkeypatch):
+    """ pages not started when the stream is closed are never scanned """
+    started = []
+
+    def slow_scan(*_args, **_kwargs):
+        started.append(True)
+        time.sleep(0.05)
+        raise RuntimeError("not scanned")
+
+    monkeypatch.setattr(batch_scan, "run_scan", slow_scan)
+    rows = scan_records_on_pool([page_record(str(number), PAGE["dom"]) for number in range(20)], 1)
+    next(rows)
+    rows.close()
+    time.sleep(0.2)
+    assert len(started) < 5
@@ -0,0 +1,110 @@
+"""
+Tests of incremental scan sessions: after each change, the results must be
+those of a full scan of the changed page.
+"""
+import pytest
+from app import app
+from scanners import scan_session
+from scanners.scan_all import IMAGE_SCANNER, score_all
+from scanners.scan_session import ScanSession
+
+# Only the positions of the paragraphs decide which of them are unreadable
+PAGE = """
+<html><body><div id="list">
+  <p>First</p>
+  <p>Second</p>
+  <p>Third</p>
+</div></body></html>
+"""
+CSS = """
+p { color: #000 }
+p:first-child { color: #eee }
+p:last-child { color: #eee }
+p:nth-child(2) { color: #000 }
+h2 + p { color: #eee }
+.marker ~ p { color: #ddd }
+"""
+LIST = "html > body > div"
+CHANGES = {
+    "remove the first paragraph": [{"op": "remove", "target": f"{LIST} > p"}],
+    "remove the last paragraph": [{"op": "remove", "target": f"{LIST} > p:nth-of-type(3)"}],
+    "add a first paragraph": [{"op": "add", "parent": LIST, "index": 0, "html": "<p>New</p>"}],
+    "add a last paragraph": [{"op": "add", "parent": LIST, "html": "<p>New</p>"}],
+    "add a heading": [{"op": "add", "parent": LIST, "index": 1, "html": "<h2>Title</h2>"}],
+    "replace a paragraph": [{"op": "modify", "target": f"{LIST} > p:nth-of-type(2)",
+                             "html": "<h2>Title</h2>"}],
+    "mark a paragraph": [{"op": "modify", "target": f"{LIST} > p",
+                          "attributes": {"class": "marker"}}],
+}
+
+
+def summary(results):
+    """ the scores of some results and the node indexes of their findings """
+    return {name: (result[0], [finding.node_index for finding in result[1]])
+            for name, result in results.items() if name != IMAGE_SCANNER}
+
+
+@pytest.mark.parametrize("changes", CHANGES.values(), ids=CHANGES.keys())
+def test_session_matches_a_full_scan(changes):
+    """ sibling selectors are matched again on the siblings of a changed element """
+    session = ScanSession(PAGE, CSS)
+    session.apply(changes)
+    assert summary(session.results()) == summary(score_all(str(session.soup), CSS))
+
+
+@pytest.mark.parametrize("changes", CHANGES.values(), ids=CHANGES.keys())
+def test_session_size_is_the_stored_content(changes):
+    """ the session size follows the stored document as changes add and remove content """
+    session = ScanSession(PAGE, CSS)
+    session.apply(changes)
+    session.set_css("p { color: #000 }")
+    assert session.size == len(str(session.soup)) + len("p { color: #000 }")
+
+
+MALFORMED = {
+    "changes not a list": "x",
+    "change not an object": [1],
+    "unknown op": [{"op": ["add"], "parent": LIST}],
+    "index not an int": [{"op": "add", "parent": LIST, "index": "0", "html": "<p>New</p>"}],
+    "html not a string": [{"op": "add", "parent": LIST, "html": 1}],
+    "missing target": [{"op": "remove"}],
+    "attribute not a string": [{"op": "modify", "target": f"{LIST} > p",
+                                "attributes": {"class": 1}}],
+    "modify without content": [{"op": "modify", "target": f"{LIST} > p"}],
+}
+
+
+@pytest.fixture(name="client")
+def fixture_client(monkeypatch):
+    """ a test client whose scores are not reported to the backend """
+    monkeypatch.setattr("app.report_score", lambda *args: None)
+    monkeypatch.setattr("app.report_selection", lambda *args: None)
+    return app.test_client()
+
+
+def start(client):
+    """ the token of a new session of the page """
+    return client.post("/api/scan-session", json={"dom": PAGE, "css": CSS}).get_json()["session"]
+
+
+@pytest.mark.parametrize("changes", MALFORMED.values(), ids=MALFORMED.keys())
+def test_malformed_changes_are_rejected(client, changes):
+    """ malformed changes get a 400 and leave the session as it was """
+    token = start(client)
+    response = client.post(f"/api/scan-session/{token}",
+                           json={"changes": [*CHANGES["add a heading"], *changes]
+                                 if isinstance(changes, list) else changes})
+    assert response.status_code == 400
+    assert "<h2>" not in str(scan_session.sessions.get(token).soup)
+
+
+def test_oversized_update_keeps_the_session(client, monkeypatch):
+    """ an update that could bring a session over its size limit gets a 413 """
+    token = start(client)
+    monkeypatch.setattr(scan_session, "SCAN_SESSION_MAX_BYTES", 1000)
+    response = client.post(f"/api/scan-session/{token}", json={"changes": [
+        {"op": "add", "parent": LIST, "html": "<p>New</p>" * 100}
+    ]})
+    assert response.status_code == 413
+    response = client.post(f"/api/scan-session/{token}", json={"changes": CHANGES["add a heading"]})
+    assert response.status_code == 200
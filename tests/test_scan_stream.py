@@ -0,0 +1,70 @@
+"""
+Tests of the endpoint streaming scan findings as newline-delimited JSON.
+"""
+import json
+import pytest
+from app import app
+from scanners.scan_all import stream_all
+
+PAGE = """
+<html><body><main>
+  <p class="faint">Faint text</p>
+  <p class="small">Small text</p>
+  <p>Readable text</p>
+  <img src="a.png">
+</main></body></html>
+"""
+CSS = """
+body { color: #222; background-color: #fff; font-size: 16px; line-height: 1.6 }
+.faint { color: #ccc }
+.small { font-size: 9px }
+"""
+
+
+@pytest.fixture(name="client")
+def fixture_client(monkeypatch):
+    """ a test client whose scores are not reported to the backend """
+    monkeypatch.setattr("app.report_scan", lambda *args: None)
+    return app.test_client()
+
+
+def stream(client, **fields):
+    """ the status and records of a streamed scan of the page """
+    response = client.post("/api/scan-stream", json={"dom": PAGE, "css": CSS, **fields})
+    return response.status_code, [json.loads(line)
+                                  for line in response.get_data(as_text=True).splitlines()]
+
+
+def test_stream_matches_scan_all(client):
+    """ the findings and the final summary hold the results of /api/scan-all """
+    status, records = stream(client)
+    assert status == 200
+    *findings, summary = records
+    assert {record["type"] for record in findings} == {"finding"}
+    assert summary["type"] == "summary"
+
+    results = client.post("/api/scan-all", json={"dom": PAGE, "css": CSS}).get_json()
+    for selection, result in summary["results"].items():
+        assert result["score"] == results[selection]["score"]
+        if selection != "alt-text":
+            elements = [record["element"] for record in findings
+                        if record["scanner"] == selection]
+            assert elements == results[selection]["inaccessible_elements"]
+            assert result["inaccessible_count"] == len(elements)
+
+
+def test_stream_is_limited_to_the_selected_scanners(client):
+    """ only the selected scanners run, and unknown names get a 400 """
+    _, records = stream(client, scanners=["large-text"])
+    assert {record["scanner"] for record in records[:-1]} == {"large-text"}
+    assert list(records[-1]["results"]) == ["large-text"]
+    response = client.post("/api/scan-stream", json={"dom": PAGE, "css": CSS,
+                                                     "scanners": ["large-text", "unknown"]})
+    assert response.status_code == 400
+
+
+def test_findings_are_yielded_during_the_walk():
+    """ the first finding comes before the rest of the document is scanned """
+    events = stream_all(PAGE, CSS, ["color-contrast"])
+    assert next(events)[:2] == ("finding", "color-contrast")
+    assert [event[0] for event in events] == ["summary"]
@@ -0,0 +1,35 @@
+"""
+Tests of the selector index: bucketing, simple rules and the cascade order.
+"""
+from bs4 import BeautifulSoup
+from scanners.scan_all import score_all
+from services.selector_index import SelectorIndex, compile_rule
+
+PAGE = "<html><body><p>Some body text</p><p>More body text</p></body></html>"
+
+
+def test_only_bare_tags_classes_and_ids_are_simple():
+    """ lone tags, classes and ids skip the full match, other selectors don't """
+    for selector in ("p", ".note", "#main", "*"):
+        assert compile_rule(selector, 0, {"color": "red"})[1].is_simple
+    for selector in (":root", "[type=text]", ":hover", ":first-child", "p.note", "div p"):
+        assert not compile_rule(selector, 0, {"color": "red"})[1].is_simple
+
+
+def test_attribute_and_pseudo_class_selectors_match_only_their_elements():
+    """ attribute-only and pseudo-class-only rules don't apply to every element """
+    soup = BeautifulSoup('<div><input type="text"><p>text</p></div>', "html.parser")
+    index = SelectorIndex({
+        "[type=text]": {"color": "red"},
+        ":first-child": {"font-weight": "bold"},
+        ":hover": {"color": "blue"},
+    })
+    assert not index.matched_style(soup.p)
+    assert index.matched_style(soup.input) == {"color": "red", "font-weight": "bold"}
+
+
+def test_root_font_size_applies_to_the_root_only():
+    """ a :root font size is not compounded at every level of the page """
+    root = score_all(PAGE, ":root{font-size:62.5%} body{font-size:1.6rem}", ["large-text"])
+    html = score_all(PAGE, "html{font-size:62.5%} body{font-size:1.6rem}", ["large-text"])
+    assert root["large-text"][0] == html["large-text"][0] == 100.0
@@ -0,0 +1,93 @@
+"""
+Tests of the top-down resolution of computed styles and backgrounds.
+"""
+import pytest
+from scanners.color_contrast_scanner import score_text_contrast
+from services.css_parser import parse_css
+from services.html_parser import parse_html
+from services.style_resolver import StyleResolver
+
+PAGE = """
+<html><body>
+  <div class="outer" style="line-height: 2">
+    <section class="inner"><p id="text">Text</p><p>Other</p></section>
+  </div>
+</body></html>
+"""
+CSS = """
+body { color: #111; margin: 0 }
+.outer { font-size: 2em; background-color: #eee; color: #222 }
+.inner { font-size: 1.5em }
+p { font-size: 50% }
+"""
+
+
+def resolver_and_page():
+    """ a resolver of the stylesheet and the parsed page """
+    return StyleResolver(parse_css(CSS, "fast")), parse_html(PAGE)
+
+
+def test_inherited_properties_pass_down():
+    """ inherited properties come from the nearest ancestor declaring them, others do not """
+    resolver, soup = resolver_and_page()
+    style = resolver.computed_style(soup.find(id="text"))
+    assert style["color"] == "#222"
+    assert style["line-height"] == "2"
+    assert "margin" not in style
+    assert "background-color" not in style
+
+
+def test_relative_lengths_chain_from_the_parent():
+    """ em and % font sizes build on the parent's, a plain line-height scales the own size """
+    resolver, soup = resolver_and_page()
+    paragraph = soup.find(id="text")
+    assert resolver.font_size(paragraph) == 16 * 2 * 1.5 * 0.5
+    assert resolver.line_height(paragraph) == 2 * 24
+
+
+def test_styles_are_memoized(monkeypatch):
+    """ each element is resolved once, however many descendants read its style """
+    resolver, soup = resolver_and_page()
+    resolved = []
+    matched_style = resolver.matched_style
+    monkeypatch.setattr(resolver, "matched_style",
+                        lambda element, mask=None: resolved.append(element.name)
+                        or matched_style(element, mask))
+    first, second = soup.find_all("p")
+    style = resolver.computed_style(first)
+    resolver.computed_style(second)
+    assert resolver.computed_style(first) is style
+    assert sorted(resolved) == ["body", "div", "html", "p", "p", "section"]
+
+
+BACKGROUNDS = {
+    "own background": ('<div style="background-color: #123456"><p>Text</p></div>', "",
+                       (0x12, 0x34, 0x56)),
+    "inherited from an ancestor": ("<div><section><p>Text</p></section></div>",
+                                   "div { background-color: #000 }", (0, 0, 0)),
+    "translucent over the parent's": (
+        '<div style="background-color: #000">'
+        '<p style="background-color: rgba(255, 255, 255, 0.5)">Text</p></div>', "",
+        (128, 128, 128)),
+    "shorthand color": ("<div><p>Text</p></div>", "div { background: #111 url(a.png) no-repeat }",
+                        (17, 17, 17)),
+    "shorthand without a color": (
+        "<div><p>Text</p></div>",
+        "body { background: #222 } div { background: linear-gradient(#fff, #000) }",
+        (34, 34, 34)),
+}
+
+
+@pytest.mark.parametrize("page, css, background", BACKGROUNDS.values(), ids=BACKGROUNDS.keys())
+def test_backgrounds_are_resolved_top_down(page, css, background):
+    """ each element's background blends over its ancestors', from either property """
+    element = parse_html(f"<html><body>{page}</body></html>").find("p")
+    assert StyleResolver(parse_css(css, "fast")).background(element) == background
+
+
+def test_light_text_on_a_dark_shorthand_background():
+    """ the contrast scanner reads the background the resolver blended down """
+    page = '<html><body><main><p style="color: #eee">Light text</p></main></body></html>'
+    css = "main { background: #111 }"
+    assert score_text_contrast(page, css)[0] == 100.0
+    assert score_text_contrast(page, "")[0] == 0.0
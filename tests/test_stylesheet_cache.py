@@ -0,0 +1,23 @@
+"""
+Tests of the cache of parsed stylesheets.
+"""
+from services import stylesheet_cache
+from services.media_queries import ViewportProfile
+from services.stylesheet_cache import load_stylesheet
+
+CSS = "p { color: #000 } @media (max-width: 600px) { p { color: #777 } }"
+
+
+def test_stylesheet_is_parsed_once_per_viewport(monkeypatch):
+    """ repeat loads of the same content reuse its index, another viewport gets its own """
+    parses = []
+    parse_css = stylesheet_cache.parse_css
+    monkeypatch.setattr(stylesheet_cache, "parse_css", lambda css, viewport:
+                        parses.append(viewport) or parse_css(css, viewport=viewport))
+    css = CSS + " /* not loaded by other tests */"
+    index = load_stylesheet(css)
+    assert load_stylesheet(css) is index
+    phone = ViewportProfile(375, 812, "light")
+    assert load_stylesheet(css, phone) is not index
+    assert load_stylesheet(css, phone) is load_stylesheet(css, phone)
+    assert len(parses) == 2
@@ -0,0 +1,40 @@
+"""
+Tests of the stage timing of scans.
+"""
+from scanners.color_contrast_scanner import score_text_contrast
+from scanners.line_spacing import score_line_spacing
+from scanners.scan_all import score_all
+from scanners.text_scanner import score_text_accessibility
+from utils.timing import finish_request_timing, stage_timer, start_request_timing
+
+PAGE = "<html><body><p>Text</p><p>More text</p></body></html>"
+CSS = "p { color: #000 }"
+
+
+def evaluated_stages(scan):
+    """ the evaluate stages timed while running a scan """
+    start_request_timing()
+    scan(PAGE, CSS)
+    timings = finish_request_timing()
+    return {name for name in timings.stages if name.startswith("evaluate:")}
+
+
+def test_scanners_label_their_stage_by_selection_name():
+    """ the per-scanner endpoints and scan-all time the same stages """
+    stages = set()
+    for scan in (score_text_contrast, score_text_accessibility, score_line_spacing):
+        stages |= evaluated_stages(scan)
+    assert stages == {"evaluate:color-contrast", "evaluate:large-text", "evaluate:line-spacing"}
+    assert evaluated_stages(score_all) == stages
+
+
+def test_timers_are_reusable():
+    """ a timer entered several times adds up every stay """
+    timings = start_request_timing()
+    timer = stage_timer("stage")
+    for _ in range(3):
+        with timer:
+            pass
+    finish_request_timing()
+    assert list(timings.stages) == ["stage"]
+    assert timings.stages["stage"] > 0
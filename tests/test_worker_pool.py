@@ -0,0 +1,47 @@
+"""
+Tests of the pool of worker processes the scans run in.
+"""
+import os
+import time
+import pytest
+from scanners.scan_jobs import ALL_SCANNERS, scan_job
+from services.worker_pool import ScanRejected, ScanTimeout, WorkerPool
+
+PAGE = '<html><body><p style="color: #ccc">Faint</p><img src="a.png"></body></html>'
+CSS = "body { background-color: #fff }"
+
+
+@pytest.fixture(name="pool")
+def fixture_pool():
+    """ a pool of one worker process with a short timeout, stopped after the test """
+    pool = WorkerPool(workers=1, timeout=1)
+    yield pool
+    pool.shutdown()
+
+
+def test_jobs_run_in_a_worker_process(pool):
+    """ a scan job gives the same results in a worker as in the serving thread """
+    assert pool.run(os.getpid) != os.getpid()
+    assert pool.run(scan_job, ALL_SCANNERS, PAGE, CSS) \
+        == WorkerPool(workers=0).run(scan_job, ALL_SCANNERS, PAGE, CSS)
+    assert pool.counters["completed"] == 2
+
+
+def test_long_job_times_out(pool):
+    """ a job running past the timeout is interrupted and the worker stays usable """
+    with pytest.raises(ScanTimeout):
+        pool.run(time.sleep, 5)
+    assert pool.counters["timed_out"] == 1
+    assert pool.run(os.getpid) != os.getpid()
+
+
+def test_admission_by_pending_input_size(monkeypatch):
+    """ a job is rejected while the running jobs hold too much input, unless none run """
+    pool = WorkerPool(workers=0, max_pending_bytes=10)
+    assert pool.run(len, "large input", size=100) == 11
+    monkeypatch.setattr(pool, "_pending_bytes", 5)
+    assert pool.admits(5) and not pool.admits(6)
+    with pytest.raises(ScanRejected):
+        pool.run(len, "", size=6)
+    assert pool.counters["rejected"] == 1
+    assert pool.admits(5)
@@ -4,21 +4,32 @@ updates a users score history
 from urllib.parse import urlencode
 import requests
 from utils.backend_request import post_backend
+from utils.debug import get_logger
 
+logger = get_logger(__name__)
 
-def append_score(secret, score, href, selection):
-    """ add score to user's score history """
+
+def score_endpoint(secret, score, href, selection):
+    """ backend endpoint that adds a score to a user's score history """
     # save calls to backend and db
     if secret == "":
-        print("no secret")
-        return
+        logger.debug("no secret")
+        return None
 
     href = urlencode({"href": href})
-    endpoint =f"/api/append?score={int(score)}&secret={secret}&{href}&selection={selection}"
+    return f"/api/append?score={int(score)}&secret={secret}&{href}&selection={selection}"
+
+
+def append_score(secret, score, href, selection):
+    """ add score to user's score history """
+    endpoint = score_endpoint(secret, score, href, selection)
+    if endpoint is None:
+        return
+
     try:
-        print("posting to backkedn")
+        logger.debug("posting to backend")
         post_backend(endpoint)
     except requests.exceptions.ConnectionError:
-        print("error appending score. ensure the backend is running")
+        logger.warning("error appending score. ensure the backend is running")
     except requests.exceptions.RequestException as e:
-        print(f"An error occurred when appending score: {e}")
+        logger.error("An error occurred when appending score: %s", e)
@@ -3,18 +3,27 @@ updates a users score history
 """
 import requests
 from utils.backend_request import post_backend
+from utils.debug import get_logger
 
-def log_selection(name:str):
-    """ log accessibility selection in backend """
+logger = get_logger(__name__)
+
+def selection_endpoint(name: str):
+    """ backend endpoint that logs an accessibility selection """
     # save calls to backend and db
     if name == "":
-        return
+        return None
     # get secret to keep between backend and scanner
-    endpoint =f"/api/accessibility-selection?&selection={name}"
-    print("endpoint: ", endpoint)
+    return f"/api/accessibility-selection?&selection={name}"
+
+def log_selection(name:str):
+    """ log accessibility selection in backend """
+    endpoint = selection_endpoint(name)
+    if endpoint is None:
+        return
+    logger.debug("endpoint: %s", endpoint)
     try:
         post_backend(endpoint)
     except requests.exceptions.ConnectionError:
-        print("error logging selection. ensure the backend is running")
+        logger.warning("error logging selection. ensure the backend is running")
     except requests.exceptions.RequestException as e:
-        print(f"An error occurred when logging selection: {e}")
+        logger.error("An error occurred when logging selection: %s", e)
@@ -0,0 +1,130 @@
+"""
+Reports scores and accessibility selections to the backend from an event loop,
+for the ASGI server. It queues and batches events like the thread-based
+`BackendReporter`, with the same settings, but sends each batch concurrently
+over a pooled httpx client, so no thread waits on the backend.
+"""
+import asyncio
+import time
+import httpx
+from utils.backend_reporter import BATCH_SIZE, DRAIN_TIMEOUT, MAX_RETRIES, QUEUE_SIZE, \
+    RETRY_BACKOFF
+from utils.backend_request import TIMEOUT, backend_url
+from utils.debug import get_logger
+from utils.timing import BACKEND_REPORT_SECONDS
+
+_STOP = object()
+
+logger = get_logger(__name__)
+
+
+class AsyncBackendReporter:
+    """
+    Event loop queue of backend endpoints to post to. Events can be submitted
+    from any thread, such as the threads the scans run in.
+    """
+
+    def __init__(self, queue_size=QUEUE_SIZE, batch_size=BATCH_SIZE):
+        """
+        Args:
+            queue_size (int): The maximum number of events waiting to be sent.
+            batch_size (int): The maximum number of events sent per batch.
+        """
+        self.batch_size = batch_size
+        self.counters = {"sent": 0, "failed": 0, "dropped": 0}
+        self._queue = asyncio.Queue(maxsize=queue_size)
+        self._loop = None
+        self._client = None
+        self._task = None
+
+    async def start(self):
+        """
+        Starts sending events from the running event loop.
+        """
+        self._loop = asyncio.get_running_loop()
+        self._client = httpx.AsyncClient(
+            timeout=TIMEOUT, limits=httpx.Limits(max_connections=self.batch_size)
+        )
+        self._task = asyncio.create_task(self._run())
+
+    def submit(self, endpoint):
+        """
+        Queues an endpoint to post to without waiting for it to be sent.
+        Events arriving while the queue is full are dropped once they reach
+        the event loop, so the caller is never blocked.
+        """
+        if endpoint is None:
+            return True
+        if self._loop is None:
+            self.counters["dropped"] += 1
+            logger.warning("backend reporter is not started, dropping event")
+            return False
+        self._loop.call_soon_threadsafe(self._enqueue, endpoint)
+        return True
+
+    async def shutdown(self, timeout=DRAIN_TIMEOUT):
+        """
+        Sends the queued events and stops sending, waiting at most `timeout`
+        seconds in total.
+        """
+        if self._task is None:
+            return
+        deadline = time.monotonic() + timeout
+        try:
+            await asyncio.wait_for(self._queue.put(_STOP), timeout)
+            await asyncio.wait_for(asyncio.shield(self._task),
+                                   max(deadline - time.monotonic(), 0))
+        except asyncio.TimeoutError:
+            self._task.cancel()
+        await self._client.aclose()
+        self._task = None
+
+    def _enqueue(self, endpoint):
+        """
+        Puts an event in the queue from the event loop, or drops it when full.
+        """
+        try:
+            self._queue.put_nowait(endpoint)
+        except asyncio.QueueFull:
+            self.counters["dropped"] += 1
+            logger.warning("backend report queue is full, dropping event")
+
+    async def _run(self):
+        """
+        Sends queued events in batches until stopped.
+        """
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+
+            stop = _STOP in batch
+            await asyncio.gather(*(self._send(endpoint) for endpoint in batch
+                                   if endpoint is not _STOP))
+            if stop:
+                return
+
+    async def _send(self, endpoint):
+        """
+        Posts an endpoint, retrying connection errors, timeouts and
+        server errors with exponential backoff.
+        """
+        for attempt in range(MAX_RETRIES + 1):
+            start = time.perf_counter()
+            try:
+                response = await self._client.post(backend_url(endpoint))
+                if response.status_code < 500:
+                    self.counters["sent"] += 1
+                    return
+            except (httpx.TransportError, httpx.TimeoutException):
+                pass
+            except httpx.HTTPError as e:
+                logger.error("An error occurred when reporting to the backend: %s", e)
+                break
+            finally:
+                BACKEND_REPORT_SECONDS.observe(time.perf_counter() - start)
+            if attempt < MAX_RETRIES:
+                await asyncio.sleep(RETRY_BACKOFF * 2 ** attempt)
+
+        self.counters["failed"] += 1
+        logger.warning("error reporting to backend. ensure the backend is running")
@@ -0,0 +1,169 @@
+"""
+Reports scores and accessibility selections to the backend from a background
+thread, so scan responses don't wait on the backend's round trip.
+
+Events are put in a bounded queue, and one long-lived sender thread takes them
+off it in batches and posts them over the keep-alive connection of its session,
+retrying with exponential backoff. Events arriving while the queue is full are
+dropped. When the process exits, the queue is drained for at most DRAIN_TIMEOUT
+seconds in total.
+"""
+import atexit
+import queue
+import threading
+import time
+import requests
+from utils.append_score import score_endpoint
+from utils.append_selection import selection_endpoint
+from utils.backend_request import post_backend
+from utils.debug import get_logger
+from utils.settings import env_float, env_int
+
+QUEUE_SIZE = env_int("BACKEND_REPORTER_QUEUE_SIZE", 1000)
+BATCH_SIZE = env_int("BACKEND_REPORTER_BATCH_SIZE", 20)
+MAX_RETRIES = env_int("BACKEND_REPORTER_MAX_RETRIES", 3)
+RETRY_BACKOFF = env_float("BACKEND_REPORTER_BACKOFF", 0.5)
+DRAIN_TIMEOUT = env_float("BACKEND_REPORTER_DRAIN_TIMEOUT", 5)
+
+_STOP = object()
+
+logger = get_logger(__name__)
+
+
+class BackendReporter:
+    """
+    Background queue of backend endpoints to post to.
+    """
+
+    def __init__(self, queue_size=QUEUE_SIZE, batch_size=BATCH_SIZE):
+        """
+        Args:
+            queue_size (int): The maximum number of events waiting to be sent.
+            batch_size (int): The maximum number of events taken off the queue at once.
+        """
+        self.batch_size = batch_size
+        self.counters = {"sent": 0, "failed": 0, "dropped": 0}
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._session = requests.Session()
+        self._thread = None
+        self._lock = threading.Lock()
+        # The monotonic time the queue must be drained by once shutting down
+        self._deadline = None
+
+    def submit(self, endpoint):
+        """
+        Queues an endpoint to post to without waiting for it to be sent.
+        Returns False if the queue is full and the event was dropped.
+        """
+        if endpoint is None:
+            return True
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(endpoint)
+        except queue.Full:
+            self.counters["dropped"] += 1
+            logger.warning("backend report queue is full, dropping event")
+            return False
+        return True
+
+    def shutdown(self, timeout=DRAIN_TIMEOUT):
+        """
+        Sends the queued events and stops the sender thread, waiting at most
+        `timeout` seconds in total. Events not sent by then are given up, and
+        failed events are no longer retried past it.
+        """
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+        if thread is None:
+            return
+        self._deadline = time.monotonic() + timeout
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            return
+        thread.join(max(self._deadline - time.monotonic(), 0))
+
+    def _ensure_started(self):
+        """
+        Starts the background thread on first use.
+        """
+        with self._lock:
+            if self._thread is None:
+                self._deadline = None
+                self._thread = threading.Thread(
+                    target=self._run, name="backend-reporter", daemon=True
+                )
+                self._thread.start()
+
+    def _run(self):
+        """
+        Sends queued events in batches until stopped.
+        """
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            for endpoint in batch:
+                # Events left once the drain is over are given up with the process
+                if endpoint is _STOP or self._deadline is not None \
+                        and time.monotonic() > self._deadline:
+                    return
+                self.counters["sent" if self._send(endpoint) else "failed"] += 1
+
+    def _send(self, endpoint):
+        """
+        Posts an endpoint, retrying connection errors, timeouts and
+        server errors with exponential backoff. Returns whether it was sent.
+        """
+        for attempt in range(MAX_RETRIES + 1):
+            try:
+                response = post_backend(endpoint, session=self._session)
+                if response.status_code < 500:
+                    return True
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                pass
+            except requests.exceptions.RequestException as e:
+                logger.error("An error occurred when reporting to the backend: %s", e)
+                break
+            backoff = RETRY_BACKOFF * 2 ** attempt
+            if attempt == MAX_RETRIES or self._deadline is not None \
+                    and time.monotonic() + backoff > self._deadline:
+                break
+            time.sleep(backoff)
+
+        logger.warning("error reporting to backend. ensure the backend is running")
+        return False
+
+
+reporter = BackendReporter()
+atexit.register(reporter.shutdown)
+
+
+def use_reporter(new_reporter):
+    """
+    Replaces the reporter the scores and selections are queued on, such as by
+    one sending them from an event loop, and returns the previous reporter.
+    """
+    global reporter  # pylint: disable=global-statement
+    previous, reporter = reporter, new_reporter
+    return previous
+
+
+def reporter_counters():
+    """ sent, failed and dropped event counts of the current reporter """
+    return reporter.counters
+
+
+def report_score(secret, score, href, selection):
+    """ queue a score to be added to the user's score history """
+    reporter.submit(score_endpoint(secret, score, href, selection))
+
+
+def report_selection(name: str):
+    """ queue an accessibility selection to be logged in the backend """
+    reporter.submit(selection_endpoint(name))
@@ -2,12 +2,17 @@
 make requests to the backend. automatically determines the correct domain and includes secret
 """
 import os
-from requests import post
+import time
+import requests
+from utils.settings import env_float
+from utils.timing import BACKEND_REPORT_SECONDS
 
-TIMEOUT = 1000
+TIMEOUT = env_float("BACKEND_TIMEOUT", 10)
 
-def post_backend(endpoint: str):
-    """ function to make a post request to backend that contains accessiscan secret """
+def backend_url(endpoint: str):
+    """
+    url of a backend endpoint that contains accessiscan secret.
+    """
 
     # determine backend domain based on environment
     domain = "https://accessiscan.vercel.app" \
@@ -17,8 +22,16 @@ def post_backend(endpoint: str):
 
     a_sec = os.getenv("ACCESSISCAN_SECRET")
     if "?" in endpoint:
-        url = domain + endpoint + f"&accessiscanSecret={a_sec}"
-    else:
-        url = domain + endpoint + f"?accessiscanSecret={a_sec}"
+        return domain + endpoint + f"&accessiscanSecret={a_sec}"
+    return domain + endpoint + f"?accessiscanSecret={a_sec}"
 
-    return post(url, timeout=TIMEOUT)
+def post_backend(endpoint: str, session=None):
+    """
+    function to make a post request to backend that contains accessiscan secret.
+    pass a requests session to reuse its pooled keep-alive connections.
+    """
+    start = time.perf_counter()
+    try:
+        return (session or requests).post(backend_url(endpoint), timeout=TIMEOUT)
+    finally:
+        BACKEND_REPORT_SECONDS.observe(time.perf_counter() - start)
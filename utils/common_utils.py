@@ -4,33 +4,255 @@ This module provides functions to compute text properties such as font size,
 line height, and other text-related accessibility metrics.
 """
 import math
-from services.css_parser import parse_css
+from functools import partial
+from typing import NamedTuple
+from bs4 import Tag
+from services.stylesheet_cache import load_stylesheet
 from services.html_parser import parse_html, has_direct_contents
+from services.style_resolver import StyleResolver
+from utils.element_refs import resolve_css_path
+from utils.request_limits import TAG_START
+from utils.timing import record_value, stage_timer
 
 
-def parse_and_iterate_elements(html, css, tags_to_skip, element_handler):
+class Finding(NamedTuple):
     """
-    Parses HTML and CSS content.
+    An inaccessible element, its position in document order and the metrics
+    its check computed.
     """
-    num_elements = 0
-    num_accessible = 0
-    inaccessible_elements = []
+    element: object
+    node_index: int
+    metrics: dict
 
-    soup = parse_html(html)
-    styles = parse_css(css)
 
-    for element in soup.find_all(True):
-        if element.hidden or element.name in tags_to_skip or not has_direct_contents(element):
-            continue  # Skip elements that are hidden or in the skip list
+def is_scannable_text(element, tags_to_skip):
+    """
+    Checks if an element is a visible text element that is not in the skip list.
+    """
+    return not (element.hidden or element.name in tags_to_skip
+                or not has_direct_contents(element))
+
+
+class ScanScope(NamedTuple):
+    """
+    The region of a document a scan walks: the elements matching a root
+    selector, or the subtrees at some CSS paths, or else the whole document,
+    cut to an element budget.
+    """
+    root: str = None
+    subtrees: tuple = ()
+    max_elements: int = None
+    # Spreads the budget evenly over the region instead of stopping once it is hit
+    sample: bool = False
+
 
-        num_elements += 1
-        is_accessible = element_handler(element, styles)
-        if is_accessible:
-            num_accessible += 1
+def scope_roots(soup, scope):
+    """
+    Returns the (root element, node_index) pairs of a scope's region in
+    document order, leaving out roots inside another root, and the subtree
+    paths that matched no element. The roots are None for the whole document.
+    """
+    if scope.root is None and not scope.subtrees:
+        return None, []
+
+    candidates = soup.select(scope.root) if scope.root is not None else []
+    missing = []
+    for path in scope.subtrees:
+        element = resolve_css_path(soup, path)
+        if element is None:
+            missing.append(path)
         else:
-            inaccessible_elements.append(element)
+            candidates.append(element)
+
+    # One walk without any style work numbers the candidates, stopping at the last one
+    indexes = node_indexes(soup, candidates)
+    unique = {id(element): element for element in candidates}
+    indexed = sorted(((element, indexes[key]) for key, element in unique.items()),
+                     key=lambda pair: pair[1])
+
+    roots = []
+    kept = set()
+    # An ancestor comes before its descendants in document order
+    for element, node_index in indexed:
+        if not any(id(parent) in kept for parent in element.parents):
+            kept.add(id(element))
+            roots.append((element, node_index))
+    return roots, missing
+
+
+def scope_html(html_content, scope=None):
+    """
+    Returns the part of the HTML content a scan scope can reach, and whether
+    the rest was cut off. A budget over the whole document only reaches the
+    first max_elements elements, so the page is cut before the next start tag
+    and the rest is never parsed.
+    """
+    if scope is None or scope.max_elements is None or scope.sample \
+            or scope.root is not None or scope.subtrees:
+        return html_content, False
+    for count, match in enumerate(TAG_START.finditer(html_content)):
+        if count == scope.max_elements:
+            return html_content[:match.start()], True
+    return html_content, False
+
+
+def _descendant_elements(node, first_index):
+    """
+    Lazily yields the (node_index, element) pairs of the elements under a node.
+    """
+    node_index = first_index
+    for descendant in node.descendants:
+        if isinstance(descendant, Tag):
+            yield node_index, descendant
+            node_index += 1
+
+
+def node_indexes(soup, elements):
+    """
+    Returns the node_index of some elements of a document, mapped by the id of
+    each element. The walk stops at the last of them.
+    """
+    wanted = {id(element) for element in elements}
+    indexes = {}
+    if not wanted:
+        return indexes
+    for node_index, element in _descendant_elements(soup, 0):
+        if id(element) in wanted:
+            indexes[id(element)] = node_index
+            if len(indexes) == len(wanted):
+                break
+    return indexes
+
+
+def _region_elements(roots):
+    """
+    Lazily yields the (node_index, element) pairs of root elements and their descendants.
+    """
+    for root, node_index in roots:
+        yield node_index, root
+        yield from _descendant_elements(root, node_index + 1)
+
+
+def scoped_elements(soup, scope=None, coverage=None):
+    """
+    Yields the (node_index, element) pairs of the elements of a scan scope in
+    document order. Elements are walked lazily, so the walk stops once the
+    element budget is hit, unless the scope spreads the budget over the region.
+
+    Args:
+        soup (BeautifulSoup): The parsed HTML content.
+        scope (ScanScope): The region and element budget, by default every element.
+        coverage (dict): Filled once the generator is exhausted with the number of
+                         "scanned_elements", whether the scan is "complete" (every
+                         element of the region was scanned) and the "missing_subtrees".
+    """
+    scope = scope or ScanScope()
+    roots, missing = scope_roots(soup, scope)
+    elements = _descendant_elements(soup, 0) if roots is None else _region_elements(roots)
+
+    budget = scope.max_elements
+    if budget is not None and scope.sample:
+        elements = list(elements)
+        complete = len(elements) <= budget
+        scanned = min(len(elements), budget)
+        yield from sample_elements(elements, budget)
+    else:
+        scanned = 0
+        complete = True
+        for pair in elements:
+            if scanned == budget:
+                complete = False
+                break
+            yield pair
+            scanned += 1
+
+    record_value("elements", scanned)
+    if coverage is not None:
+        coverage.update(scanned_elements=scanned, complete=complete)
+        if missing:
+            coverage["missing_subtrees"] = missing
+
+
+def sample_elements(elements, max_elements=None):
+    """
+    Yields the (node_index, element) pairs of every element, or of
+    max_elements of them taken at an even stride when there are more.
+    """
+    if max_elements is None or len(elements) <= max_elements:
+        yield from elements
+        return
+    stride = len(elements) / max_elements
+    for position in range(max_elements):
+        yield elements[int(position * stride)]
+
+
+def iter_findings(elements, styles, checks, counts):
+    """
+    Walks the elements of a document once and sends each element to every
+    check whose filter accepts it. Element handlers are called with the element
+    and a StyleResolver shared by all checks, so each style is only resolved
+    once, and return an (is_accessible, metrics) pair. Each inaccessible element
+    is yielded as soon as it is found, so findings do not pile up in memory.
+
+    Args:
+        elements (iterable): The (node_index, element) pairs to check, as
+                             yielded by `scoped_elements`.
+        styles (list | dict | SelectorIndex): The parsed CSS styles or their index.
+        checks (dict): Maps a check name to an (element_filter, element_handler) pair.
+        counts (dict): Filled with a [num_elements, num_accessible] list per check
+                       name, complete once the generator is exhausted.
+
+    Yields:
+        tuple: The check name and a Finding for each inaccessible element.
+    """
+    counts.update({name: [0, 0] for name in checks})
+    style_resolver = StyleResolver(styles)
+    # One reusable timer per check, labelled by its selection name
+    timers = {name: stage_timer(f"evaluate:{name}") for name in checks}
+
+    for node_index, element in elements:
+        for name, (element_filter, element_handler) in checks.items():
+            if not element_filter(element):
+                continue
+
+            count = counts[name]
+            count[0] += 1
+            with timers[name]:
+                is_accessible, metrics = element_handler(element, style_resolver)
+            if is_accessible:
+                count[1] += 1
+            else:
+                yield name, Finding(element, node_index, metrics)
+
+
+def iterate_checks(soup, styles, checks, scope=None, coverage=None):
+    """
+    Runs the checks over the elements of a scan scope, by default the whole
+    parsed document, with `iter_findings` and collects their findings.
+
+    Returns:
+        dict: Maps each check name to a (num_elements, num_accessible,
+              findings) tuple, with a Finding for each inaccessible element.
+    """
+    counts = {}
+    findings = {name: [] for name in checks}
+    elements = scoped_elements(soup, scope, coverage)
+    for name, finding in iter_findings(elements, styles, checks, counts):
+        findings[name].append(finding)
+
+    return {name: (*counts[name], findings[name]) for name in checks}
+
+
+def parse_and_iterate_elements(html, css, tags_to_skip, element_handler, name):
+    """
+    Parses HTML and CSS content and runs a single check, named by the
+    selection name of its scanner, over the elements.
+    """
+    soup = parse_html(html)
+    styles = load_stylesheet(css)
 
-    return num_elements, num_accessible, inaccessible_elements
+    checks = {name: (partial(is_scannable_text, tags_to_skip=tags_to_skip), element_handler)}
+    return iterate_checks(soup, styles, checks)[name]
 
 def calculate_score(num_elements, num_accessible, inaccessible_elements):
     """
@@ -38,7 +260,7 @@ def calculate_score(num_elements, num_accessible, inaccessible_elements):
     Returns a score between 0 and 100.
     """
     if num_elements == 0:
-        return 100  # Default score if no elements are found
+        return [100.0, inaccessible_elements]  # Default score if no elements are found
 
     trunc_score = math.floor((num_accessible / num_elements) * 1000) / 10
     return [trunc_score, inaccessible_elements]
@@ -1,40 +1,176 @@
 """
 Utility module for handling color conversions and calculating contrast ratios
 according to WCAG accessibility guidelines.
+
+Parsed colors, luminances and contrast ratios are memoized, since a page
+typically only uses a few dozen distinct colors.
 """
+import colorsys
 import math
 import re
+from functools import lru_cache
+import numpy as np
 from PIL import ImageColor
-from utils.debug import debug_print
 
-def css_to_hex(color):
+HEX_COLOR = re.compile(r"^#([0-9a-fA-F]{3,4}|[0-9a-fA-F]{6}|[0-9a-fA-F]{8})$")
+FUNCTIONAL_COLOR = re.compile(r"^(rgba?|hsla?)\s*\(\s*([^()]*?)\s*\)$", re.IGNORECASE)
+NUMBER = r"[+-]?(?:\d+\.?\d*|\.\d+)(?:e[+-]?\d+)?"
+ARGUMENT = re.compile(rf"^({NUMBER})(%|deg|grad|rad|turn)?$", re.IGNORECASE)
+COLOR_CACHE_SIZE = 4096
+
+WHITE = (255, 255, 255)
+BLACK = (0, 0, 0)
+
+
+def _linearize(channel):
     """
-    Converts a CSS color into a hex value.
+    Converts an sRGB channel value between 0 and 255 to linear light.
     """
-    # Check if it's a valid hex value
-    if bool(re.match(r"^#([0-9a-fA-F]{3}|[0-9a-fA-F]{6})$", color)):
-        return color
+    i = float(channel) / 255
+    if i < 0.03928:
+        return i / 12.92
+    return ((i + 0.055) / 1.055) ** 2.4
 
-    # Check if it's a valid string rgb tuple
-    rgb_match = re.match(
-        r"^\s*rgb\s*\(\s*([0-9]{1,3})\s*,\s*([0-9]{1,3})\s*,\s*([0-9]{1,3})\s*\)\s*$",
-        color,
-        re.IGNORECASE,
-    )
-    if rgb_match:
-        # Get rgb values
-        r, g, b = map(int, rgb_match.groups())
 
-        # Check all rgb values are valid
-        if all(0 <= x <= 255 for x in (r, g, b)):
-            return rgb_to_hex((r, g, b))
+# https://www.w3.org/TR/WCAG20/#relativeluminancedef
+LINEARIZED_CHANNELS = tuple(_linearize(channel) for channel in range(256))
+LINEARIZED_CHANNELS_ARRAY = np.array(LINEARIZED_CHANNELS)
+
+
+@lru_cache(maxsize=COLOR_CACHE_SIZE)
+def parse_color(color):
+    """
+    Parses a CSS color into an rgba tuple.
+    Supports hex (#rgb, #rgba, #rrggbb, #rrggbbaa), rgb(), rgba(), hsl(), hsla(),
+    color keywords and transparent.
+
+    Args:
+        color (str): The CSS color.
 
-    # Try to convert css color word (e.g., 'red') to hex
+    Returns:
+        tuple: (r, g, b, alpha) with channels between 0 and 255 and alpha
+               between 0 and 1, or None if the color can't be parsed.
+    """
+    color = color.strip()
+    if HEX_COLOR.match(color):
+        return _parse_hex(color)
+
+    match = FUNCTIONAL_COLOR.match(color)
+    if match:
+        return _parse_functional(match.group(1).lower(), match.group(2))
+
+    return _parse_keyword(color)
+
+
+def _parse_keyword(color):
+    """
+    Parses a color keyword (e.g., 'red' or 'transparent') into an rgba tuple.
+    """
+    if color.lower() == "transparent":
+        return (0, 0, 0, 0.0)
+    if not color.isalpha():
+        return None
     try:
         rgb = ImageColor.getrgb(color)
-        return f"#{rgb[0]:02x}{rgb[1]:02x}{rgb[2]:02x}"
     except ValueError:
         return None
+    return (rgb[0], rgb[1], rgb[2], 1.0)
+
+
+def _parse_hex(color):
+    """
+    Parses a hex color into an rgba tuple. Assumes valid hex input.
+    """
+    digits = color.lstrip("#")
+    if len(digits) <= 4:
+        digits = "".join(digit * 2 for digit in digits)
+    channels = [int(digits[i : i + 2], 16) for i in range(0, len(digits), 2)]
+    alpha = channels[3] / 255 if len(channels) == 4 else 1.0
+    return (channels[0], channels[1], channels[2], alpha)
+
+
+def _parse_functional(function, arguments):
+    """
+    Parses the arguments of an rgb(), rgba(), hsl() or hsla() color into an rgba tuple.
+    Accepts both the comma separated and the space separated syntax.
+    """
+    values = _parse_arguments(arguments)
+    if values is None:
+        return None
+
+    alpha = 1.0
+    if len(values) == 4:
+        number, unit = values[3]
+        alpha = min(max(number / 100 if unit == "%" else number, 0.0), 1.0)
+
+    if function.startswith("rgb"):
+        channels = [number * 2.55 if unit == "%" else number for number, unit in values[:3]]
+    else:
+        channels = _hsl_to_rgb(*values[:3])
+    r, g, b = (round(min(max(channel, 0), 255)) for channel in channels)
+    return (r, g, b, alpha)
+
+
+def _parse_arguments(arguments):
+    """
+    Splits the arguments of a color function into (number, unit) pairs.
+    Returns None unless there are three or four valid arguments.
+    """
+    if "," in arguments:
+        parts = [part.strip() for part in arguments.split(",")]
+    else:
+        color_part, _, alpha_part = arguments.partition("/")
+        parts = color_part.split() + ([alpha_part.strip()] if alpha_part else [])
+    if len(parts) not in (3, 4):
+        return None
+
+    matches = [ARGUMENT.match(part) for part in parts]
+    if not all(matches):
+        return None
+    return [(float(match.group(1)), (match.group(2) or "").lower()) for match in matches]
+
+
+def _hsl_to_rgb(hue, saturation, lightness):
+    """
+    Converts (number, unit) hue, saturation and lightness arguments to rgb channels.
+    """
+    number, unit = hue
+    degrees = {"rad": math.degrees(number), "grad": number * 0.9, "turn": number * 360}
+    hue = degrees.get(unit, number) % 360 / 360
+    saturation = min(max(saturation[0] / 100, 0.0), 1.0)
+    lightness = min(max(lightness[0] / 100, 0.0), 1.0)
+    return [channel * 255 for channel in colorsys.hls_to_rgb(hue, lightness, saturation)]
+
+
+def css_to_hex(color):
+    """
+    Converts a CSS color into a hex value, ignoring its alpha channel.
+    Returns None if the color can't be parsed.
+    """
+    rgba = parse_color(color)
+    if rgba is None:
+        return None
+    return rgb_to_hex(rgba[:3])
+
+
+def composite(rgba, background_rgb):
+    """
+    Blends a color with an alpha channel over an opaque background color.
+
+    Args:
+        rgba (tuple): The (r, g, b, alpha) color drawn on top.
+        background_rgb (tuple): The (r, g, b) color underneath.
+
+    Returns:
+        tuple: The resulting opaque (r, g, b) color.
+    """
+    alpha = rgba[3] if len(rgba) == 4 else 1.0
+    if alpha >= 1:
+        return tuple(rgba[:3])
+    return tuple(
+        round(channel * alpha + background * (1 - alpha))
+        for channel, background in zip(rgba[:3], background_rgb)
+    )
 
 
 def rgb_to_hex(rgb):
@@ -48,13 +184,10 @@ def rgb_to_hex(rgb):
 
 def hex_to_rgb(hex_color):
     """
-    Converts a hexcode color into an rgb tuple.
+    Converts a hexcode color into an rgb tuple, ignoring its alpha channel.
     Assumes valid hex input
     """
-    hex_color = hex_color.lstrip("#")
-    if len(hex_color) == 3:
-        return tuple(int(hex_color[i] + hex_color[1], 16) for i in range(3))
-    return tuple(int(hex_color[i : i + 2], 16) for i in (0, 2, 4))
+    return _parse_hex(hex_color)[:3]
 
 
 def calculate_luminance(rgb: tuple[int, ...]):
@@ -62,16 +195,17 @@ def calculate_luminance(rgb: tuple[int, ...]):
     Calculates the apparent lumunicance of the input color.
     Assumes color is rgb tuple with min 0 and max 255
     """
+    return _luminance(tuple(rgb))
 
-    def conv(color):
-        i = float(color) / 255
-        if i < 0.03928:
-            return i / 12.92
-        return ((i + 0.055) / 1.055) ** 2.4
 
+@lru_cache(maxsize=COLOR_CACHE_SIZE)
+def _luminance(rgb):
+    """
+    Calculates the relative luminance of an rgb tuple, memoized per color.
+    """
     # https://www.w3.org/TR/WCAG20/#relativeluminancedef
     # Calculate relative luminance
-    r, g, b = [conv(x) for x in rgb]
+    r, g, b = (LINEARIZED_CHANNELS[int(x)] for x in rgb)
 
     return 0.2126 * r + 0.7152 * g + 0.0722 * b
 
@@ -80,14 +214,61 @@ def contrast_ratio(rgb1: tuple[int, ...], rgb2: tuple[int, ...]):
     """
     Returns the contrast ratio between two colors truncated to the hundreths place
     """
-    l_1 = calculate_luminance(rgb1)
-    l_2 = calculate_luminance(rgb2)
+    return _contrast_ratio(tuple(rgb1), tuple(rgb2))
+
+
+@lru_cache(maxsize=COLOR_CACHE_SIZE)
+def _contrast_ratio(rgb1, rgb2):
+    """
+    Returns the contrast ratio between two rgb tuples, memoized per pair of colors.
+    """
+    l_1 = _luminance(rgb1)
+    l_2 = _luminance(rgb2)
 
     lighter = max(l_1, l_2)
     darker = min(l_1, l_2)
 
-    debug_print(lighter, darker)
-
     # https://www.accessibility-developer-guide.com/knowledge/colours-and-contrast/how-to-calculate/
     ratio = (lighter + 0.05) / (darker + 0.05)
     return math.floor(ratio * 100) / 100.0
+
+
+def clear_color_caches():
+    """
+    Empties the memoized color parses, luminances and contrast ratios.
+    """
+    parse_color.cache_clear()
+    _luminance.cache_clear()
+    _contrast_ratio.cache_clear()
+
+
+def calculate_luminances(rgbs):
+    """
+    Calculates the relative luminance of many colors at once.
+
+    Args:
+        rgbs (array-like): An (N, 3) array of rgb colors with channels between 0 and 255.
+
+    Returns:
+        numpy.ndarray: The N luminances.
+    """
+    linear = LINEARIZED_CHANNELS_ARRAY[np.asarray(rgbs, dtype=np.intp).reshape(-1, 3)]
+    return 0.2126 * linear[:, 0] + 0.7152 * linear[:, 1] + 0.0722 * linear[:, 2]
+
+
+def contrast_ratios(rgbs1, rgbs2):
+    """
+    Returns the contrast ratios between pairs of colors truncated to the hundreths
+    place, matching `contrast_ratio` for each pair.
+
+    Args:
+        rgbs1 (array-like): An (N, 3) array of rgb colors.
+        rgbs2 (array-like): An (N, 3) array of rgb colors.
+
+    Returns:
+        numpy.ndarray: The N contrast ratios.
+    """
+    l_1 = calculate_luminances(rgbs1)
+    l_2 = calculate_luminances(rgbs2)
+    ratios = (np.maximum(l_1, l_2) + 0.05) / (np.minimum(l_1, l_2) + 0.05)
+    return np.floor(ratios * 100) / 100.0
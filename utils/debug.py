@@ -1,9 +1,67 @@
 """
-This module provides a utility function for conditional debugging output.
+This module provides the scanner's logging layer: leveled loggers with lazy
+formatting, and per-request sampling of element-level detail.
+
+Element-level messages are only logged for the requests sampled with
+`start_request_logging`, so hot loops check `element_detail_enabled()`
+(a single context variable lookup) and pay nothing when detail is off.
+
+Configured with the LOG_LEVEL (e.g., "INFO" or "DEBUG") and
+ELEMENT_LOG_SAMPLE_RATE (fraction of requests between 0 and 1 whose
+elements are logged at DEBUG level) environment variables.
 """
-DEBUG = False
+import logging
+import random
+from contextvars import ContextVar
+from utils.settings import env_float, env_str
+
+LOG_LEVEL = env_str("LOG_LEVEL", "INFO").upper()
+ELEMENT_LOG_SAMPLE_RATE = env_float("ELEMENT_LOG_SAMPLE_RATE", 0.0)
+
+ROOT_LOGGER = "accessiscan"
+_element_detail = ContextVar("element_detail", default=False)
+_debug_logger = logging.getLogger(f"{ROOT_LOGGER}.debug")
+
+
+def configure_logging(level=LOG_LEVEL):
+    """
+    Sends the scanner's log records to stderr at the given level.
+    """
+    logger = logging.getLogger(ROOT_LOGGER)
+    logger.setLevel(level)
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+        logger.addHandler(handler)
+
+
+def get_logger(name):
+    """
+    Returns the logger of a module of the scanner.
+    """
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
+
+
+def start_request_logging(sample_rate=None):
+    """
+    Decides whether element-level detail is logged for the current request.
+    Detail is only enabled when DEBUG messages are logged and the request is sampled.
+    """
+    sample_rate = ELEMENT_LOG_SAMPLE_RATE if sample_rate is None else sample_rate
+    enabled = sample_rate > 0 and _debug_logger.isEnabledFor(logging.DEBUG) \
+        and random.random() < sample_rate
+    _element_detail.set(enabled)
+    return enabled
+
+
+def element_detail_enabled():
+    """
+    Checks if element-level detail is logged for the current request.
+    """
+    return _element_detail.get()
+
 
-def debug_print(*args, **kwargs):
-    """Prints messages only if is_print_enabled is True."""
-    if DEBUG:
-        print(*args, **kwargs)
+def debug_print(*args):
+    """Logs element-level detail, formatting the arguments only if it is enabled."""
+    if _element_detail.get():
+        _debug_logger.debug(" ".join(["%s"] * len(args)), *args)
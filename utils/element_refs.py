@@ -0,0 +1,153 @@
+"""
+Builds compact references to the elements reported by the scanners, so a
+response scales with the number of findings rather than the size of the page.
+"""
+import re
+from utils.settings import env_int, env_str
+from utils.timing import stage_timer
+
+CSS_PATH_STEP = re.compile(r"\s*([^\s:>]+)(?::nth-of-type\((\d+)\))?\s*")
+
+# "compact" references or "full" serialized markup of the inaccessible elements
+RESPONSE_MODE = env_str("RESPONSE_MODE", "full")
+RESPONSE_MODES = ("compact", "full")
+SNIPPET_LENGTH = env_int("ELEMENT_SNIPPET_LENGTH", 120)
+
+
+def element_steps(element, positions=None):
+    """
+    Returns the (tag name, position among same-named siblings) steps from the
+    document root down to the element.
+
+    Args:
+        element (Tag): The element.
+        positions (dict): The positions of the children of each parent already
+                          numbered, mapped by the id of the parent. Sharing it
+                          between the elements of a document numbers the children
+                          of each parent only once.
+    """
+    positions = {} if positions is None else positions
+    steps = []
+    while element is not None and element.parent is not None:
+        parent = element.parent
+        children = positions.get(id(parent))
+        if children is None:
+            children = positions[id(parent)] = _child_positions(parent)
+        steps.append((element.name, children[id(element)]))
+        element = parent
+    steps.reverse()
+    return steps
+
+
+def _child_positions(parent):
+    """
+    Returns the position of each child element of a parent among its
+    same-named siblings, mapped by the id of the child.
+    """
+    counts = {}
+    children = {}
+    for child in parent.children:
+        if child.name is not None:
+            counts[child.name] = counts.get(child.name, 0) + 1
+            children[id(child)] = counts[child.name]
+    return children
+
+
+def css_path(steps):
+    """
+    Formats the steps of an element as a CSS selector.
+    """
+    return " > ".join(f"{name}:nth-of-type({position})" for name, position in steps)
+
+
+def resolve_css_path(soup, path):
+    """
+    Returns the element at a CSS path built by `css_path`, or None if the
+    document has no element there.
+    """
+    node = soup
+    for step in path.split(">"):
+        match = CSS_PATH_STEP.fullmatch(step)
+        if match is None:
+            return None
+        position = int(match.group(2) or 1)
+        children = node.find_all(match.group(1), recursive=False)
+        if not 0 < position <= len(children):
+            return None
+        node = children[position - 1]
+    return node
+
+
+def xpath(steps):
+    """
+    Formats the steps of an element as an XPath.
+    """
+    return "".join(f"/{name}[{position}]" for name, position in steps)
+
+
+def opening_tag(element, max_length=SNIPPET_LENGTH):
+    """
+    Returns the element's opening tag, truncated to max_length characters.
+    """
+    attributes = "".join(
+        f' {name}="{" ".join(value) if isinstance(value, list) else value}"'
+        for name, value in element.attrs.items()
+    )
+    snippet = f"<{element.name}{attributes}>"
+    if len(snippet) > max_length:
+        snippet = snippet[:max_length - 4] + "...>"
+    return snippet
+
+
+def element_reference(finding, include_markup=False, positions=None):
+    """
+    Returns the compact reference of a finding: its locators, a snippet of its
+    opening tag and the metrics computed by the scanner. positions is shared
+    between the findings of a document, as for `element_steps`.
+    """
+    steps = element_steps(finding.element, positions)
+    reference = {
+        "css_path": css_path(steps),
+        "xpath": xpath(steps),
+        "node_index": finding.node_index,
+        "snippet": opening_tag(finding.element),
+        "metrics": finding.metrics,
+    }
+    if include_markup:
+        reference["markup"] = str(finding.element)
+    return reference
+
+
+def serialize_findings(findings, mode=None, include_markup=False, positions=None):
+    """
+    Serializes the inaccessible elements of a scan for a response.
+
+    Args:
+        findings (list): The Finding tuples returned by a scanner.
+        mode (str, optional): "compact" for element references, or "full" for the
+            serialized markup of each element. Defaults to RESPONSE_MODE.
+        include_markup (bool): Whether compact references also carry the markup.
+        positions (dict, optional): The sibling positions shared between the
+            findings of the same document, as for `element_steps`.
+
+    Returns:
+        list: The markup strings or reference dictionaries of the findings.
+    """
+    positions = {} if positions is None else positions
+    with stage_timer("serialize"):
+        return [serialize_finding(finding, mode, include_markup, positions)
+                for finding in findings]
+
+
+def serialize_finding(finding, mode=None, include_markup=False, positions=None):
+    """
+    Serializes a single finding as its markup or its compact reference,
+    as described for `serialize_findings`.
+    """
+    mode = mode or RESPONSE_MODE
+    if mode not in RESPONSE_MODES:
+        raise ValueError(f"Unknown response mode: {mode}")
+
+    if mode == "full":
+        return str(finding.element)
+    return element_reference(finding, include_markup, positions)
@@ -0,0 +1,354 @@
+"""
+Resolves CSS lengths to pixels with the semantics of font-size and line-height:
+absolute units, em and % relative to the parent's font size (or the element's
+own for line-height), rem relative to the root's, font size keywords, and
+calc(), min(), max() and clamp() expressions. A var() without a value uses its
+fallback. Parsed values are memoized, since a page repeats the same few lengths.
+"""
+import re
+from functools import lru_cache
+from typing import NamedTuple
+from utils.settings import env_int
+
+DEFAULT_FONT_SIZE = 16
+# The line-height "normal" is taken as this multiple of the font size
+NORMAL_LINE_HEIGHT = 1.5
+# Viewport the vw and vh units are resolved against, unless a scan gives its own
+VIEWPORT_WIDTH = env_int("VIEWPORT_WIDTH", 1280)
+VIEWPORT_HEIGHT = env_int("VIEWPORT_HEIGHT", 800)
+# var() references expanded in a single value before it is taken as invalid
+MAX_VAR_SUBSTITUTIONS = 64
+LENGTH_CACHE_SIZE = 4096
+
+# Pixels per absolute unit
+ABSOLUTE_UNITS = {
+    "px": 1, "pt": 96 / 72, "pc": 16, "in": 96, "cm": 96 / 2.54, "mm": 96 / 25.4,
+    "q": 96 / 101.6,
+}
+FONT_SIZE_KEYWORDS = {
+    "xx-small": 9, "x-small": 10, "small": 13, "medium": 16, "large": 18,
+    "x-large": 24, "xx-large": 32, "xxx-large": 48,
+}
+# Factors of the parent's font size for the relative font size keywords
+RELATIVE_FONT_SIZE_KEYWORDS = {"larger": 1.2, "smaller": 1 / 1.2}
+
+NUMBER = r"[+-]?(?:\d+\.?\d*|\.\d+)(?:e[+-]?\d+)?"
+LENGTH = re.compile(rf"^({NUMBER})(%|[a-z]+)?$")
+TOKEN = re.compile(rf"\s*(?:({NUMBER})(%|[a-z]+)?|([a-z-]+)\(|([-+*/(),]))")
+VAR = re.compile(r"var\(\s*(--[\w-]+)\s*(?:,([^()]*(?:\([^()]*\)[^()]*)*))?\)")
+
+
+class LengthContext(NamedTuple):
+    """
+    The sizes relative lengths are resolved against, in px.
+    """
+    font_size: float
+    root_font_size: float
+    # The length percentages are relative to, or None where they are not allowed
+    percent_base: float = None
+    viewport_width: float = VIEWPORT_WIDTH
+    viewport_height: float = VIEWPORT_HEIGHT
+
+
+@lru_cache(maxsize=LENGTH_CACHE_SIZE)
+def parse_length(value):
+    """
+    Parses a CSS length, percentage or number.
+
+    Returns:
+        tuple: The (number, unit) of the value, with a lowercase unit or "" for
+               a plain number, or None if it is not a single length.
+    """
+    match = LENGTH.match(value.strip().lower())
+    if match is None:
+        return None
+    return float(match.group(1)), match.group(2) or ""
+
+
+def length_to_px(number, unit, context):
+    """
+    Converts a number and unit to pixels.
+
+    Args:
+        number (float): The number of the length.
+        unit (str): Its lowercase unit, "%" or "" for a plain number.
+        context (LengthContext): The sizes relative units are resolved against.
+
+    Returns:
+        float: The length in px, or None for an unknown unit or a plain number
+               other than 0.
+    """
+    if unit in ABSOLUTE_UNITS:
+        return number * ABSOLUTE_UNITS[unit]
+    width, height = context.viewport_width, context.viewport_height
+    relative = {
+        "em": context.font_size, "rem": context.root_font_size,
+        "ex": context.font_size / 2, "ch": context.font_size / 2,
+        "vw": width / 100, "vh": height / 100,
+        "vmin": min(width, height) / 100, "vmax": max(width, height) / 100,
+    }
+    if unit in relative:
+        return number * relative[unit]
+    if unit == "%" and context.percent_base is not None:
+        return number * context.percent_base / 100
+    if unit == "" and number == 0:
+        return 0.0
+    return None
+
+
+def substitute_vars(value, variables=None):
+    """
+    Replaces the var() references of a value by the custom property values,
+    or by their fallbacks. Returns None if a reference has neither, or if the
+    references do not end, as in a cycle of custom properties.
+    """
+    substitutions = 0
+    while "var(" in value:
+        match = VAR.search(value)
+        substitutions += 1
+        if match is None or substitutions > MAX_VAR_SUBSTITUTIONS:
+            return None
+        name, fallback = match.group(1), match.group(2)
+        replacement = (variables or {}).get(name, fallback)
+        if replacement is None:
+            return None
+        value = value[:match.start()] + replacement.strip() + value[match.end():]
+    return value
+
+
+def resolve_custom_properties(declared, inherited=None):
+    """
+    Resolves the var() references of the custom properties an element declares,
+    against each other and the resolved custom properties it inherits.
+
+    Args:
+        declared (dict): The custom properties declared for the element.
+        inherited (dict): The resolved custom properties of its parent.
+
+    Returns:
+        dict: A new dictionary of the inherited and declared custom properties.
+              Declared properties whose references can't be resolved are left out.
+    """
+    variables = {**(inherited or {}), **declared}
+    for name, value in declared.items():
+        if "var(" in value:
+            resolved = substitute_vars(value, variables)
+            if resolved is None:
+                variables.pop(name)
+            else:
+                variables[name] = resolved
+    return variables
+
+
+@lru_cache(maxsize=LENGTH_CACHE_SIZE)
+def _tokenize(expression):
+    """
+    Splits a math expression into (number, unit, function, operator) tokens,
+    or returns None if it holds anything else.
+    """
+    tokens = []
+    position = 0
+    expression = expression.strip()
+    while position < len(expression):
+        match = TOKEN.match(expression, position)
+        if match is None:
+            return None
+        number, unit, function, operator = match.groups()
+        tokens.append((float(number) if number is not None else None, unit or "",
+                       function, operator))
+        position = match.end()
+    return tuple(tokens)
+
+
+def _evaluate_tokens(tokens, context):
+    """
+    Evaluates the tokens of a calc(), min(), max() or clamp() expression.
+
+    Args:
+        tokens (tuple): The tokens from `_tokenize`.
+        context (LengthContext): The sizes relative units are resolved against.
+
+    Returns:
+        tuple: The (value, is_length) of the expression, with lengths in px,
+               or None if it is invalid.
+    """
+    position = 0
+
+    def operator():
+        return tokens[position][3] if position < len(tokens) else None
+
+    def expect(expected):
+        nonlocal position
+        if operator() != expected:
+            raise ValueError(f"Expected {expected}")
+        position += 1
+
+    def operation(operand, operators):
+        # Applies the operators left to right between the operands
+        nonlocal position
+        value, is_length = operand()
+        while operator() in operators:
+            symbol = operator()
+            position += 1
+            other, other_is_length = operand()
+            value = {"+": value + other, "-": value - other,
+                     "*": value * other}.get(symbol) if symbol != "/" else value / other
+            is_length = is_length or other_is_length
+        return value, is_length
+
+    def total():
+        return operation(product, ("+", "-"))
+
+    def product():
+        return operation(factor, ("*", "/"))
+
+    def factor():
+        nonlocal position
+        number, unit, function, symbol = tokens[position]
+        position += 1
+        if number is not None:
+            if unit == "":
+                return number, False
+            px = length_to_px(number, unit, context)
+            if px is None:
+                raise ValueError(f"Unsupported unit {unit}")
+            return px, True
+        if symbol == "-":
+            value, is_length = factor()
+            return -value, is_length
+        if symbol == "(" or function == "calc":
+            value = total()
+            expect(")")
+            return value
+        if function in ("min", "max", "clamp"):
+            arguments = [total()]
+            while operator() == ",":
+                position += 1
+                arguments.append(total())
+            expect(")")
+            return _math_function(function, arguments)
+        raise ValueError(f"Unexpected token {function or symbol}")
+
+    try:
+        result = total()
+    except (IndexError, ValueError, ZeroDivisionError):
+        return None
+    return result if position == len(tokens) else None
+
+
+def _math_function(function, arguments):
+    """
+    Applies min(), max() or clamp() to evaluated (value, is_length) arguments.
+    """
+    is_length = any(is_length for _, is_length in arguments)
+    values = [value for value, _ in arguments]
+    if function == "min":
+        return min(values), is_length
+    if function == "max":
+        return max(values), is_length
+    if len(values) != 3:
+        raise ValueError("clamp() takes three arguments")
+    return max(values[0], min(values[1], values[2])), is_length
+
+
+def evaluate_value(value, context, variables=None):
+    """
+    Evaluates a length, number or math expression.
+
+    Args:
+        value (str): The CSS value.
+        context (LengthContext): The sizes relative units are resolved against.
+        variables (dict): The custom property values var() references resolve to.
+
+    Returns:
+        tuple: The (value, is_length) of the value, with lengths in px, or None
+               if it can't be evaluated.
+    """
+    # Custom property names are case-sensitive, so only the substituted value
+    # is lowercased for its units and function names
+    value = value.strip()
+    if "var(" in value:
+        value = substitute_vars(value, variables)
+        if value is None:
+            return None
+    value = value.lower()
+
+    parsed = parse_length(value)
+    if parsed is not None:
+        number, unit = parsed
+        if unit == "":
+            return number, False
+        px = length_to_px(number, unit, context)
+        return None if px is None else (px, True)
+
+    tokens = _tokenize(value)
+    if not tokens:
+        return None
+    return _evaluate_tokens(tokens, context)
+
+
+def viewport_context(font_size, root_font_size, percent_base=None, viewport=None):
+    """
+    Returns the LengthContext of a font size, with the size of a viewport
+    profile or else the configured viewport.
+    """
+    if viewport is None:
+        return LengthContext(font_size, root_font_size, percent_base)
+    return LengthContext(font_size, root_font_size, percent_base, viewport.width,
+                         viewport.height)
+
+
+def resolve_font_size(value, parent_font_size, root_font_size, variables=None, viewport=None):
+    """
+    Resolves a declared font-size to px.
+
+    Args:
+        value (str): The declared font-size.
+        parent_font_size (float): The parent's resolved font size in px, which
+                                  em, % and the relative keywords are relative to.
+        root_font_size (float): The root element's resolved font size in px.
+        variables (dict): The custom property values var() references resolve to.
+        viewport (ViewportProfile): The viewport vw and vh units are relative to.
+
+    Returns:
+        float: The font size in px, or the parent's when the value is invalid.
+    """
+    keyword = value.strip().lower()
+    if keyword in FONT_SIZE_KEYWORDS:
+        return float(FONT_SIZE_KEYWORDS[keyword])
+    if keyword in RELATIVE_FONT_SIZE_KEYWORDS:
+        return parent_font_size * RELATIVE_FONT_SIZE_KEYWORDS[keyword]
+
+    context = viewport_context(parent_font_size, root_font_size, parent_font_size, viewport)
+    result = evaluate_value(value, context, variables)
+    # Plain numbers other than 0 and negative sizes are invalid
+    if result is None or not result[1] and result[0] != 0 or result[0] < 0:
+        return parent_font_size
+    return result[0]
+
+
+def resolve_line_height(value, font_size, root_font_size, variables=None, viewport=None):
+    """
+    Resolves a declared line-height. A plain number is inherited as a factor
+    of the font size, while a length is inherited as its px value.
+
+    Args:
+        value (str): The declared line-height.
+        font_size (float): The element's own resolved font size in px, which
+                           em and % are relative to.
+        root_font_size (float): The root element's resolved font size in px.
+        variables (dict): The custom property values var() references resolve to.
+        viewport (ViewportProfile): The viewport vw and vh units are relative to.
+
+    Returns:
+        tuple: (value, is_factor) with the factor of the font size, or the line
+               height in px, or None when the value is invalid.
+    """
+    if value.strip().lower() == "normal":
+        return NORMAL_LINE_HEIGHT, True
+    context = viewport_context(font_size, root_font_size, font_size, viewport)
+    result = evaluate_value(value, context, variables)
+    if result is None or result[0] < 0:
+        return None
+    number, is_length = result
+    return number, not is_length
@@ -0,0 +1,101 @@
+"""
+This module provides a thread-safe LRU cache bounded by its number of entries
+and their total size, with an optional time to live and hit/miss counters.
+"""
+import time
+from collections import OrderedDict
+from threading import Lock
+
+
+class LRUCache:
+    """
+    Least recently used cache bounded by entry count and total size in bytes.
+    """
+
+    def __init__(self, max_entries=128, max_bytes=None, ttl=None):
+        """
+        Args:
+            max_entries (int): The maximum number of entries kept.
+            max_bytes (int): The maximum total size of the entries, or None for no limit.
+            ttl (float): The number of seconds an entry stays valid, or None to keep
+                         entries until they are evicted.
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._counters = {"hits": 0, "misses": 0, "evictions": 0}
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = Lock()
+
+    def get(self, key):
+        """
+        Returns the value cached for a key, or None if it is missing or expired.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl is not None \
+                    and time.monotonic() - entry[2] > self.ttl:
+                self._remove(key)
+                entry = None
+
+            if entry is None:
+                self._counters["misses"] += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self._counters["hits"] += 1
+            return entry[0]
+
+    def put(self, key, value, size=0):
+        """
+        Caches a value, evicting the least recently used entries to stay within
+        the limits. Values larger than the byte limit on their own are not cached.
+
+        Args:
+            key: The key of the value.
+            value: The value to cache.
+            size (int): The size of the value in bytes.
+        """
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            if self.max_bytes is not None and size > self.max_bytes:
+                return
+
+            self._entries[key] = (value, size, time.monotonic())
+            self._bytes += size
+            while len(self._entries) > self.max_entries or \
+                    (self.max_bytes is not None and self._bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+                self._counters["evictions"] += 1
+
+    def discard(self, key):
+        """
+        Removes the entry of a key, if it is cached.
+        """
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def clear(self):
+        """
+        Removes every entry from the cache.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """
+        Returns the cache's counters and current size.
+        """
+        with self._lock:
+            return dict(self._counters, entries=len(self._entries), bytes=self._bytes)
+
+    def _remove(self, key):
+        """
+        Removes an entry. Must be called with the lock held.
+        """
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
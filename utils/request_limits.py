@@ -0,0 +1,224 @@
+"""
+This module decodes compressed request bodies and enforces the size limits of
+scan inputs before any parsing starts.
+
+Request bodies sent with a Content-Encoding of gzip or deflate are always
+accepted. br and zstd are accepted when the optional brotli and zstandard
+packages are installed.
+"""
+import io
+import re
+import zlib
+from utils.json_provider import dumps_bytes
+from utils.settings import env_int, env_str
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+MAX_REQUEST_BYTES = env_int("MAX_REQUEST_BYTES", 32 * 1024 * 1024)
+MAX_DECODED_BYTES = env_int("MAX_DECODED_BYTES", 64 * 1024 * 1024)
+MAX_DOM_BYTES = env_int("MAX_DOM_BYTES", 16 * 1024 * 1024)
+MAX_CSS_BYTES = env_int("MAX_CSS_BYTES", 8 * 1024 * 1024)
+MAX_ELEMENTS = env_int("MAX_ELEMENTS", 100000)
+# "reject" pages with more than MAX_ELEMENTS elements, or "sample" their elements
+OVER_LIMIT_MODE = env_str("OVER_LIMIT_MODE", "reject")
+
+# Compressed input is read in small chunks so one chunk cannot expand much past the limit
+CHUNK_SIZE = 16 * 1024
+TAG_START = re.compile(r"<[a-zA-Z]")
+
+
+class InputTooLarge(Exception):
+    """
+    Raised when a request body or scan input is over its size limit.
+    """
+
+    def __init__(self, message, limit):
+        super().__init__(message)
+        self.limit = limit
+
+
+class UnsupportedEncoding(Exception):
+    """
+    Raised when a request body uses a Content-Encoding that cannot be decoded.
+    """
+
+
+def _decompressor(encoding):
+    """
+    Returns a function decompressing successive chunks of a body, or None if
+    the encoding is not supported.
+    """
+    if encoding in ("gzip", "x-gzip"):
+        return zlib.decompressobj(16 + zlib.MAX_WBITS).decompress
+    if encoding == "deflate":
+        return _deflate_decompressor()
+    if encoding == "br" and brotli is not None:
+        return brotli.Decompressor().process
+    if encoding == "zstd" and zstandard is not None:
+        return zstandard.ZstdDecompressor().decompressobj().decompress
+    return None
+
+
+def _deflate_decompressor():
+    """
+    Returns a function decompressing successive chunks of a deflate body, which
+    clients send either zlib-wrapped, as the specification says, or raw.
+    """
+    decompressor = None
+
+    def decompress(chunk):
+        nonlocal decompressor
+        if decompressor is None:
+            # A zlib header is a deflate method byte and a check of the first two bytes
+            is_zlib = len(chunk) >= 2 and chunk[0] & 0x0F == 8 \
+                and (chunk[0] << 8 | chunk[1]) % 31 == 0
+            decompressor = zlib.decompressobj(zlib.MAX_WBITS if is_zlib else -zlib.MAX_WBITS)
+        return decompressor.decompress(chunk)
+
+    return decompress
+
+
+def supported_encodings():
+    """
+    Returns the Content-Encodings that request bodies can use.
+    """
+    return [encoding for encoding in ("gzip", "deflate", "br", "zstd")
+            if _decompressor(encoding) is not None]
+
+
+def decode_body(stream, encoding, max_bytes=MAX_DECODED_BYTES):
+    """
+    Decompresses a request body.
+
+    Args:
+        stream (file): The compressed body.
+        encoding (str): The body's Content-Encoding.
+        max_bytes (int): The maximum size of the decompressed body.
+
+    Returns:
+        bytes: The decompressed body.
+
+    Raises:
+        UnsupportedEncoding: If the encoding is not supported or the body is corrupt.
+        InputTooLarge: If the decompressed body is over max_bytes.
+    """
+    decompress = _decompressor(encoding)
+    if decompress is None:
+        raise UnsupportedEncoding(f"Unsupported Content-Encoding: {encoding}. "
+                                  f"Supported: {', '.join(supported_encodings())}")
+    decoded = io.BytesIO()
+    try:
+        for chunk in iter(lambda: stream.read(CHUNK_SIZE), b""):
+            decoded.write(decompress(chunk))
+            if decoded.tell() > max_bytes:
+                raise InputTooLarge("Decompressed request body is too large", max_bytes)
+    except (zlib.error, ValueError, RuntimeError) as error:
+        # brotli raises brotli.error, a RuntimeError subclass; zstandard a ValueError
+        # subclass (ZstdError) for corrupt input
+        raise UnsupportedEncoding(f"Could not decode the {encoding} request body") from error
+    return decoded.getvalue()
+
+
+def decompress_middleware(wsgi_app, max_bytes=MAX_DECODED_BYTES):
+    """
+    Wraps a WSGI application so compressed request bodies are replaced by their
+    decoded content before it reads them. Bodies over the limits, or that cannot
+    be decoded, get a JSON 413 or 415 response without reaching the application.
+    """
+    def middleware(environ, start_response):
+        encoding = environ.get("HTTP_CONTENT_ENCODING", "").strip().lower()
+        if encoding in ("", "identity"):
+            return wsgi_app(environ, start_response)
+
+        try:
+            length = int(environ.get("CONTENT_LENGTH") or 0)
+            if length > MAX_REQUEST_BYTES:
+                raise InputTooLarge("Request body is too large", MAX_REQUEST_BYTES)
+            body = decode_body(environ["wsgi.input"], encoding, max_bytes)
+        except InputTooLarge as error:
+            return _error_response(start_response, "413 Content Too Large",
+                                   {"error": str(error), "limit": error.limit})
+        except UnsupportedEncoding as error:
+            return _error_response(start_response, "415 Unsupported Media Type",
+                                   {"error": str(error)})
+
+        environ["wsgi.input"] = io.BytesIO(body)
+        environ["CONTENT_LENGTH"] = str(len(body))
+        del environ["HTTP_CONTENT_ENCODING"]
+        return wsgi_app(environ, start_response)
+
+    return middleware
+
+
+def _error_response(start_response, status, body):
+    """
+    Sends a JSON error response from the middleware.
+    """
+    payload = dumps_bytes(body)
+    start_response(status, [("Content-Type", "application/json"),
+                            ("Content-Length", str(len(payload)))])
+    return [payload]
+
+
+def is_over_bytes(content, max_bytes):
+    """
+    Checks if text is larger than max_bytes once encoded as UTF-8. A character
+    takes one to four bytes, so the text is only encoded when its length alone
+    cannot decide.
+    """
+    if len(content) > max_bytes:
+        return True
+    if len(content) * 4 <= max_bytes:
+        return False
+    return len(content.encode("utf-8", "surrogatepass")) > max_bytes
+
+
+def count_elements(html_content):
+    """
+    Estimates the number of elements of a page from its start tags, without parsing it.
+    """
+    return len(TAG_START.findall(html_content))
+
+
+def check_scan_input(html_content, css_content, mode=None, budget=None):
+    """
+    Checks the DOM and CSS of a scan against the size limits.
+
+    Args:
+        html_content (str): The raw HTML content.
+        css_content (str): The raw CSS content.
+        mode (str): "reject" or "sample" for pages with too many elements.
+                    Defaults to the OVER_LIMIT_MODE setting.
+        budget (int): The element budget of a scan over the whole page, if it
+                      has one. Such a scan only parses the page up to its budget,
+                      so it is never over the limit within MAX_ELEMENTS elements.
+                      The budget of a region scan, which parses the whole page,
+                      must not be passed.
+
+    Returns:
+        tuple: The number of elements to sample from the page, or None to scan
+               every element (up to the budget), and the estimated number of
+               elements of the page.
+
+    Raises:
+        InputTooLarge: If the DOM or CSS is too large, or the page has too many
+                       elements and is not sampled.
+    """
+    if is_over_bytes(html_content, MAX_DOM_BYTES):
+        raise InputTooLarge("DOM is too large", MAX_DOM_BYTES)
+    if is_over_bytes(css_content, MAX_CSS_BYTES):
+        raise InputTooLarge("CSS is too large", MAX_CSS_BYTES)
+
+    num_elements = count_elements(html_content)
+    if num_elements <= MAX_ELEMENTS or (budget is not None and budget <= MAX_ELEMENTS):
+        return None, num_elements
+    if (mode or OVER_LIMIT_MODE) != "sample":
+        raise InputTooLarge(f"Page has about {num_elements} elements", MAX_ELEMENTS)
+    return MAX_ELEMENTS, num_elements
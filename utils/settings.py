@@ -0,0 +1,25 @@
+"""
+Reads the scanner's settings from environment variables. A .env file is loaded
+first, so modules reading settings at import time see its values.
+"""
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def env_str(name, default):
+    """ string setting, or the default when unset """
+    return os.getenv(name, default)
+
+
+def env_int(name, default):
+    """ integer setting, or the default when unset or empty """
+    value = os.getenv(name, "")
+    return int(value) if value.strip() else default
+
+
+def env_float(name, default):
+    """ float setting, or the default when unset or empty """
+    value = os.getenv(name, "")
+    return float(value) if value.strip() else default
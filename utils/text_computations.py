@@ -1,33 +1,27 @@
 """
 Calculates font size and line height.
 """
-def compute_font_size(text_elem_style, element_tag, root_font_size=16):
+from utils.debug import debug_print
+from utils.lengths import DEFAULT_FONT_SIZE, NORMAL_LINE_HEIGHT, resolve_font_size, \
+    resolve_line_height
+
+def compute_font_size(text_elem_style, element_tag, root_font_size=DEFAULT_FONT_SIZE):
     """
-    This module contains utility functions for text-related computations,
-    including font size calculation and parsing styles for accessibility checks.
+    Computes the font size of a style in px without its element's ancestors,
+    so em and % are taken relative to the root font size. Scanners read the
+    inherited font size from `StyleResolver.font_size` instead.
     """
-    font_size = text_elem_style.get("font-size", "16px")
-
-    if len(element_tag) == 5:
-        print("element tag:", element_tag)
-
-    # Handle font-size cases (rem, em, px, pt)
-    units = [("rem", root_font_size), ("em", root_font_size), ("px", 1), ("pt", 1.33)]
-    for unit, multiplier in units:
-        if unit in font_size:
-            return float(font_size.replace(unit, "")) * multiplier
-
-    # Default case if no recognizable unit is found
-    return float(font_size)
+    font_size = text_elem_style.get("font-size", "medium")
+    debug_print("element tag:", element_tag, "font size:", font_size)
+    return resolve_font_size(font_size, root_font_size, root_font_size)
 
 def compute_line_height(elem_style, font_size_val):
     """
     Compute line height based on element style or default ratio.
     """
-    line_height = elem_style.get("line-height", "normal")
-    if line_height == "normal":
-        return 1.5 * font_size_val
-    try:
-        return float(line_height) * font_size_val
-    except ValueError:
-        return compute_font_size({"font-size": line_height}, "")
+    line_height = resolve_line_height(elem_style.get("line-height", "normal"), font_size_val,
+                                      DEFAULT_FONT_SIZE)
+    if line_height is None:
+        return NORMAL_LINE_HEIGHT * font_size_val
+    value, is_factor = line_height
+    return value * font_size_val if is_factor else value
@@ -0,0 +1,225 @@
+"""
+This module times the stages of a scan request and aggregates them into
+histograms exposed in the Prometheus text format.
+
+Stage timers only measure inside a request started with `start_request_timing`,
+so scans run outside of a request pay a single context variable lookup per
+timer. Timers nest: a stage's time excludes the stages timed inside it, so the
+stages of a request add up to the time spent in them. When the request ends,
+`finish_request_timing` adds each stage's total, and the recorded values such
+as element counts and input sizes, to the histograms.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+BYTES_BUCKETS = tuple(1024 * 4 ** power for power in range(10))
+COUNT_BUCKETS = (10, 50, 100, 500, 1000, 5000, 10000, 50000, 100000, 500000)
+
+_request_timings = ContextVar("request_timings", default=None)
+
+
+class Histogram:
+    """
+    Thread-safe histogram of observed values, with one series per label value.
+    """
+
+    def __init__(self, name, description, buckets, label=None):
+        """
+        Args:
+            name (str): The metric name.
+            description (str): The help text of the metric.
+            buckets (tuple): The increasing upper bounds of the buckets.
+            label (str): The name of the label distinguishing the series, if any.
+        """
+        self.name = name
+        self.description = description
+        self.buckets = buckets
+        self.label = label
+        # Maps each label value to its bucket counts, with a last +Inf bucket, and sum
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, label_value=None):
+        """
+        Adds a value to the series of a label value.
+        """
+        with self._lock:
+            counts, total = self._series.get(label_value, ([0] * (len(self.buckets) + 1), 0))
+            counts[bisect_left(self.buckets, value)] += 1
+            self._series[label_value] = (counts, total + value)
+
+    def render(self):
+        """
+        Returns the histogram in the Prometheus text format.
+        """
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted(self._series.items(), key=lambda item: str(item[0]))
+            for label_value, (counts, total) in series:
+                labels = f'{self.label}="{label_value}",' if self.label else ""
+                cumulative = 0
+                for bound, count in zip((*self.buckets, "+Inf"), counts):
+                    cumulative += count
+                    lines.append(f'{self.name}_bucket{{{labels}le="{bound}"}} {cumulative}')
+                labels = f"{{{labels.rstrip(',')}}}" if labels else ""
+                lines.append(f"{self.name}_sum{labels} {total}")
+                lines.append(f"{self.name}_count{labels} {cumulative}")
+        return "\n".join(lines)
+
+
+STAGE_SECONDS = Histogram("accessiscan_stage_seconds",
+                          "Time spent in each stage of a scan request.", SECONDS_BUCKETS, "stage")
+REQUEST_SECONDS = Histogram("accessiscan_request_seconds",
+                            "Time spent serving scan requests.", SECONDS_BUCKETS, "endpoint")
+INPUT_BYTES = Histogram("accessiscan_input_bytes",
+                        "Size of the DOM and CSS of scan requests.", BYTES_BUCKETS, "kind")
+ELEMENTS = Histogram("accessiscan_elements",
+                     "Number of elements walked per scan request.", COUNT_BUCKETS)
+BACKEND_REPORT_SECONDS = Histogram("accessiscan_backend_report_seconds",
+                                   "Time spent posting a report to the backend.", SECONDS_BUCKETS)
+HISTOGRAMS = [STAGE_SECONDS, REQUEST_SECONDS, INPUT_BYTES, ELEMENTS, BACKEND_REPORT_SECONDS]
+# Recorded values and the histogram and label they are observed into
+RECORDED_VALUES = {
+    "dom_bytes": (INPUT_BYTES, "dom"),
+    "css_bytes": (INPUT_BYTES, "css"),
+    "elements": (ELEMENTS, None),
+}
+
+
+class RequestTimings:
+    """
+    The stage times and recorded values of one request.
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.stages = {}
+        self.values = {}
+        # The [name, start, time of nested stages] of the stages being timed
+        self.stack = []
+
+    def merge(self, exported):
+        """
+        Adds the stage times and values exported by `export`, for example from
+        a worker process, to this request.
+        """
+        for name, seconds in exported["stages"].items():
+            self.stages[name] = self.stages.get(name, 0) + seconds
+        for name, value in exported["values"].items():
+            self.values[name] = self.values.get(name, 0) + value
+        if self.stack:
+            self.stack[-1][2] += sum(exported["stages"].values())
+
+    def export(self):
+        """
+        Returns the stage times and values as a picklable dictionary.
+        """
+        return {"stages": dict(self.stages), "values": dict(self.values)}
+
+
+class StageTimer:
+    """
+    Context manager adding the time spent in a stage to the current request.
+    A timer can be entered again once it has exited, so loops reuse one.
+    """
+    __slots__ = ("name", "timings")
+
+    def __init__(self, name):
+        self.name = name
+        self.timings = None
+
+    def __enter__(self):
+        self.timings = _request_timings.get()
+        if self.timings is not None:
+            self.timings.stack.append([self.name, time.perf_counter(), 0])
+        return self
+
+    def __exit__(self, *exc_info):
+        timings = self.timings
+        if timings is None:
+            return
+        name, start, nested = timings.stack.pop()
+        elapsed = time.perf_counter() - start
+        timings.stages[name] = timings.stages.get(name, 0) + elapsed - nested
+        if timings.stack:
+            timings.stack[-1][2] += elapsed
+
+
+def stage_timer(name):
+    """
+    Returns a context manager timing a stage of the current request.
+    """
+    return StageTimer(name)
+
+
+def record_value(name, value):
+    """
+    Adds to a value recorded for the current request, such as an element count.
+    """
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.values[name] = timings.values.get(name, 0) + value
+
+
+def start_request_timing():
+    """
+    Starts timing the stages of the current request.
+    """
+    timings = RequestTimings()
+    _request_timings.set(timings)
+    return timings
+
+
+def current_request_timing():
+    """
+    Returns the timings of the current request, or None outside of a request.
+    """
+    return _request_timings.get()
+
+
+def finish_request_timing(endpoint=None):
+    """
+    Stops timing the current request and adds its stages and values to the
+    histograms.
+
+    Returns:
+        RequestTimings: The timings of the request, or None if none were started.
+    """
+    timings = _request_timings.get()
+    if timings is None:
+        return None
+    _request_timings.set(None)
+
+    if endpoint is not None:
+        REQUEST_SECONDS.observe(time.perf_counter() - timings.start, endpoint)
+    for name, seconds in timings.stages.items():
+        STAGE_SECONDS.observe(seconds, name)
+    for name, value in timings.values.items():
+        if name in RECORDED_VALUES:
+            histogram, label_value = RECORDED_VALUES[name]
+            histogram.observe(value, label_value)
+    return timings
+
+
+def server_timing_header(timings):
+    """
+    Formats the stage times of a request as a Server-Timing header value.
+    """
+    return ", ".join(f"{name};dur={seconds * 1000:.2f}"
+                     for name, seconds in timings.stages.items())
+
+
+def render_metrics(extra_counters=None):
+    """
+    Returns every histogram, and the given counters, in the Prometheus text format.
+
+    Args:
+        extra_counters (dict): Maps metric names to (description, value) pairs.
+    """
+    sections = [histogram.render() for histogram in HISTOGRAMS]
+    for name, (description, value) in (extra_counters or {}).items():
+        sections.append(f"# HELP {name} {description}\n# TYPE {name} gauge\n{name} {value}")
+    return "\n".join(sections) + "\n"